@@ -3,15 +3,11 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import { api } from "@/lib/api";
 
-type Usuario = {
+// respuesta compacta de /api/usuarios/buscar/
+type UsuarioOpcion = {
   id: number;
-  username: string;
-  email?: string;
+  label: string;
   rol: "admin" | "guarda" | "aprendiz" | string;
-  first_name?: string;
-  last_name?: string;
-  documento?: string | null;
-  estado?: "activo" | "bloqueado" | string;
 };
 
 type Turno = {
@@ -66,12 +62,6 @@ function Badge({ variant, label }: { variant: "green" | "red" | "blue" | "amber"
   return <span className={clsBadge(variant)}>{label}</span>;
 }
 
-function nombreUsuario(u?: Usuario | null) {
-  if (!u) return "—";
-  const full = `${u.first_name ?? ""} ${u.last_name ?? ""}`.trim();
-  return full || u.username;
-}
-
 function formatFecha(iso?: string | null) {
   if (!iso) return "—";
   const d = new Date(iso);
@@ -150,7 +140,10 @@ function Modal({
 }
 
 export default function AdminAccesosPage() {
-  const [usuarios, setUsuarios] = useState<Usuario[]>([]);
+  // etiquetas id -> "Nombre (documento)", resueltas bajo demanda (sin bajar /api/usuarios/ completo)
+  const [etiquetas, setEtiquetas] = useState<Map<number, string>>(new Map());
+  const [aprendicesOpts, setAprendicesOpts] = useState<UsuarioOpcion[]>([]);
+  const [guardasOpts, setGuardasOpts] = useState<UsuarioOpcion[]>([]);
 
   // tabla paginada
   const [accesos, setAccesos] = useState<Acceso[]>([]);
@@ -191,30 +184,19 @@ export default function AdminAccesosPage() {
 
   const requestIdRef = useRef(0);
 
-  const usuariosMap = useMemo(() => {
-    const m = new Map<number, Usuario>();
-    usuarios.forEach((u) => m.set(u.id, u));
-    return m;
-  }, [usuarios]);
-
-  const aprendicesAll = useMemo(() => usuarios.filter((u) => u.rol === "aprendiz"), [usuarios]);
-  const guardasAll = useMemo(() => usuarios.filter((u) => u.rol === "guarda"), [usuarios]);
-
-  const aprendicesFiltrados = useMemo(() => {
-    const s = dAprendizSearch.trim().toLowerCase();
-    if (!s) return aprendicesAll;
-    return aprendicesAll.filter((u) =>
-      `${u.username} ${u.first_name ?? ""} ${u.last_name ?? ""} ${u.documento ?? ""}`.toLowerCase().includes(s)
-    );
-  }, [aprendicesAll, dAprendizSearch]);
-
-  const guardasFiltrados = useMemo(() => {
-    const s = dGuardaSearch.trim().toLowerCase();
-    if (!s) return guardasAll;
-    return guardasAll.filter((u) =>
-      `${u.username} ${u.first_name ?? ""} ${u.last_name ?? ""}`.toLowerCase().includes(s)
-    );
-  }, [guardasAll, dGuardaSearch]);
+  function etiqueta(id?: number | null) {
+    if (!id) return "—";
+    return etiquetas.get(id) ?? `#${id}`;
+  }
+
+  function recordarEtiquetas(opts: UsuarioOpcion[]) {
+    if (!opts.length) return;
+    setEtiquetas((prev) => {
+      const m = new Map(prev);
+      opts.forEach((o) => m.set(o.id, o.label));
+      return m;
+    });
+  }
 
   const stats = useMemo(() => {
     const total = count;
@@ -224,10 +206,16 @@ export default function AdminAccesosPage() {
     return { total, ingresos, salidas, conEquipos };
   }, [accesos, count]);
 
-  async function cargarUsuarios() {
-    const res = await api.get<Usuario[] | Paginated<Usuario>>("/api/usuarios/");
-    const data = Array.isArray(res.data) ? res.data : (res.data as any)?.results ?? [];
-    setUsuarios(data);
+  async function buscarUsuarios(rol: string, texto: string) {
+    const res = await api.get<UsuarioOpcion[]>("/api/usuarios/buscar/", { params: { rol, q: texto, limit: 20 } });
+    return res.data ?? [];
+  }
+
+  async function resolverEtiquetas(ids: number[]) {
+    const faltan = Array.from(new Set(ids)).filter((id) => !etiquetas.has(id));
+    if (!faltan.length) return;
+    const res = await api.get<UsuarioOpcion[]>("/api/usuarios/buscar/", { params: { ids: faltan.join(",") } });
+    recordarEtiquetas(res.data ?? []);
   }
 
   async function cargarAccesos(p = page) {
@@ -259,6 +247,9 @@ export default function AdminAccesosPage() {
 
       setAccesos(results);
       setCount(c);
+
+      const ids = results.flatMap((a: Acceso) => [a.usuario, a.registrado_por ?? 0]).filter(Boolean);
+      resolverEtiquetas(ids).catch(() => undefined);
     } catch (e: any) {
       if (rid !== requestIdRef.current) return;
       setError(safeErrorMessage(e));
@@ -272,7 +263,6 @@ export default function AdminAccesosPage() {
     setLoadingTable(true);
     setError(null);
     try {
-      await cargarUsuarios();
       await cargarAccesos(1);
       setPage(1);
     } catch (e: any) {
@@ -340,6 +330,25 @@ export default function AdminAccesosPage() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [dq, tipo, sede, aprendizId, guardaId, dDateFrom, dDateTo, pageSize]);
 
+  // ✅ typeahead de aprendices / guardas (prefijo, máx 20 resultados)
+  useEffect(() => {
+    buscarUsuarios("aprendiz", dAprendizSearch.trim())
+      .then((opts) => {
+        setAprendicesOpts(opts);
+        recordarEtiquetas(opts);
+      })
+      .catch(() => setAprendicesOpts([]));
+  }, [dAprendizSearch]);
+
+  useEffect(() => {
+    buscarUsuarios("guarda", dGuardaSearch.trim())
+      .then((opts) => {
+        setGuardasOpts(opts);
+        recordarEtiquetas(opts);
+      })
+      .catch(() => setGuardasOpts([]));
+  }, [dGuardaSearch]);
+
   // ✅ refetch cuando cambie page
   useEffect(() => {
     cargarAccesos(page);
@@ -461,9 +470,9 @@ export default function AdminAccesosPage() {
                 onChange={(e) => setAprendizId(e.target.value ? Number(e.target.value) : "")}
               >
                 <option value="">Aprendiz</option>
-                {aprendicesFiltrados.map((u) => (
+                {aprendicesOpts.map((u) => (
                   <option key={u.id} value={u.id}>
-                    {nombreUsuario(u)} ({u.documento ?? "sin doc"})
+                    {u.label}
                   </option>
                 ))}
               </select>
@@ -482,9 +491,9 @@ export default function AdminAccesosPage() {
                 onChange={(e) => setGuardaId(e.target.value ? Number(e.target.value) : "")}
               >
                 <option value="">Guarda</option>
-                {guardasFiltrados.map((u) => (
+                {guardasOpts.map((u) => (
                   <option key={u.id} value={u.id}>
-                    {nombreUsuario(u)}
+                    {u.label}
                   </option>
                 ))}
               </select>
@@ -585,8 +594,6 @@ export default function AdminAccesosPage() {
                   ) : null}
 
                   {accesos.map((a) => {
-                    const aprendiz = usuariosMap.get(a.usuario);
-                    const registrado = a.registrado_por ? usuariosMap.get(a.registrado_por) : null;
                     const equiposCount = (a.equipos ?? []).length;
 
                     return (
@@ -599,10 +606,9 @@ export default function AdminAccesosPage() {
                           {a.sede ? <Badge variant="blue" label={a.sede.replace("_", " ")} /> : <Badge variant="gray" label="(sin sede)" />}
                         </td>
                         <td className="px-4 py-3">
-                          <div className="font-semibold text-gray-900">{nombreUsuario(aprendiz)}</div>
-                          <div className="text-xs text-gray-500">{aprendiz?.documento ?? "—"}</div>
+                          <div className="font-semibold text-gray-900">{etiqueta(a.usuario)}</div>
                         </td>
-                        <td className="px-4 py-3 text-gray-800">{registrado ? nombreUsuario(registrado) : "—"}</td>
+                        <td className="px-4 py-3 text-gray-800">{etiqueta(a.registrado_por)}</td>
                         <td className="px-4 py-3">
                           {equiposCount ? <Badge variant="amber" label={`${equiposCount} equipo(s)`} /> : "—"}
                         </td>
@@ -667,12 +673,12 @@ export default function AdminAccesosPage() {
                 <div className="mt-2 text-sm text-gray-700 space-y-1">
                   <div>
                     <span className="text-gray-500">Aprendiz:</span>{" "}
-                    <span className="font-medium">{nombreUsuario(usuariosMap.get(selected.usuario))}</span>
+                    <span className="font-medium">{etiqueta(selected.usuario)}</span>
                   </div>
                   <div>
                     <span className="text-gray-500">Registrado por:</span>{" "}
                     <span className="font-medium">
-                      {selected.registrado_por ? nombreUsuario(usuariosMap.get(selected.registrado_por)) : "—"}
+                      {etiqueta(selected.registrado_por)}
                     </span>
                   </div>
                 </div>
@@ -1,6 +1,74 @@
+import csv
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+
 from .models import Usuario, Acceso, Equipo, Turno
+from .replicas import PRIMARIA, alias_replica
+from .views import _Echo, _evento_acceso
+
+
+# =========================
+# Tablas grandes: conteo estimado y exportación en streaming
+# =========================
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Sin filtros ni búsqueda, en PostgreSQL, toma el total de la estimación del
+    planificador (pg_class.reltuples) en vez de un COUNT(*) de toda la tabla.
+    Con filtros, o si la tabla es chica, cuenta de verdad.
+    """
+
+    umbral = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conexion = connections[qs.db]
+        if not qs.query.where and conexion.vendor == "postgresql":
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [qs.model._meta.db_table])
+                fila = cursor.fetchone()
+            if fila and fila[0] >= self.umbral:
+                return fila[0]
+        return super().count
+
+
+@admin.action(description="Exportar a CSV")
+def exportar_csv(modeladmin, request, queryset):
+    """
+    Columnas de `csv_campos` (values_list: sin instancias ni __str__), leídas
+    por lotes con iterator() y en la réplica si hay una.
+    """
+    campos = modeladmin.csv_campos
+    writer = csv.writer(_Echo())
+    filas = queryset.using(alias_replica() or PRIMARIA).order_by("pk").values_list(*campos)
+
+    def contenido():
+        yield writer.writerow(campos)
+        for fila in filas.iterator(chunk_size=2000):
+            yield writer.writerow(fila)
+
+    response = StreamingHttpResponse(contenido(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{modeladmin.model._meta.model_name}s.csv"'
+    return response
+
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """
+    Changelist para tablas de millones de filas: total estimado, sin el
+    segundo COUNT(*) del total sin filtrar, y exportación CSV.
+    Las búsquedas usan lookups que sirven los índices (exact/startswith),
+    no icontains.
+    """
+
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    actions = (exportar_csv,)
+    csv_campos = ("id",)
 
 
 @admin.register(Usuario)
@@ -26,14 +94,31 @@ class UsuarioAdmin(UserAdmin):
         ("SADI", {"fields": ("rol", "documento", "sede_principal", "programa_formacion", "estado")}),
     )
 
+    def save_model(self, request, obj, form, change):
+        # autor del evento de bloqueo/desbloqueo (signals.py)
+        obj._actor = request.user
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(Acceso)
-class AccesoAdmin(admin.ModelAdmin):
+class AccesoAdmin(TablaGrandeAdmin):
     list_display = ("id", "usuario", "usuario_documento", "tipo", "sede", "fecha", "registrado_por", "turno")
-    list_filter = ("tipo", "sede", "fecha")
-    search_fields = ("usuario__username", "usuario__documento", "registrado_por__username")
+    list_filter = ("tipo", "sede")
+    # índices fecha y (sede, fecha)
+    date_hierarchy = "fecha"
+    # __str__ de usuario/registrado_por/turno (y turno.guarda) se resuelven en el mismo SELECT
+    list_select_related = ("usuario", "registrado_por", "turno__guarda")
+    # documento exacto y prefijos de username/serial: índices *_pattern_ops de 0010 y 0023
+    search_fields = ("usuario__documento__exact", "usuario__username__istartswith")
     autocomplete_fields = ("usuario", "registrado_por", "turno")
     filter_horizontal = ("equipos",)
+    csv_campos = ("id", "fecha", "tipo", "sede", "usuario__documento", "usuario__username", "registrado_por__username", "turno_id")
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # con los equipos ya guardados: asistencia y alertas leen el evento
+        if not change:
+            _evento_acceso(form.instance, form.instance.equipos.all(), request.user)
 
     def usuario_documento(self, obj):
         return getattr(obj.usuario, "documento", "")
@@ -41,16 +126,23 @@ class AccesoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Equipo)
-class EquipoAdmin(admin.ModelAdmin):
+class EquipoAdmin(TablaGrandeAdmin):
     list_display = ("serial", "propietario", "estado", "marca", "modelo", "creado_en")
     list_filter = ("estado", "marca")
-    search_fields = ("serial", "propietario__username", "propietario__documento")
+    # índices creado_en y (estado, creado_en)
+    date_hierarchy = "creado_en"
+    list_select_related = ("propietario",)
+    search_fields = ("serial__startswith", "propietario__documento__exact", "propietario__username__istartswith")
     autocomplete_fields = ("propietario", "revisado_por")
+    csv_campos = ("id", "serial", "marca", "modelo", "estado", "propietario__documento", "creado_en", "revisado_en")
 
 
 @admin.register(Turno)
-class TurnoAdmin(admin.ModelAdmin):
+class TurnoAdmin(TablaGrandeAdmin):
     list_display = ("guarda", "sede", "jornada", "inicio", "fin", "activo")
     list_filter = ("sede", "jornada", "activo")
-    search_fields = ("guarda__username", "guarda__documento")
+    date_hierarchy = "inicio"
+    list_select_related = ("guarda",)
+    search_fields = ("guarda__documento__exact", "guarda__username__istartswith")
     autocomplete_fields = ("guarda",)
+    csv_campos = ("id", "guarda__documento", "guarda__username", "sede", "jornada", "inicio", "fin", "activo")
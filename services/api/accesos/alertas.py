@@ -0,0 +1,248 @@
+"""
+Motor de alertas. Corre fuera de las solicitudes (`manage.py motor_alertas`):
+consume la bitácora de eventos desde su cursor y, para las reglas que
+dependen del paso del tiempo, revisa el estado actual (Presencia, turnos
+activos).
+
+- Cada regla guarda un estado de tamaño fijo en EstadoAlertas.reglas, en la
+  misma transacción que el cursor.
+- Cada alerta tiene una clave (Notificacion.clave es única): reprocesar
+  eventos o revisar dos veces no la duplica.
+- Las notificaciones de cada lote se insertan juntas (bulk_create).
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .eventos import EVENTOS_LOTE, eventos_desde
+from .models import EstadoAlertas, Evento, Notificacion, Presencia, Turno, Usuario
+
+FIN_JORNADA = {"MANANA": "12:00", "TARDE": "18:00", "NOCHE": "22:00"}
+
+
+def _alerta(clave, tipo, titulo, mensaje, **data):
+    return Notificacion(
+        clave=clave, rol_objetivo=Usuario.Rol.ADMIN, tipo=tipo, titulo=titulo, mensaje=mensaje, data=data
+    )
+
+
+# =========================
+# Reglas
+# =========================
+class Regla:
+    """
+    `al_evento` recibe cada evento de `tipos`; `al_revisar`, una vez por
+    pasada. Ambas modifican `estado` (dict serializable a JSON) y devuelven
+    Notificaciones sin guardar.
+    """
+
+    nombre = None
+    tipos = ()
+
+    def al_evento(self, evento, estado):
+        return []
+
+    def al_revisar(self, estado, ahora):
+        return []
+
+
+class AprendizBloqueado(Regla):
+    """
+    Un aprendiz bloqueado intentó ingresar con su documento. Una alerta por
+    aprendiz y día. Sin estado. Los QR rechazados no llegan a la bitácora
+    (solo a sadi_escaneos_total{resultado="bloqueado"}).
+    """
+
+    nombre = "aprendiz_bloqueado"
+    tipos = (Evento.Tipo.ESCANEO_RECHAZADO,)
+
+    def al_evento(self, evento, estado):
+        if evento.datos.get("motivo") != "bloqueado":
+            return []
+        usuario_id = evento.datos.get("usuario_id")
+        dia = timezone.localdate(evento.creado_en).isoformat()
+        return [
+            _alerta(
+                f"bloqueado:{usuario_id}:{dia}",
+                Notificacion.Tipo.URGENT,
+                "Aprendiz bloqueado en portería",
+                f"Un aprendiz bloqueado intentó ingresar por la portería de {evento.sede}.",
+                usuario_id=usuario_id,
+                sede=evento.sede,
+                evento_id=evento.id,
+            )
+        ]
+
+
+class RafagaRechazos(Regla):
+    """
+    Muchos escaneos rechazados seguidos en una sede. Estado por sede: la tasa
+    con decaimiento exponencial (ventana ALERTAS_RAFAGA_SEGUNDOS) y el
+    instante del último rechazo. Alerta al llegar a ALERTAS_RAFAGA_UMBRAL,
+    a lo sumo una por sede y ventana.
+    """
+
+    nombre = "rafaga_rechazos"
+    tipos = (Evento.Tipo.ESCANEO_RECHAZADO,)
+
+    def al_evento(self, evento, estado):
+        ventana = getattr(settings, "ALERTAS_RAFAGA_SEGUNDOS", 300)
+        umbral = getattr(settings, "ALERTAS_RAFAGA_UMBRAL", 10)
+        t = evento.creado_en.timestamp()
+
+        tasa, previo = estado.get(evento.sede, (0.0, t))
+        tasa = tasa * math.exp(-max(t - previo, 0) / ventana) + 1
+        estado[evento.sede] = (tasa, t)
+        if tasa < umbral:
+            return []
+
+        return [
+            _alerta(
+                f"rafaga:{evento.sede}:{int(t // ventana)}",
+                Notificacion.Tipo.WARNING,
+                "Ráfaga de rechazos en portería",
+                f"{evento.sede}: unos {round(tasa)} escaneos rechazados en los últimos {ventana // 60} minutos.",
+                sede=evento.sede,
+                rechazos=round(tasa, 1),
+                evento_id=evento.id,
+            )
+        ]
+
+
+class EquiposDentro(Regla):
+    """
+    Equipos que siguen dentro más de ALERTAS_EQUIPO_HORAS. Estado: el umbral
+    de la pasada anterior; cada pasada solo mira las presencias que lo
+    cruzaron desde entonces.
+    """
+
+    nombre = "equipos_dentro"
+
+    def al_revisar(self, estado, ahora):
+        horas = getattr(settings, "ALERTAS_EQUIPO_HORAS", 12)
+        limite = ahora - timedelta(hours=horas)
+        qs = Presencia.objects.filter(desde__lte=limite, ingreso__equipos__isnull=False)
+        if estado.get("hasta"):
+            qs = qs.filter(desde__gt=datetime.fromisoformat(estado["hasta"]))
+        estado["hasta"] = limite.isoformat()
+
+        filas = qs.values("usuario_id", "sede", "ingreso_id", "desde").annotate(equipos=Count("ingreso__equipos"))
+        return [
+            _alerta(
+                f"equipos_dentro:{f['ingreso_id']}",
+                Notificacion.Tipo.WARNING,
+                "Equipos dentro hace mucho",
+                f"{f['equipos']} equipo(s) de un aprendiz siguen dentro en {f['sede']} desde "
+                f"{timezone.localtime(f['desde']):%Y-%m-%d %H:%M} (más de {horas} h).",
+                usuario_id=f["usuario_id"],
+                sede=f["sede"],
+                acceso_id=f["ingreso_id"],
+                equipos=f["equipos"],
+            )
+            for f in filas
+        ]
+
+
+def _fin_jornada(turno):
+    # Primer fin de jornada (hora local) después del inicio: la noche puede pasar de medianoche
+    hora, minuto = map(int, getattr(settings, "ALERTAS_FIN_JORNADA", FIN_JORNADA)[turno.jornada].split(":"))
+    inicio = timezone.localtime(turno.inicio)
+    fin = inicio.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    return fin if fin > inicio else fin + timedelta(days=1)
+
+
+class TurnoExcedido(Regla):
+    """
+    Turno todavía abierto ALERTAS_TURNO_MARGEN_MINUTOS después del fin de su
+    jornada. Sin estado: los turnos activos son pocos (índice parcial).
+    """
+
+    nombre = "turno_excedido"
+
+    def al_revisar(self, estado, ahora):
+        margen = timedelta(minutes=getattr(settings, "ALERTAS_TURNO_MARGEN_MINUTOS", 30))
+        alertas = []
+        for turno in Turno.objects.filter(activo=True).only("id", "guarda_id", "sede", "jornada", "inicio"):
+            fin = _fin_jornada(turno)
+            if ahora < fin + margen:
+                continue
+            alertas.append(
+                _alerta(
+                    f"turno_excedido:{turno.id}",
+                    Notificacion.Tipo.WARNING,
+                    "Turno abierto fuera de jornada",
+                    f"El turno {turno.get_jornada_display().lower()} de {turno.sede} sigue abierto; "
+                    f"la jornada terminó a las {fin:%H:%M}.",
+                    turno_id=turno.id,
+                    guarda_id=turno.guarda_id,
+                    sede=turno.sede,
+                )
+            )
+        return alertas
+
+
+REGLAS = (AprendizBloqueado(), RafagaRechazos(), EquiposDentro(), TurnoExcedido())
+TIPOS = sorted({tipo for regla in REGLAS for tipo in regla.tipos})
+
+
+# =========================
+# Ejecución
+# =========================
+def _estado():
+    # Una sola fila; el lock evita que dos procesos consuman el mismo lote
+    fila, _ = EstadoAlertas.objects.select_for_update().get_or_create(pk=1)
+    return fila
+
+
+def _emitir(alertas):
+    """Inserta en un lote las alertas cuya clave no existe. Devuelve cuántas."""
+    unicas = {}
+    for alerta in alertas:
+        unicas.setdefault(alerta.clave, alerta)
+    if not unicas:
+        return 0
+    existentes = set(Notificacion.objects.filter(clave__in=list(unicas)).values_list("clave", flat=True))
+    nuevas = [a for clave, a in unicas.items() if clave not in existentes]
+    # ignore_conflicts: otra pasada pudo insertar la misma clave entre medio
+    Notificacion.objects.bulk_create(nuevas, batch_size=500, ignore_conflicts=True)
+    return len(nuevas)
+
+
+def procesar(ahora=None, limite=EVENTOS_LOTE):
+    """
+    Una pasada del motor: consume los eventos nuevos por lotes (cada lote en
+    su transacción con el cursor y el estado) y después evalúa las reglas de
+    tiempo. Devuelve {"eventos": n, "alertas": n}.
+    """
+    eventos = alertas = 0
+    hay_mas = True
+    while hay_mas:
+        with transaction.atomic():
+            fila = _estado()
+            lote, hay_mas = eventos_desde(fila.cursor, limite=limite, tipos=TIPOS)
+            if not lote:
+                break
+            nuevas = []
+            for evento in lote:
+                for regla in REGLAS:
+                    if evento.tipo in regla.tipos:
+                        nuevas += regla.al_evento(evento, fila.reglas.setdefault(regla.nombre, {}))
+            alertas += _emitir(nuevas)
+            fila.cursor = lote[-1].seq
+            fila.save()
+            eventos += len(lote)
+
+    with transaction.atomic():
+        fila = _estado()
+        ahora = ahora or timezone.now()
+        nuevas = []
+        for regla in REGLAS:
+            nuevas += regla.al_revisar(fila.reglas.setdefault(regla.nombre, {}), ahora)
+        alertas += _emitir(nuevas)
+        fila.save()
+
+    return {"eventos": eventos, "alertas": alertas}
@@ -0,0 +1,152 @@
+"""
+Asistencia diaria: segundos dentro y visitas de cada aprendiz por día (hora
+local) en AsistenciaDiaria, para los reportes por programa de formación y
+sede (/api/asistencia/).
+
+Se refresca incrementalmente (`manage.py refrescar_asistencia`): los eventos
+acceso_creado desde el cursor (seq de la bitácora, sin huecos que se llenen) dicen
+qué aprendices cambiaron y desde qué día, y solo esos días se recalculan desde
+Acceso. Una visita que cruza la medianoche reparte su tiempo entre los dos
+días; un ingreso sin salida no suma hasta que llega la salida.
+
+Editar o borrar accesos ya aplicados, o crearlos sin evento (ORM directo), no
+mueve el cursor: para eso está `refrescar_asistencia --reconstruir`.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .eventos import eventos_desde, publicar
+from .models import Acceso, AsistenciaDiaria, EstadoAsistencia, Evento
+
+ASISTENCIA_LOTE = 5000
+APRENDICES_LOTE = 500
+
+
+def _medianoche(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _cortes(entrada, salida):
+    """(día, segundos) de una visita, cortada en cada medianoche local."""
+    while entrada < salida:
+        dia = timezone.localdate(entrada)
+        fin = min(salida, _medianoche(dia + timedelta(days=1)))
+        yield dia, (fin - entrada).total_seconds()
+        entrada = fin
+
+
+def _calcular(filas, desde):
+    """
+    filas: (usuario_id, tipo, fecha) en orden de usuario y fecha.
+    Devuelve {(usuario_id, dia): [segundos, visitas]} de los días >= desde[usuario_id].
+    """
+    totales = {}
+    anterior = None
+    for usuario_id, tipo, fecha in filas:
+        inicio = desde[usuario_id]
+        if anterior and anterior[0] == usuario_id and anterior[1] == Acceso.Tipo.INGRESO and tipo == Acceso.Tipo.SALIDA:
+            for dia, segundos in _cortes(anterior[2], fecha):
+                if inicio is None or dia >= inicio:
+                    totales.setdefault((usuario_id, dia), [0.0, 0])[0] += segundos
+        if tipo == Acceso.Tipo.INGRESO:
+            dia = timezone.localdate(fecha)
+            if inicio is None or dia >= inicio:
+                totales.setdefault((usuario_id, dia), [0.0, 0])[1] += 1
+        anterior = (usuario_id, tipo, fecha)
+    return totales
+
+
+def _recalcular(desde):
+    """
+    desde: {usuario_id: primer día a recalcular, o None para todo}.
+    Reemplaza esas filas de AsistenciaDiaria. Llamar dentro de una transacción.
+    """
+    por_dia = {}
+    for usuario_id, dia in desde.items():
+        por_dia.setdefault(dia, []).append(usuario_id)
+
+    borrar, leer = Q(), Q()
+    for dia, ids in por_dia.items():
+        if dia is None:
+            borrar |= Q(usuario_id__in=ids)
+            leer |= Q(usuario_id__in=ids)
+        else:
+            borrar |= Q(usuario_id__in=ids, dia__gte=dia)
+            # desde el día anterior: el primer acceso del rango puede ser la salida de un ingreso previo
+            leer |= Q(usuario_id__in=ids, fecha__gte=_medianoche(dia - timedelta(days=1)))
+
+    filas = (
+        Acceso.objects.filter(leer)
+        .order_by("usuario_id", "fecha", "id")
+        .values_list("usuario_id", "tipo", "fecha")
+    )
+    totales = _calcular(filas.iterator(chunk_size=2000), desde)
+
+    AsistenciaDiaria.objects.filter(borrar).delete()
+    AsistenciaDiaria.objects.bulk_create(
+        [
+            AsistenciaDiaria(usuario_id=usuario_id, dia=dia, segundos=round(segundos), visitas=visitas)
+            for (usuario_id, dia), (segundos, visitas) in totales.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def _estado():
+    estado, _ = EstadoAsistencia.objects.select_for_update().get_or_create(pk=1)
+    return estado
+
+
+def refrescar(lote=ASISTENCIA_LOTE):
+    """
+    Aplica los accesos de los eventos acceso_creado nuevos (seq > cursor), por
+    lotes. Sin margen de tiempo: la bitácora no deja huecos que se llenen
+    después. Devuelve cuántos eventos aplicó.
+    """
+    total = 0
+    hay_mas = True
+    while hay_mas:
+        with transaction.atomic():
+            estado = _estado()
+            nuevos, hay_mas = eventos_desde(estado.cursor, limite=lote, tipos=[Evento.Tipo.ACCESO_CREADO])
+            if not nuevos:
+                break
+
+            # fecha del acceso (la del evento si ya se borró)
+            fechas = dict(Acceso.objects.filter(id__in=[e.objeto_id for e in nuevos]).values_list("id", "fecha"))
+            desde = {}
+            for evento in nuevos:
+                usuario_id = evento.datos.get("usuario_id")
+                if usuario_id is None:
+                    continue
+                # el día anterior también: la salida puede cerrar un ingreso de ayer
+                dia = timezone.localdate(fechas.get(evento.objeto_id, evento.creado_en)) - timedelta(days=1)
+                if usuario_id not in desde or dia < desde[usuario_id]:
+                    desde[usuario_id] = dia
+            _recalcular(desde)
+
+            estado.cursor = nuevos[-1].seq
+            estado.save()
+            total += len(nuevos)
+
+    return total
+
+
+@transaction.atomic
+def reconstruir(lote=APRENDICES_LOTE):
+    """Rehace AsistenciaDiaria desde cero. Devuelve cuántos aprendices procesó."""
+    estado = _estado()
+    publicar()
+    tope = Evento.objects.filter(tipo=Evento.Tipo.ACCESO_CREADO).aggregate(m=Max("seq"))["m"] or 0
+    usuarios = list(Acceso.objects.order_by("usuario_id").values_list("usuario_id", flat=True).distinct())
+
+    AsistenciaDiaria.objects.all().delete()
+    for i in range(0, len(usuarios), lote):
+        _recalcular(dict.fromkeys(usuarios[i : i + lote]))
+
+    estado.cursor = tope
+    estado.save()
+    return len(usuarios)
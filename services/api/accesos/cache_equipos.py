@@ -0,0 +1,95 @@
+"""
+Equipos aprobados de cada aprendiz, ya serializados, en el cache de Django
+(validar_documento los pide en cada escaneo y cambian pocas veces).
+
+Cada aprendiz tiene una generación; la clave de sus datos la incluye.
+Invalidar es fijar una generación nueva, después del commit: un lector que
+calculó con datos viejos los guarda bajo la generación anterior, que nadie
+vuelve a leer.
+
+Invalidan los receivers de signals.py (alta, cambio y baja de equipos) y,
+para los UPDATE masivos sin señales, quien los hace (revisar_lote). Sin
+Redis (LocMem, un cache por proceso) la invalidación solo llega al proceso
+que la hace; los demás ven el cambio al vencer CACHE_EQUIPOS_TTL, que en ese
+caso es de segundos (settings.py).
+
+Métricas: sadi_cache_equipos_total{resultado=hit|miss|stale}. Una fracción
+CACHE_EQUIPOS_VERIFICAR de los aciertos se compara con la BD: si difieren se
+cuenta como stale y se corrige.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metricas
+from .models import Equipo
+from .serializers import EquipoSerializer
+
+
+def _clave_generacion(aprendiz_id):
+    return f"equipos:gen:{aprendiz_id}"
+
+
+def _clave(aprendiz_id, generacion):
+    return f"equipos:aprobados:{aprendiz_id}:{generacion}"
+
+
+def _contar(resultado):
+    if getattr(settings, "METRICS_ENABLED", True):
+        metricas.incrementar("sadi_cache_equipos_total", resultado=resultado)
+
+
+def _consultar(aprendiz_id):
+    qs = Equipo.objects.filter(propietario_id=aprendiz_id, estado=Equipo.Estado.APROBADO).order_by("-creado_en")
+    return [dict(e) for e in EquipoSerializer(qs, many=True).data]
+
+
+def _generacion(aprendiz_id):
+    clave = _clave_generacion(aprendiz_id)
+    generacion = cache.get(clave)
+    if generacion is None:
+        # Nueva y única: si la generación se perdió (expulsión), no se reusan datos viejos
+        cache.add(clave, time.time_ns(), None)
+        generacion = cache.get(clave)
+    return generacion
+
+
+def equipos_aprobados(aprendiz_id):
+    """Lista serializada (EquipoSerializer) de los equipos aprobados, más nuevos primero."""
+    clave = _clave(aprendiz_id, _generacion(aprendiz_id))
+    ttl = getattr(settings, "CACHE_EQUIPOS_TTL", 86400)
+
+    datos = cache.get(clave)
+    if datos is None:
+        _contar("miss")
+        datos = _consultar(aprendiz_id)
+        cache.set(clave, datos, ttl)
+        return datos
+
+    if random.random() < getattr(settings, "CACHE_EQUIPOS_VERIFICAR", 0.01):
+        actuales = _consultar(aprendiz_id)
+        if actuales != datos:
+            _contar("stale")
+            cache.set(clave, actuales, ttl)
+            return actuales
+
+    _contar("hit")
+    return datos
+
+
+def invalidar(aprendiz_ids):
+    """Generación nueva para cada aprendiz (una sola operación de cache)."""
+    ahora = time.time_ns()
+    nuevas = {_clave_generacion(i): ahora for i in aprendiz_ids if i}
+    if nuevas:
+        cache.set_many(nuevas, None)
+
+
+def invalidar_al_confirmar(aprendiz_ids):
+    """Invalida cuando confirme la transacción actual (inmediato fuera de una)."""
+    ids = {i for i in aprendiz_ids if i}
+    if ids:
+        transaction.on_commit(lambda: invalidar(ids))
@@ -0,0 +1,161 @@
+"""
+Credencial QR firmada:
+
+    S1.<kid>.<usuario_id>.<rol>.<version>.<expira>.<firma>
+
+`rol` es la inicial (a/g/d = aprendiz/guarda/admin), `expira` un epoch en
+base 36 y `firma` HMAC-SHA256 (truncado a 128 bits, base64url) de todo lo
+anterior con la clave `kid`. Verificar no toca la base de datos: las claves
+salen de settings y la lista de revocación se mantiene en memoria y se
+refresca cada QR_REVOCACION_TTL segundos.
+"""
+import base64
+import hashlib
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F, Q
+from django.dispatch import receiver
+
+from .models import Usuario
+
+PREFIJO = "S1"
+ROLES = {Usuario.Rol.APRENDIZ: "a", Usuario.Rol.GUARDA: "g", Usuario.Rol.ADMIN: "d"}
+ROLES_INV = {v: k for k, v in ROLES.items()}
+BLOQUEADO = -1
+
+
+class CredencialInvalida(Exception):
+    # usuario_id solo si la firma es válida (para la bitácora de rechazos)
+    def __init__(self, motivo, codigo="credencial", usuario_id=None):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.codigo = codigo
+        self.usuario_id = usuario_id
+
+
+# =========================
+# Claves (rotación): QR_CLAVES = {"kid": "secreto", ...}, QR_CLAVE_ACTIVA = "kid"
+# =========================
+_claves = {}
+
+
+def claves():
+    if not _claves:
+        configuradas = getattr(settings, "QR_CLAVES", None) or {
+            # por defecto, derivada de SECRET_KEY (no se comparte con SECRET_KEY en sí)
+            "k0": hashlib.sha256(f"sadi-qr:{settings.SECRET_KEY}".encode()).hexdigest()
+        }
+        _claves.update({kid: secreto.encode() for kid, secreto in configuradas.items()})
+    return _claves
+
+
+def clave_activa():
+    kid = getattr(settings, "QR_CLAVE_ACTIVA", None) or next(iter(claves()))
+    return kid, claves()[kid]
+
+
+def _firmar(clave, mensaje):
+    digest = hmac.new(clave, mensaje.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+# =========================
+# Revocación: usuario_id -> versión vigente (o BLOQUEADO). Quien no está, versión 0.
+# =========================
+_revocacion = {"versiones": {}, "cargado": 0.0}
+_lock = threading.Lock()
+
+
+def _versiones():
+    ttl = getattr(settings, "QR_REVOCACION_TTL", 30)
+    if time.monotonic() - _revocacion["cargado"] < ttl:
+        return _revocacion["versiones"]
+    with _lock:
+        if time.monotonic() - _revocacion["cargado"] >= ttl:
+            filas = Usuario.objects.filter(
+                Q(credencial_version__gt=0) | Q(estado=Usuario.Estado.BLOQUEADO)
+            ).values_list("id", "credencial_version", "estado")
+            _revocacion["versiones"] = {
+                uid: BLOQUEADO if estado == Usuario.Estado.BLOQUEADO else version for uid, version, estado in filas
+            }
+            _revocacion["cargado"] = time.monotonic()
+    return _revocacion["versiones"]
+
+
+def invalidar_revocaciones():
+    """Fuerza recargar la lista en este proceso (los demás la recargan al vencer el TTL)."""
+    _revocacion["cargado"] = 0.0
+
+
+def revocar_credenciales(usuario_id):
+    """Invalida todos los QR emitidos al usuario: sube credencial_version (UPDATE, sin señales)."""
+    Usuario.objects.filter(pk=usuario_id).update(credencial_version=F("credencial_version") + 1)
+    transaction.on_commit(invalidar_revocaciones)
+
+
+@receiver(setting_changed)
+def _recargar(setting, **kwargs):
+    if setting in ("QR_CLAVES", "QR_CLAVE_ACTIVA", "SECRET_KEY"):
+        _claves.clear()
+    if setting == "QR_REVOCACION_TTL":
+        invalidar_revocaciones()
+
+
+# =========================
+# Emisión / verificación
+# =========================
+def emitir(usuario, ahora=None):
+    kid, clave = clave_activa()
+    expira = int(ahora or time.time()) + getattr(settings, "QR_VIGENCIA_SEGUNDOS", 86400)
+    cuerpo = ".".join(
+        [PREFIJO, kid, str(usuario.id), ROLES[usuario.rol], str(usuario.credencial_version), _base36(expira)]
+    )
+    return f"{cuerpo}.{_firmar(clave, cuerpo)}", expira
+
+
+def verificar(credencial, ahora=None):
+    """
+    Devuelve {"usuario_id", "rol", "version", "expira"} o lanza CredencialInvalida.
+    Cero consultas salvo la recarga periódica de la lista de revocación.
+    """
+    partes = credencial.strip().split(".")
+    if len(partes) != 7 or partes[0] != PREFIJO:
+        raise CredencialInvalida("Credencial con formato inválido.")
+    _, kid, uid, rol, version, expira, firma = partes
+
+    clave = claves().get(kid)
+    if clave is None or not hmac.compare_digest(_firmar(clave, ".".join(partes[:6])), firma):
+        raise CredencialInvalida("Credencial con firma inválida.")
+
+    try:
+        uid, version, expira = int(uid), int(version), int(expira, 36)
+    except ValueError:
+        raise CredencialInvalida("Credencial con formato inválido.")
+    if rol not in ROLES_INV:
+        raise CredencialInvalida("Credencial con formato inválido.")
+
+    if expira < (ahora or time.time()):
+        raise CredencialInvalida("Credencial expirada.", usuario_id=uid)
+
+    vigente = _versiones().get(uid, 0)
+    if vigente == BLOQUEADO:
+        raise CredencialInvalida("El aprendiz está bloqueado.", codigo="bloqueado", usuario_id=uid)
+    if version != vigente:
+        raise CredencialInvalida("Credencial revocada.", usuario_id=uid)
+
+    return {"usuario_id": uid, "rol": ROLES_INV[rol], "version": version, "expira": expira}
+
+
+def _base36(n):
+    digitos = "0123456789abcdefghijklmnopqrstuvwxyz"
+    salida = ""
+    while True:
+        n, r = divmod(n, 36)
+        salida = digitos[r] + salida
+        if not n:
+            return salida
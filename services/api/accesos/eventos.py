@@ -0,0 +1,69 @@
+from django.db import transaction
+
+from .models import Evento, SecuenciaEventos
+
+EVENTOS_LOTE = 500
+EVENTOS_LOTE_MAX = 2000
+PUBLICAR_LOTE = 2000
+
+
+def registrar_evento(tipo, objeto_id, sede=None, actor=None, **datos):
+    """
+    Agrega un evento a la bitácora. Llamar dentro de la misma transacción que
+    el cambio: si el cambio se revierte, el evento también. Es un INSERT con
+    id autoincremental, sin bloqueos compartidos: el orden para los
+    consumidores (seq) se asigna al publicar.
+    """
+    return Evento.objects.create(tipo=tipo, objeto_id=objeto_id, sede=sede, actor=actor, datos=datos)
+
+
+def registrar_eventos(eventos):
+    """Versión en lote (una sola INSERT) para cambios masivos."""
+    if not eventos:
+        return []
+    return Evento.objects.bulk_create(eventos, batch_size=1000)
+
+
+def publicar(limite=PUBLICAR_LOTE):
+    """
+    Numera (seq) los eventos confirmados que todavía no tienen, en orden de id.
+    Solo ve lo confirmado: un evento de una transacción que confirma después
+    queda para la publicación siguiente y recibe un seq mayor que todos los ya
+    visibles, así que un consumidor que avanza por seq no se salta ninguno.
+
+    La fila de SecuenciaEventos serializa a los que publican (solo lectores,
+    nunca quien escribe eventos). Con skip_locked, si otro está publicando se
+    sigue sin esperar y se lee lo ya publicado. Devuelve cuántos numeró.
+    """
+    with transaction.atomic(savepoint=False):
+        fila = SecuenciaEventos.objects.select_for_update(skip_locked=True).filter(pk=1).first()
+        if fila is None:
+            if SecuenciaEventos.objects.filter(pk=1).exists():
+                return 0
+            fila, _ = SecuenciaEventos.objects.get_or_create(pk=1)
+
+        pendientes = list(Evento.objects.filter(seq__isnull=True).order_by("id").only("id")[:limite])
+        if not pendientes:
+            return 0
+        for evento in pendientes:
+            fila.valor += 1
+            evento.seq = fila.valor
+        Evento.objects.bulk_update(pendientes, ["seq"], batch_size=1000)
+        fila.save(update_fields=["valor"])
+    return len(pendientes)
+
+
+def eventos_desde(since, limite=EVENTOS_LOTE, sede=None, tipos=None):
+    """
+    Publica lo pendiente y devuelve los eventos con seq > since en orden. Lo
+    publicado nunca deja huecos que se llenen después (ver publicar).
+    """
+    quedan = publicar() == PUBLICAR_LOTE
+    qs = Evento.objects.filter(seq__gt=since)
+    if sede:
+        qs = qs.filter(sede=sede)
+    if tipos:
+        qs = qs.filter(tipo__in=tipos)
+    # Uno de más para saber si quedan pendientes sin hacer COUNT
+    filas = list(qs.order_by("seq")[: limite + 1])
+    return filas[:limite], len(filas) > limite or quedan
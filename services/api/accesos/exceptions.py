@@ -5,8 +5,15 @@ from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, Pe
 from rest_framework.response import Response
 from rest_framework import status
 
+from .instrumentacion import etiquetar_resultado, medir
+
 
 def ui_exception_handler(exc, context):
+    with medir(context.get("request"), "excepcion"):
+        return _ui_exception_handler(exc, context)
+
+
+def _ui_exception_handler(exc, context):
     # First, get DRF's default error response.
     response = exception_handler(exc, context)
 
@@ -35,6 +42,8 @@ def ui_exception_handler(exc, context):
         response.status_code = status.HTTP_403_FORBIDDEN
 
     elif isinstance(exc, (ValidationError,)):
+        # Las reglas de portería lanzan con code= (equipo_no_aprobado, ...): etiqueta de las métricas
+        etiquetar_resultado(context.get("request"), _primer_codigo(exc.get_codes()))
         payload["motivo"] = "Datos inválidos."
         payload["errores"] = response.data
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -62,3 +71,9 @@ def ui_exception_handler(exc, context):
 
     response.data = payload
     return response
+
+
+def _primer_codigo(codigos):
+    while isinstance(codigos, (dict, list)) and codigos:
+        codigos = next(iter(codigos.values())) if isinstance(codigos, dict) else codigos[0]
+    return codigos if isinstance(codigos, str) else None
@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from . import tablero
+from .models import Usuario
+from .serializers import AprendizImportSerializer
+
+CAMPOS_ACTUALIZABLES = ["username", "email", "first_name", "last_name", "sede_principal", "programa_formacion"]
+
+
+def leer_filas(archivo, formato):
+    """
+    Itera las filas de un archivo CSV (con encabezado) o JSONL como dicts.
+    `archivo` puede ser binario o de texto.
+    """
+    if isinstance(archivo.read(0), bytes):
+        archivo = io.TextIOWrapper(archivo, encoding="utf-8-sig")
+
+    if formato == "csv":
+        yield from csv.DictReader(archivo)
+        return
+
+    for linea in archivo:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            yield json.loads(linea)
+        except ValueError:
+            # se reporta como error de la fila, no aborta la importación
+            yield {"__error__": "JSON inválido."}
+
+
+def _password_por_defecto(documento):
+    # mismo criterio que UsuarioSerializer.create
+    return documento[-4:] if len(documento) >= 4 else "1234"
+
+
+def _init_worker():
+    # Con spawn (macOS/Windows) el proceso hijo no hereda Django configurado
+    import django
+
+    django.setup()
+
+
+def importar_aprendices(filas, chunk_size=1000, workers=None):
+    """
+    Importa aprendices en lotes: valida el lote, hashea contraseñas en un pool
+    de procesos y hace upsert por documento (bulk_create + bulk_update).
+    Con workers=1 hashea en el proceso actual, sin pool.
+
+    A los existentes solo se les actualizan los campos que trae la fila; el
+    username por defecto (= documento) es solo para los nuevos.
+
+    Devuelve {"creados", "actualizados", "errores": [{"fila", "errores"}]}.
+    """
+    resultado = {"creados": 0, "actualizados": 0, "errores": []}
+    vistos = {"documento": set(), "username": set()}
+    workers = workers or os.cpu_count() or 1
+    ejecutor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else nullcontext()
+
+    with ejecutor as pool:
+        lote = []
+        for n, fila in enumerate(filas, start=1):
+            lote.append((n, fila))
+            if len(lote) >= chunk_size:
+                _procesar_lote(lote, vistos, pool, resultado)
+                lote = []
+        if lote:
+            _procesar_lote(lote, vistos, pool, resultado)
+
+    # bulk_create no emite señales (bulk_update no toca rol ni estado)
+    if resultado["creados"]:
+        tablero.invalidar()
+    return resultado
+
+
+def _procesar_lote(lote, vistos, pool, resultado):
+    validas = []
+    for n, fila in lote:
+        if not isinstance(fila, dict) or "__error__" in fila:
+            motivo = fila["__error__"] if isinstance(fila, dict) else "La fila debe ser un objeto JSON."
+            resultado["errores"].append({"fila": n, "errores": motivo})
+            continue
+
+        s = AprendizImportSerializer(data=fila)
+        if not s.is_valid():
+            resultado["errores"].append({"fila": n, "errores": s.errors})
+            continue
+
+        data = s.validated_data
+        repetido = next((c for c in ("documento", "username") if c in data and data[c] in vistos[c]), None)
+        if repetido:
+            resultado["errores"].append({"fila": n, "errores": {repetido: "Valor repetido en el archivo."}})
+            continue
+        vistos["documento"].add(data["documento"])
+        vistos["username"].add(data.get("username", data["documento"]))
+        validas.append((n, data))
+
+    if not validas:
+        return
+
+    # 2 consultas por lote: existentes por documento y usernames ocupados
+    existentes = Usuario.objects.in_bulk([d["documento"] for _, d in validas], field_name="documento")
+    ocupados = dict(
+        Usuario.objects.filter(username__in=[d.get("username", d["documento"]) for _, d in validas]).values_list(
+            "username", "documento"
+        )
+    )
+
+    nuevos, actualizados, campos = [], [], set()
+    for n, data in validas:
+        usuario = existentes.get(data["documento"])
+        if usuario is None:
+            data.setdefault("username", data["documento"])
+
+        if "username" in data and ocupados.get(data["username"], data["documento"]) != data["documento"]:
+            resultado["errores"].append({"fila": n, "errores": {"username": "Ya existe un usuario con este username."}})
+            continue
+
+        if usuario is not None:
+            if usuario.rol != Usuario.Rol.APRENDIZ:
+                resultado["errores"].append({"fila": n, "errores": {"documento": "El documento pertenece a un usuario que no es aprendiz."}})
+                continue
+            presentes = [c for c in CAMPOS_ACTUALIZABLES if c in data]
+            for campo in presentes:
+                setattr(usuario, campo, data[campo])
+            campos.update(presentes)
+            actualizados.append((n, usuario))
+            continue
+
+        password = data.pop("password", None) or _password_por_defecto(data["documento"])
+        nuevos.append((n, Usuario(rol=Usuario.Rol.APRENDIZ, **data), password))
+
+    # PBKDF2 es el cuello de botella: se reparte entre procesos
+    passwords = [p for _, _, p in nuevos]
+    hashes = pool.map(make_password, passwords, chunksize=16) if pool else map(make_password, passwords)
+    for (_, usuario, _), h in zip(nuevos, hashes):
+        usuario.password = h
+
+    nuevos = [(n, u) for n, u, _ in nuevos]
+    campos = sorted(campos)
+    try:
+        with transaction.atomic():
+            Usuario.objects.bulk_create([u for _, u in nuevos], batch_size=1000)
+            if actualizados and campos:
+                Usuario.objects.bulk_update([u for _, u in actualizados], campos, batch_size=1000)
+    except IntegrityError:
+        # Otro proceso insertó el mismo documento/username después de la
+        # consulta: se reintenta fila por fila y solo las que chocan son error
+        nuevos, actualizados = _guardar_por_fila(nuevos, actualizados, campos, resultado)
+
+    resultado["creados"] += len(nuevos)
+    resultado["actualizados"] += len(actualizados)
+
+
+def _guardar_por_fila(nuevos, actualizados, campos, resultado):
+    creados, cambiados = [], []
+    for n, usuario in nuevos:
+        usuario.pk = None  # el lote revertido pudo asignarlo
+        try:
+            with transaction.atomic():
+                Usuario.objects.bulk_create([usuario])
+        except IntegrityError:
+            resultado["errores"].append({"fila": n, "errores": {"documento": "Ya existe un usuario con este documento o username."}})
+            continue
+        creados.append((n, usuario))
+
+    for n, usuario in actualizados:
+        try:
+            with transaction.atomic():
+                if campos:
+                    Usuario.objects.bulk_update([usuario], campos)
+        except IntegrityError:
+            resultado["errores"].append({"fila": n, "errores": {"username": "Ya existe un usuario con este username."}})
+            continue
+        cambiados.append((n, usuario))
+
+    resultado["errores"].sort(key=lambda e: e["fila"])
+    return creados, cambiados
@@ -0,0 +1,219 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metricas
+
+logger = logging.getLogger("accesos.rendimiento")
+
+
+class Medicion:
+    """
+    Tiempos de una solicitud. Las fases se solapan: "vista" incluye auth, db y
+    el manejo de excepciones; "render" es la serialización de la respuesta a JSON.
+    """
+
+    __slots__ = ("inicio", "accion", "sede", "resultado", "sql_n", "sql_ms", "fases", "t_vista", "fin_vista_ms")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.accion = None
+        self.sede = None
+        self.resultado = None
+        self.sql_n = 0
+        self.sql_ms = 0.0
+        self.fases = {}
+        self.t_vista = None
+        self.fin_vista_ms = None
+
+    def sumar(self, fase, ms):
+        self.fases[fase] = self.fases.get(fase, 0.0) + ms
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: se llama por cada consulta de cualquier conexión
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - t0) * 1000
+            self.sql_n += 1
+
+
+def _medicion(request):
+    # Acepta HttpRequest o el Request de DRF (que envuelve al primero)
+    return getattr(getattr(request, "_request", request), "_medicion", None)
+
+
+def etiquetar_sede(request, sede):
+    """Sede de la solicitud para las métricas (la portería la conoce por el turno)."""
+    m = _medicion(request)
+    if m is not None:
+        m.sede = sede
+
+
+def etiquetar_resultado(request, resultado):
+    """Código del rechazo de un escaneo (metricas.RESULTADOS) para sadi_escaneos_total."""
+    m = _medicion(request)
+    if m is not None:
+        m.resultado = resultado
+
+
+@contextmanager
+def medir(request, fase):
+    """Suma el tiempo del bloque a `fase` si la solicitud está instrumentada."""
+    m = _medicion(request)
+    if m is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        m.sumar(fase, (time.perf_counter() - t0) * 1000)
+
+
+class ServerTimingMiddleware:
+    """
+    Agrega `Server-Timing` (db, auth, vista, excepción, render, total) a cada
+    respuesta, registra en el logger "accesos.rendimiento" las solicitudes que
+    superan SLOW_REQUEST_MS y alimenta las métricas de /metrics.
+    Con SERVER_TIMING_ENABLED=False y METRICS_ENABLED=False no se instala.
+
+    Funciona bajo WSGI y ASGI. En ASGI las consultas (del ORM async o de las
+    vistas sync) corren en el hilo sync propio de la solicitud, así que el
+    execute_wrapper se instala y se retira en ese hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.cabecera = getattr(settings, "SERVER_TIMING_ENABLED", True)
+        self.metricas = getattr(settings, "METRICS_ENABLED", True)
+        if not (self.cabecera or self.metricas):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        m = request._medicion = Medicion()
+        with ExitStack() as stack:
+            self._envolver(stack, m)
+            response = self.get_response(request)
+        return self._terminar(request, response, m)
+
+    async def __acall__(self, request):
+        m = request._medicion = Medicion()
+        stack = ExitStack()
+        await sync_to_async(self._envolver)(stack, m)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._terminar(request, response, m)
+
+    @staticmethod
+    def _envolver(stack, m):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(m))
+
+    def _terminar(self, request, response, m):
+        total_ms = (time.perf_counter() - m.inicio) * 1000
+        if m.fin_vista_ms is not None:
+            # entre el fin de la vista y aquí solo queda el render de la respuesta
+            m.fases["render"] = total_ms - m.fin_vista_ms
+
+        if self.cabecera:
+            response["Server-Timing"] = self._cabecera(m, total_ms)
+        if self.metricas:
+            metricas.registrar_solicitud(m, response, total_ms)
+        if total_ms >= self.umbral_ms:
+            self._log_lento(request, response, m, total_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        m = _medicion(request)
+        if m is None:
+            return None
+        m.accion = self._accion(request, view_func)
+        m.t_vista = time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        # Las Response de DRF pasan por aquí justo antes de renderizarse
+        m = _medicion(request)
+        if m is not None and m.t_vista is not None:
+            ahora = time.perf_counter()
+            m.fases["vista"] = (ahora - m.t_vista) * 1000
+            m.fin_vista_ms = (ahora - m.inicio) * 1000
+        return response
+
+    @staticmethod
+    def _accion(request, view_func):
+        """
+        "<basename del router>.<acción>" para los ViewSets (accesos.create,
+        equipos.list). Las vistas async de portería son funciones del módulo
+        accesos.porteria y quedan con el mismo nombre que la acción del
+        ViewSet que reemplazan (accesos.validar_documento).
+        """
+        cls = getattr(view_func, "cls", None)
+        if cls is None:
+            return f"{view_func.__module__.split('.')[0]}.{view_func.__name__}"
+        acciones = getattr(view_func, "actions", None)
+        if acciones:
+            prefijo = (getattr(view_func, "initkwargs", None) or {}).get("basename") or cls.__name__
+            return f"{prefijo}.{acciones.get(request.method.lower(), request.method.lower())}"
+        return f"{cls.__module__.split('.')[0]}.{cls.__name__}"
+
+    @staticmethod
+    def _cabecera(m, total_ms):
+        partes = [f'db;dur={m.sql_ms:.1f};desc="{m.sql_n} consultas"']
+        for fase in ("auth", "vista", "excepcion", "render"):
+            if fase in m.fases:
+                partes.append(f"{fase};dur={m.fases[fase]:.1f}")
+        partes.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(partes)
+
+    def _log_lento(self, request, response, m, total_ms):
+        registro = {
+            "evento": "solicitud_lenta",
+            "accion": m.accion,
+            "metodo": request.method,
+            "ruta": request.path,
+            "status": response.status_code,
+            "sede": m.sede,
+            "usuario_id": _usuario_id(request),
+            "total_ms": round(total_ms, 1),
+            "sql_n": m.sql_n,
+            "sql_ms": round(m.sql_ms, 1),
+            **{f"{f}_ms": round(v, 1) for f, v in m.fases.items()},
+        }
+        logger.warning(json.dumps(registro, ensure_ascii=False), extra={"rendimiento": registro})
+
+
+def _usuario_id(request):
+    usuario = getattr(request, "user", None)
+    if isinstance(usuario, SimpleLazyObject) and usuario._wrapped is empty:
+        # sin evaluar: no forzar la consulta de sesión (en ASGI ni siquiera se puede)
+        return None
+    return getattr(usuario, "pk", None)
+
+
+class JWTAuthenticationMedida(JWTAuthentication):
+    # Igual que JWTAuthentication, pero su tiempo aparece como fase "auth"
+    def authenticate(self, request):
+        with medir(request, "auth"):
+            return super().authenticate(request)
@@ -0,0 +1,287 @@
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accesos import tablero
+from accesos.cache_equipos import invalidar
+from accesos.models import Acceso, Equipo, Turno, Usuario
+
+# Todo lo sembrado usa este prefijo para poder limpiarlo sin tocar datos reales
+PREFIJO = "carga_"
+DOC_BASE = 9_900_000_000
+
+ENDPOINT_VALIDAR = "validar_documento"
+ENDPOINT_REGISTRAR = "registrar_por_documento"
+
+
+def _rss_mb(pid):
+    """RSS del proceso y sus hijos (workers de gunicorn/uvicorn), leído de /proc."""
+    hijos = {}
+    for entrada in os.listdir("/proc"):
+        if entrada.isdigit():
+            try:
+                with open(f"/proc/{entrada}/stat") as f:
+                    # el nombre va entre paréntesis y puede tener espacios
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            hijos.setdefault(ppid, []).append(int(entrada))
+
+    total_kb, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with open(f"/proc/{actual}/status") as f:
+                total_kb += next((int(l.split()[1]) for l in f if l.startswith("VmRSS:")), 0)
+        except OSError:
+            continue
+        pendientes.extend(hijos.get(actual, []))
+    return total_kb / 1024
+
+
+def _percentil(ordenados, p):
+    # nearest-rank sobre una lista ya ordenada
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del cambio de turno: siembra datos y simula guardas concurrentes "
+        "llamando validar_documento + registrar_por_documento contra un servidor local. "
+        "Para comparar WSGI y ASGI, correrlo contra cada despliegue con --pid/--workers/--resultado "
+        "y luego --comparar"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Servidor ya levantado (runserver/gunicorn)")
+        parser.add_argument("--guardas", type=int, default=8, help="Guardas simulados (uno por hilo)")
+        parser.add_argument("--aprendices", type=int, default=2000)
+        parser.add_argument("--equipos-max", type=int, default=2, help="Equipos aprobados por aprendiz (0..N)")
+        parser.add_argument("--escaneos", type=int, default=200, help="Escaneos por guarda (validar + registrar)")
+        parser.add_argument("--seed", type=int, default=42, help="Semilla aleatoria (reproducibilidad)")
+        parser.add_argument("--solo-sembrar", action="store_true", help="Siembra y termina")
+        parser.add_argument("--limpiar", action="store_true", help="Borra los datos sembrados y termina")
+        parser.add_argument("--pid", type=int, help="PID del proceso maestro del servidor: mide la memoria (RSS) con sus workers")
+        parser.add_argument("--workers", type=int, default=1, help="Workers del servidor, para reportar req/s por worker")
+        parser.add_argument("--etiqueta", default="", help="Nombre de la corrida (p. ej. wsgi-sync, asgi-uvicorn)")
+        parser.add_argument("--resultado", help="Agrega el resumen de la corrida a este archivo JSONL")
+        parser.add_argument("--comparar", help="Imprime la comparación de las corridas guardadas en este JSONL y termina")
+
+    def handle(self, *args, **options):
+        if options["comparar"]:
+            self._comparar(options["comparar"])
+            return
+
+        if options["limpiar"]:
+            borrados, _ = Usuario.objects.filter(username__startswith=PREFIJO).delete()
+            self.stdout.write(self.style.SUCCESS(f"Registros borrados: {borrados}"))
+            return
+
+        if options["guardas"] < 1 or options["aprendices"] < options["guardas"]:
+            raise CommandError("Se necesita al menos un guarda y un aprendiz por guarda.")
+
+        random.seed(options["seed"])
+        guardas, aprendices = self._sembrar(options)
+        self.stdout.write(self.style.SUCCESS(f"Sembrados: {len(guardas)} guardas, {len(aprendices)} aprendices"))
+        if options["solo_sembrar"]:
+            return
+
+        self._correr(options, guardas, aprendices)
+
+    # ---------- datos ----------
+    @transaction.atomic
+    def _sembrar(self, options):
+        sedes = Turno.Sede.values
+        password = make_password(None)  # inutilizable: los guardas usan JWT emitido aquí
+
+        existentes = set(Usuario.objects.filter(username__startswith=PREFIJO).values_list("username", flat=True))
+
+        nuevos = [
+            Usuario(username=f"{PREFIJO}guarda_{i}", rol=Usuario.Rol.GUARDA, password=password)
+            for i in range(options["guardas"])
+            if f"{PREFIJO}guarda_{i}" not in existentes
+        ]
+        nuevos += [
+            Usuario(
+                username=f"{PREFIJO}ap_{i}",
+                rol=Usuario.Rol.APRENDIZ,
+                documento=str(DOC_BASE + i),
+                sede_principal=sedes[i % len(sedes)],
+                password=password,
+            )
+            for i in range(options["aprendices"])
+            if f"{PREFIJO}ap_{i}" not in existentes
+        ]
+        Usuario.objects.bulk_create(nuevos, batch_size=1000)
+
+        guardas = list(Usuario.objects.filter(username__startswith=f"{PREFIJO}guarda_").order_by("id")[: options["guardas"]])
+        aprendices = list(Usuario.objects.filter(username__startswith=f"{PREFIJO}ap_").order_by("id")[: options["aprendices"]])
+
+        # Equipos aprobados (solo para aprendices que aún no tienen)
+        con_equipos = set(Equipo.objects.filter(propietario__in=aprendices).values_list("propietario_id", flat=True))
+        Equipo.objects.bulk_create(
+            [
+                Equipo(
+                    propietario=a,
+                    serial=f"{PREFIJO}{a.id}_{n}",
+                    marca="Carga",
+                    modelo="LT",
+                    estado=Equipo.Estado.APROBADO,
+                )
+                for a in aprendices
+                if a.id not in con_equipos
+                for n in range(random.randint(0, options["equipos_max"]))
+            ],
+            batch_size=1000,
+        )
+        # bulk_create no emite señales: el cache compartido del servidor tendría listas viejas
+        invalidar([a.id for a in aprendices])
+
+        # Estado inicial conocido: todos fuera, un turno activo por guarda
+        Acceso.objects.filter(usuario__in=aprendices).delete()
+        Turno.objects.filter(guarda__in=guardas, activo=True).delete()
+        Turno.objects.bulk_create(
+            [Turno(guarda=g, sede=sedes[i % len(sedes)], jornada=Turno.Jornada.MANANA) for i, g in enumerate(guardas)]
+        )
+        tablero.invalidar()
+        return guardas, aprendices
+
+    # ---------- carga ----------
+    def _correr(self, options, guardas, aprendices):
+        base = options["url"].rstrip("/") + "/api/accesos/"
+        latencias = defaultdict(list)
+        estados = defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+
+        # Cada guarda atiende su propio grupo de aprendices: sin carreras entre hilos sobre el mismo aprendiz
+        grupos = [aprendices[i :: len(guardas)] for i in range(len(guardas))]
+
+        def post(token, endpoint, payload):
+            req = urllib.request.Request(
+                base + endpoint + "/",
+                data=json.dumps(payload).encode("utf-8"),
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                method="POST",
+            )
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=30) as r:
+                    code, body = r.status, r.read()
+            except urllib.error.HTTPError as e:
+                code, body = e.code, e.read()
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                latencias[endpoint].append(ms)
+                estados[endpoint][code] += 1
+            try:
+                return code, json.loads(body or b"{}")
+            except ValueError:
+                return code, {}
+
+        def guarda(idx):
+            token = str(RefreshToken.for_user(guardas[idx]).access_token)
+            rng = random.Random(options["seed"] + idx)
+            grupo = grupos[idx]
+            dentro = {}  # documento -> ids de equipos con los que ingresó
+
+            for _ in range(options["escaneos"]):
+                aprendiz = rng.choice(grupo)
+                code, data = post(token, ENDPOINT_VALIDAR, {"documento": aprendiz.documento})
+                if code != 200:
+                    continue
+
+                if aprendiz.documento in dentro:
+                    payload = {"documento": aprendiz.documento, "tipo": "salida", "equipos": dentro[aprendiz.documento]}
+                else:
+                    aprobados = [e["id"] for e in data.get("equipos", [])]
+                    payload = {
+                        "documento": aprendiz.documento,
+                        "tipo": "ingreso",
+                        "equipos": rng.sample(aprobados, rng.randint(0, len(aprobados))),
+                    }
+
+                code, _ = post(token, ENDPOINT_REGISTRAR, payload)
+                if code == 201:
+                    if payload["tipo"] == "ingreso":
+                        dentro[aprendiz.documento] = payload["equipos"]
+                    else:
+                        dentro.pop(aprendiz.documento, None)
+
+        # Memoria del servidor: muestreo cada 0.5 s mientras dura la carga
+        rss = []
+        fin = threading.Event()
+
+        def muestrear():
+            while not fin.is_set():
+                rss.append(_rss_mb(options["pid"]))
+                fin.wait(0.5)
+
+        if options["pid"]:
+            rss.append(_rss_mb(options["pid"]))
+            threading.Thread(target=muestrear, daemon=True).start()
+
+        self.stdout.write(f"Corriendo {len(guardas)} guardas x {options['escaneos']} escaneos contra {base} ...")
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(guardas)) as pool:
+            list(pool.map(guarda, range(len(guardas))))
+        total_s = time.perf_counter() - t0
+        fin.set()
+
+        self.stdout.write(f"\nDuración: {total_s:.2f}s")
+        self.stdout.write(f"{'endpoint':<26}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  códigos")
+        for endpoint in [ENDPOINT_VALIDAR, ENDPOINT_REGISTRAR]:
+            vals = sorted(latencias[endpoint])
+            codigos = ", ".join(f"{c}:{n}" for c, n in sorted(estados[endpoint].items()))
+            self.stdout.write(
+                f"{endpoint:<26}{len(vals):>7}{len(vals) / total_s:>9.1f}"
+                f"{_percentil(vals, 50):>9.1f}{_percentil(vals, 95):>9.1f}{_percentil(vals, 99):>9.1f}  {codigos}"
+            )
+
+        todas = sorted(v for vals in latencias.values() for v in vals)
+        resumen = {
+            "etiqueta": options["etiqueta"] or options["url"],
+            "concurrencia": len(guardas),
+            "workers": options["workers"],
+            "reqs": len(todas),
+            "req_s": round(len(todas) / total_s, 1),
+            "req_s_worker": round(len(todas) / total_s / options["workers"], 1),
+            "p50_ms": round(_percentil(todas, 50), 1),
+            "p95_ms": round(_percentil(todas, 95), 1),
+            "errores": sum(n for cods in estados.values() for c, n in cods.items() if c >= 500),
+            "rss_inicio_mb": round(rss[0], 1) if rss else None,
+            "rss_pico_mb": round(max(rss), 1) if rss else None,
+        }
+        self.stdout.write(
+            f"\nTotal: {resumen['req_s']} req/s ({resumen['req_s_worker']} por worker), errores 5xx: {resumen['errores']}"
+        )
+        if rss:
+            self.stdout.write(f"Memoria del servidor: {resumen['rss_inicio_mb']} MB al inicio, pico {resumen['rss_pico_mb']} MB")
+        if options["resultado"]:
+            with open(options["resultado"], "a", encoding="utf-8") as f:
+                f.write(json.dumps(resumen) + "\n")
+
+    def _comparar(self, archivo):
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                corridas = [json.loads(linea) for linea in f if linea.strip()]
+        except OSError as e:
+            raise CommandError(f"No se pudo leer {archivo}: {e}")
+
+        columnas = ["concurrencia", "workers", "req_s", "req_s_worker", "p50_ms", "p95_ms", "errores", "rss_pico_mb"]
+        self.stdout.write(f"{'corrida':<22}" + "".join(f"{c:>14}" for c in columnas))
+        for r in corridas:
+            self.stdout.write(f"{r['etiqueta'][:21]:<22}" + "".join(f"{str(r.get(c)):>14}" for c in columnas))
@@ -1,54 +1,101 @@
-from django.core.management.base import BaseCommand
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from accesos import tablero
 from accesos.models import Turno
 
+# Reglas de auditoría: nombre -> condición que detecta el registro inconsistente
+REGLA_FIN_ANTES_INICIO = "fin_antes_inicio"
+REGLA_ACTIVO_CON_FIN = "activo_con_fin"
+REGLA_INACTIVO_SIN_FIN = "inactivo_sin_fin"
+
+REGLAS = {
+    REGLA_FIN_ANTES_INICIO: Q(fin__isnull=False, fin__lt=F("inicio")),
+    REGLA_ACTIVO_CON_FIN: Q(activo=True, fin__isnull=False),
+    REGLA_INACTIVO_SIN_FIN: Q(activo=False, fin__isnull=True),
+}
+
+
 class Command(BaseCommand):
     help = "Audita y corrige turnos inconsistentes (fin < inicio, activo/fin incoherente)"
 
     def add_arguments(self, parser):
         parser.add_argument("--apply", action="store_true", help="Aplica correcciones")
+        parser.add_argument("--sede", choices=Turno.Sede.values, help="Limita la auditoría a una sede")
+        parser.add_argument("--since", help="Solo turnos iniciados desde esta fecha (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Filas por transacción al aplicar")
 
     def handle(self, *args, **options):
         apply = options["apply"]
-        now = timezone.now()
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size debe ser mayor que 0")
 
         qs = Turno.objects.all()
-        total = qs.count()
-
-        bad = 0
-        fixed = 0
-
-        for t in qs.iterator():
-            changed = False
-
-            # fin < inicio
-            if t.fin is not None and t.inicio is not None and t.fin < t.inicio:
-                bad += 1
-                if apply:
-                    t.fin = t.inicio
-                    changed = True
-
-            # activo=True pero fin existe
-            if t.activo and t.fin is not None:
-                bad += 1
-                if apply:
-                    t.activo = False
-                    changed = True
-
-            # activo=False pero fin es NULL
-            if (not t.activo) and (t.fin is None):
-                bad += 1
-                if apply:
-                    t.fin = now
-                    changed = True
-
-            if apply and changed:
-                t.save(update_fields=["activo", "fin"])
-                fixed += 1
-
-        self.stdout.write(self.style.WARNING(f"Total turnos: {total}"))
-        self.stdout.write(self.style.WARNING(f"Inconsistentes detectados: {bad}"))
-        if apply:
-            self.stdout.write(self.style.SUCCESS(f"Registros corregidos: {fixed}"))
-        else:
+
+        if options["sede"]:
+            qs = qs.filter(sede=options["sede"])
+
+        if options["since"]:
+            since = parse_date(options["since"])
+            if since is None:
+                raise CommandError("--since debe tener formato YYYY-MM-DD")
+            qs = qs.filter(inicio__gte=timezone.make_aware(datetime.combine(since, time.min)))
+
+        # Un único SELECT con los conteos por regla
+        conteos = qs.aggregate(
+            total=Count("id"),
+            **{nombre: Count("id", filter=cond) for nombre, cond in REGLAS.items()},
+        )
+
+        self.stdout.write(self.style.WARNING(f"Total turnos: {conteos['total']}"))
+        for nombre in REGLAS:
+            self.stdout.write(self.style.WARNING(f"  {nombre}: {conteos[nombre]}"))
+
+        if not apply:
             self.stdout.write("DRY-RUN: ejecuta con --apply para corregir")
+            return
+
+        corregidos = self._aplicar(qs, batch_size)
+        for nombre, n in corregidos.items():
+            self.stdout.write(self.style.SUCCESS(f"  {nombre} corregidos: {n}"))
+
+    def _aplicar(self, qs, batch_size):
+        """
+        Aplica las reglas como UPDATE por lotes de ids; cada lote es una transacción.
+        El orden importa: primero se repara fin < inicio, luego la coherencia activo/fin.
+        """
+        now = timezone.now()
+        corregidos = {nombre: 0 for nombre in REGLAS}
+
+        # Solo recorremos el rango de ids que contiene filas inconsistentes
+        malos = qs.filter(REGLAS[REGLA_FIN_ANTES_INICIO] | REGLAS[REGLA_ACTIVO_CON_FIN] | REGLAS[REGLA_INACTIVO_SIN_FIN])
+        rango = malos.aggregate(min_id=Min("id"), max_id=Max("id"))
+        if rango["min_id"] is None:
+            return corregidos
+
+        lo = rango["min_id"]
+        while lo <= rango["max_id"]:
+            lote = qs.filter(id__gte=lo, id__lt=lo + batch_size)
+            with transaction.atomic():
+                corregidos[REGLA_FIN_ANTES_INICIO] += lote.filter(REGLAS[REGLA_FIN_ANTES_INICIO]).update(
+                    fin=F("inicio"), actualizado_en=now
+                )
+                corregidos[REGLA_ACTIVO_CON_FIN] += lote.filter(REGLAS[REGLA_ACTIVO_CON_FIN]).update(
+                    activo=False, actualizado_en=now
+                )
+                corregidos[REGLA_INACTIVO_SIN_FIN] += lote.filter(REGLAS[REGLA_INACTIVO_SIN_FIN]).update(
+                    fin=Greatest(Value(now), F("inicio")), actualizado_en=now
+                )
+            lo += batch_size
+
+        # UPDATE masivo: el tablero cuenta los turnos activos
+        if corregidos[REGLA_ACTIVO_CON_FIN]:
+            tablero.invalidar()
+        return corregidos
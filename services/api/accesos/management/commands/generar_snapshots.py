@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accesos.models import Turno
+from accesos.snapshots import generar_snapshot
+
+
+class Command(BaseCommand):
+    help = "Genera el padrón offline de cada sede (solo crea versión nueva si cambió)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sede", choices=Turno.Sede.values, help="Solo esta sede")
+        parser.add_argument("--intervalo", type=int, default=0, help="Repetir cada N segundos (0 = una sola pasada)")
+
+    def handle(self, *args, **options):
+        sedes = [options["sede"]] if options["sede"] else Turno.Sede.values
+        while True:
+            for sede in sedes:
+                snap = generar_snapshot(sede)
+                self.stdout.write(f"{sede}: v{snap.version} ({snap.aprendices} aprendices, {len(snap.contenido)} bytes)")
+            if not options["intervalo"]:
+                return
+            time.sleep(options["intervalo"])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accesos.importacion import importar_aprendices, leer_filas
+
+
+class Command(BaseCommand):
+    help = "Importa aprendices desde un archivo CSV o JSONL (upsert por documento)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta al archivo .csv o .jsonl")
+        parser.add_argument("--formato", choices=["csv", "jsonl"], help="Por defecto se toma de la extensión")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Filas validadas/insertadas por lote")
+        parser.add_argument("--workers", type=int, default=None, help="Procesos para hashear contraseñas")
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        formato = options["formato"] or ruta.rsplit(".", 1)[-1].lower()
+        if formato not in ["csv", "jsonl"]:
+            raise CommandError("Formato no soportado (csv o jsonl).")
+
+        try:
+            with open(ruta, encoding="utf-8-sig", newline="") as f:
+                resultado = importar_aprendices(
+                    leer_filas(f, formato),
+                    chunk_size=options["chunk_size"],
+                    workers=options["workers"],
+                )
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+
+        for err in resultado["errores"]:
+            self.stdout.write(self.style.ERROR(f"Fila {err['fila']}: {err['errores']}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Creados: {resultado['creados']}"))
+        self.stdout.write(self.style.SUCCESS(f"Actualizados: {resultado['actualizados']}"))
+        self.stdout.write(self.style.WARNING(f"Errores: {len(resultado['errores'])}"))
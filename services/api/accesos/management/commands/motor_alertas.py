@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accesos.alertas import procesar
+
+
+class Command(BaseCommand):
+    help = "Evalúa las reglas de alertas sobre los eventos nuevos y emite las notificaciones en lote"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=int, default=0, help="Repetir cada N segundos (0 = una sola pasada)")
+
+    def handle(self, *args, **options):
+        while True:
+            resultado = procesar()
+            self.stdout.write(f"{resultado['eventos']} eventos, {resultado['alertas']} alertas")
+            if not options["intervalo"]:
+                return
+            time.sleep(options["intervalo"])
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accesos.models import Borrado
+
+
+class Command(BaseCommand):
+    help = "Elimina lápidas de sincronización delta más viejas que la retención"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=None,
+            help="Retención en días (por defecto BORRADOS_RETENCION_DIAS)",
+        )
+
+    def handle(self, *args, **options):
+        dias = options["dias"] if options["dias"] is not None else getattr(settings, "BORRADOS_RETENCION_DIAS", 30)
+        if dias < 1:
+            raise CommandError("--dias debe ser mayor que 0")
+
+        borrados, _ = Borrado.objects.filter(borrado_en__lt=timezone.now() - timedelta(days=dias)).delete()
+        self.stdout.write(self.style.SUCCESS(f"Lápidas eliminadas: {borrados}"))
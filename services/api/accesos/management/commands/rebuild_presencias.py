@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accesos.presencia import reconstruir_presencias
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el roster de presencia (quién está dentro) a partir de Acceso"
+
+    def handle(self, *args, **options):
+        total = reconstruir_presencias()
+        self.stdout.write(self.style.SUCCESS(f"Presencias reconstruidas: {total}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from accesos.asistencia import reconstruir, refrescar
+
+
+class Command(BaseCommand):
+    help = "Aplica los accesos nuevos a la asistencia diaria por aprendiz (o la reconstruye desde cero)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reconstruir", action="store_true", help="Borra y recalcula todo (tras editar o borrar accesos viejos)"
+        )
+
+    def handle(self, *args, **options):
+        if options["reconstruir"]:
+            total = reconstruir()
+            self.stdout.write(self.style.SUCCESS(f"Asistencia reconstruida: {total} aprendices"))
+            return
+        total = refrescar()
+        self.stdout.write(f"Accesos aplicados: {total}")
@@ -0,0 +1,233 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+# Límites superiores (ms) de los histogramas; el último bucket es +Inf
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+AYUDA = {
+    "sadi_solicitudes_total": ("counter", "Solicitudes atendidas por acción y código HTTP."),
+    "sadi_solicitud_duracion_ms": ("histogram", "Latencia de la solicitud (ms) por acción y sede."),
+    "sadi_db_duracion_ms": ("histogram", "Tiempo en base de datos por solicitud (ms) por acción."),
+    "sadi_escaneos_total": ("counter", "Resultado de los escaneos en portería por sede."),
+    "sadi_turnos_activos": ("gauge", "Turnos activos por sede."),
+    "sadi_cache_equipos_total": ("counter", "Lecturas del cache de equipos aprobados (hit, miss, stale)."),
+}
+
+# Acciones de portería cuyo resultado se cuenta en sadi_escaneos_total. Son
+# etiquetas "<basename>.<acción>" (instrumentacion._accion): accesos.create es
+# solo el alta manual de AccesoViewSet, no el create de los demás ViewSets.
+ACCIONES_ESCANEO = {"accesos.validar_documento", "accesos.registrar_por_documento", "accesos.create"}
+
+# Códigos que marcan las vistas con instrumentacion.etiquetar_resultado;
+# cualquier otro (p. ej. errores del serializer) se cuenta como "otro"
+RESULTADOS = frozenset({
+    "bloqueado",
+    "credencial",
+    "doble_ingreso",
+    "doble_salida",
+    "equipo_ajeno",
+    "equipo_inexistente",
+    "equipo_no_aprobado",
+    "equipo_ya_dentro",
+    "equipos_no_coinciden",
+    "no_aprendiz",
+    "no_registrado",
+    "salida_invalida",
+    "sin_turno",
+})
+
+# =========================
+# Registro en memoria (por proceso)
+# =========================
+_lock = threading.Lock()
+_contadores = {}
+_histogramas = {}
+_volcador = {"pid": None}
+_proceso = {"pid": None, "nombre": None}
+
+
+def _etiquetas(**kw):
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in kw.items()))
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = (nombre, _etiquetas(**etiquetas))
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+    _asegurar_volcador()
+
+
+def observar(nombre, valor_ms, **etiquetas):
+    clave = (nombre, _etiquetas(**etiquetas))
+    i = bisect_left(BUCKETS_MS, valor_ms)
+    with _lock:
+        h = _histogramas.get(clave)
+        if h is None:
+            h = _histogramas[clave] = [[0] * (len(BUCKETS_MS) + 1), 0.0, 0]
+        h[0][i] += 1
+        h[1] += valor_ms
+        h[2] += 1
+    _asegurar_volcador()
+
+
+def resultado_escaneo(medicion, response):
+    if medicion.resultado in RESULTADOS:
+        return medicion.resultado
+    if medicion.resultado is None and 200 <= response.status_code < 300:
+        return "permitido"
+    return "otro"
+
+
+def registrar_solicitud(medicion, response, total_ms):
+    """Lo llama el middleware al final de cada solicitud instrumentada."""
+    accion = medicion.accion or "sin_vista"
+    incrementar("sadi_solicitudes_total", accion=accion, status=response.status_code)
+    observar("sadi_solicitud_duracion_ms", total_ms, accion=accion, sede=medicion.sede)
+    observar("sadi_db_duracion_ms", medicion.sql_ms, accion=accion)
+    if accion in ACCIONES_ESCANEO:
+        incrementar("sadi_escaneos_total", sede=medicion.sede, resultado=resultado_escaneo(medicion, response))
+
+
+# =========================
+# Almacén compartido entre workers: un archivo JSON por proceso en METRICS_DIR
+# =========================
+def _directorio():
+    d = Path(getattr(settings, "METRICS_DIR", None) or Path(tempfile.gettempdir()) / "sadi_metricas")
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _nombre_proceso():
+    # pid + arranque: un worker nuevo que hereda el pid de uno muerto no suma sus contadores
+    if _proceso["pid"] != os.getpid():
+        _proceso["pid"] = os.getpid()
+        _proceso["nombre"] = f"worker-{os.getpid()}-{time.time_ns()}"
+    return _proceso["nombre"]
+
+
+def _instantanea():
+    with _lock:
+        return {
+            "contadores": [[n, list(e), v] for (n, e), v in _contadores.items()],
+            "histogramas": [[n, list(e), list(h[0]), h[1], h[2]] for (n, e), h in _histogramas.items()],
+        }
+
+
+def volcar():
+    # Escribe a un temporal y renombra: quien lea nunca ve un archivo a medias
+    d = _directorio()
+    nombre = _nombre_proceso()
+    destino = d / f"{nombre}.json"
+    tmp = d / f".{nombre}.tmp"
+    tmp.write_text(json.dumps(_instantanea()), encoding="utf-8")
+    os.replace(tmp, destino)
+
+
+def _asegurar_volcador():
+    # Un hilo por proceso (se re-crea tras el fork de gunicorn); el I/O queda fuera del request
+    if _volcador["pid"] == os.getpid():
+        return
+    with _lock:
+        if _volcador["pid"] == os.getpid():
+            return
+        _volcador["pid"] = os.getpid()
+    intervalo = getattr(settings, "METRICS_FLUSH_SECONDS", 5)
+
+    def ciclo():
+        while True:
+            time.sleep(intervalo)
+            try:
+                volcar()
+            except OSError:
+                pass
+
+    threading.Thread(target=ciclo, name="sadi-metricas", daemon=True).start()
+
+
+def _agregar():
+    """
+    Suma los archivos de los workers vivos. Cada worker reescribe el suyo cada
+    METRICS_FLUSH_SECONDS aunque esté ocioso: el que no se toca en
+    METRICS_STALE_SECONDS es de un proceso que terminó y se borra (Prometheus
+    lo ve como un reinicio del contador).
+    """
+    contadores, histogramas = {}, {}
+    limite = time.time() - getattr(settings, "METRICS_STALE_SECONDS", 60)
+    for archivo in _directorio().glob("worker-*.json"):
+        try:
+            if archivo.stat().st_mtime < limite:
+                archivo.unlink(missing_ok=True)
+                continue
+            datos = json.loads(archivo.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        for n, e, v in datos["contadores"]:
+            clave = (n, tuple(map(tuple, e)))
+            contadores[clave] = contadores.get(clave, 0) + v
+        for n, e, buckets, suma, total in datos["histogramas"]:
+            clave = (n, tuple(map(tuple, e)))
+            h = histogramas.setdefault(clave, [[0] * len(buckets), 0.0, 0])
+            h[0] = [a + b for a, b in zip(h[0], buckets)]
+            h[1] += suma
+            h[2] += total
+    return contadores, histogramas
+
+
+# =========================
+# Exposición en formato de texto de Prometheus
+# =========================
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(etiquetas):
+    if not etiquetas:
+        return ""
+    partes = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas)
+    return "{" + partes + "}"
+
+
+def exponer(turnos_activos):
+    """
+    Texto para /metrics: agrega los archivos de todos los workers (volcando
+    antes el propio) y suma el gauge de turnos activos, que se lee de la BD.
+    """
+    volcar()
+    contadores, histogramas = _agregar()
+    lineas = []
+
+    def cabecera(nombre):
+        tipo, ayuda = AYUDA[nombre]
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+
+    for nombre in ("sadi_solicitudes_total", "sadi_escaneos_total", "sadi_cache_equipos_total"):
+        cabecera(nombre)
+        for (n, e), v in sorted(contadores.items()):
+            if n == nombre:
+                lineas.append(f"{n}{_fmt(e)} {v}")
+
+    for nombre in ("sadi_solicitud_duracion_ms", "sadi_db_duracion_ms"):
+        cabecera(nombre)
+        for (n, e), (buckets, suma, total) in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            acumulado = 0
+            for limite, c in zip([*BUCKETS_MS, "+Inf"], buckets):
+                acumulado += c
+                lineas.append(f"{n}_bucket{_fmt((*e, ('le', str(limite))))} {acumulado}")
+            lineas.append(f"{n}_sum{_fmt(e)} {suma:.3f}")
+            lineas.append(f"{n}_count{_fmt(e)} {total}")
+
+    cabecera("sadi_turnos_activos")
+    for sede, n in sorted(turnos_activos.items()):
+        lineas.append(f"sadi_turnos_activos{_fmt((('sede', sede),))} {n}")
+
+    return "\n".join(lineas) + "\n"
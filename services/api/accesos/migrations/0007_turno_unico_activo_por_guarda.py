@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:45
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+def cerrar_turnos_activos_duplicados(apps, schema_editor):
+    # Antes de crear el índice único: deja solo el turno activo más reciente por guarda
+    Turno = apps.get_model("accesos", "Turno")
+    mas_reciente = (
+        Turno.objects.filter(guarda=OuterRef("guarda"), activo=True)
+        .order_by("-inicio", "-id")
+        .values("id")[:1]
+    )
+    (
+        Turno.objects.filter(activo=True)
+        .exclude(id=Subquery(mas_reciente))
+        .update(activo=False, fin=Greatest(Value(timezone.now()), F("inicio")))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0006_turno_turno_fin_gte_inicio_or_null_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_turnos_activos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='turno',
+            constraint=models.UniqueConstraint(condition=models.Q(('activo', True)), fields=('guarda',), name='turno_unico_activo_por_guarda'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0007_turno_unico_activo_por_guarda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turno',
+            name='reporte_cierre',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
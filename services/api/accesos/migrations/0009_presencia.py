@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def poblar_presencias(apps, schema_editor):
+    # Estado inicial: aprendices cuyo último acceso es un ingreso
+    Acceso = apps.get_model("accesos", "Acceso")
+    Presencia = apps.get_model("accesos", "Presencia")
+    ultimo = Acceso.objects.filter(usuario=OuterRef("usuario")).order_by("-fecha", "-id").values("id")[:1]
+    ingresos = Acceso.objects.filter(id=Subquery(ultimo), tipo="ingreso").only("id", "usuario_id", "sede", "fecha")
+    Presencia.objects.bulk_create(
+        [Presencia(usuario_id=a.usuario_id, sede=a.sede, ingreso_id=a.id, desde=a.fecha) for a in ingresos.iterator(chunk_size=2000)],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0008_turno_reporte_cierre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Presencia',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presencia', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('sede', models.CharField(blank=True, choices=[('CEGAFE', 'CEGAFE'), ('SANTA_CLARA', 'SANTA CLARA'), ('ITEDRIS', 'ITEDRIS'), ('GASTRONOMIA', 'GASTRONOMIA')], max_length=30, null=True)),
+                ('desde', models.DateTimeField()),
+                ('ingreso', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='presencia', to='accesos.acceso')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sede', 'desde'], name='accesos_pre_sede_e4bee2_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_presencias, migrations.RunPython.noop),
+    ]
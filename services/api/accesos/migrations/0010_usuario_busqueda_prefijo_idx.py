@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:10
+
+from django.db import migrations
+
+# Índices para búsquedas por prefijo (/api/usuarios/buscar/).
+# Django compila `startswith` como col::text LIKE 'x%' e `istartswith` como
+# UPPER(col::text) LIKE UPPER('x%'); solo *_pattern_ops permite usar btree ahí.
+INDICES = {
+    "usuario_documento_prefijo_idx": '(("documento")::text text_pattern_ops)',
+    "usuario_username_prefijo_idx": '(UPPER(("username")::text) text_pattern_ops)',
+    "usuario_first_name_prefijo_idx": '(UPPER(("first_name")::text) text_pattern_ops)',
+    "usuario_last_name_prefijo_idx": '(UPPER(("last_name")::text) text_pattern_ops)',
+}
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for nombre, expr in INDICES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{nombre}" ON "accesos_usuario" {expr}')
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for nombre in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{nombre}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0009_presencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
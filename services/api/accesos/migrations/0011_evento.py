@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0010_usuario_busqueda_prefijo_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('acceso_creado', 'Acceso creado'), ('equipo_revisado', 'Equipo revisado'), ('turno_abierto', 'Turno abierto'), ('turno_cerrado', 'Turno cerrado'), ('usuario_bloqueado', 'Usuario bloqueado'), ('usuario_desbloqueado', 'Usuario desbloqueado')], max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('sede', models.CharField(blank=True, choices=[('CEGAFE', 'CEGAFE'), ('SANTA_CLARA', 'SANTA CLARA'), ('ITEDRIS', 'ITEDRIS'), ('GASTRONOMIA', 'GASTRONOMIA')], max_length=30, null=True)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sede', 'id'], name='accesos_eve_sede_8bd5c0_idx')],
+            },
+        ),
+    ]
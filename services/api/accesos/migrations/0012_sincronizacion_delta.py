@@ -0,0 +1,67 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0011_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Borrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('equipo', 'Equipo'), ('notificacion', 'Notificación'), ('turno', 'Turno')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('alcance_usuario_id', models.BigIntegerField(blank=True, null=True)),
+                ('alcance_rol', models.CharField(blank=True, choices=[('admin', 'Admin'), ('guarda', 'Guarda'), ('aprendiz', 'Aprendiz')], max_length=20, null=True)),
+                ('borrado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='equipo',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='turno',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='equipo',
+            index=models.Index(fields=['actualizado_en'], name='accesos_equ_actuali_4b7d72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipo',
+            index=models.Index(fields=['propietario', 'actualizado_en'], name='accesos_equ_propiet_5596df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['updated_at'], name='accesos_not_updated_09e5e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['actualizado_en'], name='accesos_tur_actuali_f88fbc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['guarda', 'actualizado_en'], name='accesos_tur_guarda__c0dd72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrado',
+            index=models.Index(fields=['modelo', 'borrado_en'], name='accesos_bor_modelo_91a762_idx'),
+        ),
+    ]
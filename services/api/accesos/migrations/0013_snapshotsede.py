@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0012_sincronizacion_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotSede',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sede', models.CharField(choices=[('CEGAFE', 'CEGAFE'), ('SANTA_CLARA', 'SANTA CLARA'), ('ITEDRIS', 'ITEDRIS'), ('GASTRONOMIA', 'GASTRONOMIA')], max_length=30)),
+                ('version', models.PositiveIntegerField()),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('verificado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('contenido', models.BinaryField()),
+                ('delta', models.BinaryField(blank=True, null=True)),
+                ('huella', models.CharField(max_length=64)),
+                ('aprendices', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sede', 'version'), name='snapshot_sede_version_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0013_snapshotsede'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='credencial_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0014_usuario_credencial_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoAlertas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('reglas', models.JSONField(blank=True, default=dict)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='clave',
+            field=models.CharField(blank=True, max_length=120, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo',
+            field=models.CharField(choices=[('acceso_creado', 'Acceso creado'), ('equipo_revisado', 'Equipo revisado'), ('turno_abierto', 'Turno abierto'), ('turno_cerrado', 'Turno cerrado'), ('usuario_bloqueado', 'Usuario bloqueado'), ('usuario_desbloqueado', 'Usuario desbloqueado'), ('escaneo_rechazado', 'Escaneo rechazado')], max_length=30),
+        ),
+    ]
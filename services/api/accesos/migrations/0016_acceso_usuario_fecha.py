@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+from accesos.operaciones import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0015_alertas'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='acceso',
+            index=models.Index(fields=['usuario', 'fecha'], name='accesos_acc_usuario_750d3b_idx'),
+        ),
+    ]
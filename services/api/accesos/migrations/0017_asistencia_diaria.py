@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0016_acceso_usuario_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AsistenciaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('segundos', models.PositiveIntegerField(default=0)),
+                ('visitas', models.PositiveSmallIntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asistencias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dia'], name='accesos_asi_dia_4122cb_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'dia'), name='asistencia_usuario_dia_unica')],
+            },
+        ),
+    ]
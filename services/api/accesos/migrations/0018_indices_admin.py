@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+from accesos.operaciones import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0017_asistencia_diaria'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='acceso',
+            index=models.Index(fields=['fecha'], name='accesos_acc_fecha_e25ad7_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='acceso',
+            index=models.Index(fields=['sede', 'fecha'], name='accesos_acc_sede_d7dc38_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='equipo',
+            index=models.Index(fields=['creado_en'], name='accesos_equ_creado__fd31bb_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='equipo',
+            index=models.Index(fields=['estado', 'creado_en'], name='accesos_equ_estado_48aa6c_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='turno',
+            index=models.Index(fields=['inicio'], name='accesos_tur_inicio_562662_idx'),
+        ),
+    ]
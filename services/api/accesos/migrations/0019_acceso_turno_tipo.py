@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+from accesos.operaciones import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0018_indices_admin'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='acceso',
+            index=models.Index(fields=['turno', 'tipo'], name='accesos_acc_turno_i_8aeb09_idx'),
+        ),
+    ]
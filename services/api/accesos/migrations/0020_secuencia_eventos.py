@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def iniciar_secuencia(apps, schema_editor):
+    # Sigue después del último id que dio el autoincremental
+    Evento = apps.get_model("accesos", "Evento")
+    SecuenciaEventos = apps.get_model("accesos", "SecuenciaEventos")
+    ultimo = Evento.objects.aggregate(m=Max("id"))["m"] or 0
+    SecuenciaEventos.objects.update_or_create(pk=1, defaults={"valor": ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0019_acceso_turno_tipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaEventos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(iniciar_secuencia, migrations.RunPython.noop),
+    ]
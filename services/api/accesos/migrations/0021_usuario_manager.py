@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:20
+
+import accesos.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0020_secuencia_eventos'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='usuario',
+            managers=[
+                ('objects', accesos.models.UsuarioManager()),
+            ],
+        ),
+    ]
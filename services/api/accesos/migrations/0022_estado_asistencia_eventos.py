@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:35
+
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+def cursor_a_eventos(apps, schema_editor):
+    # El cursor era un id de Acceso; pasa a ser el id del Evento anterior al
+    # primer acceso_creado sin aplicar. Reaplicar alguno no cambia el resultado.
+    Evento = apps.get_model("accesos", "Evento")
+    EstadoAsistencia = apps.get_model("accesos", "EstadoAsistencia")
+    estado = EstadoAsistencia.objects.filter(pk=1).first()
+    if estado is None:
+        return
+    eventos = Evento.objects.filter(tipo="acceso_creado")
+    primero = eventos.filter(objeto_id__gt=estado.cursor).aggregate(m=Min("id"))["m"]
+    estado.cursor = primero - 1 if primero else eventos.aggregate(m=Max("id"))["m"] or 0
+    estado.save(update_fields=["cursor"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0021_usuario_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(cursor_a_eventos, migrations.RunPython.noop),
+    ]
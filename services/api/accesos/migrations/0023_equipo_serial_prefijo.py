@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:50
+
+from django.db import migrations
+
+# Prefijo de serial en el admin de equipos (serial__startswith): el índice
+# único de serial no sirve para LIKE 'x%' fuera de la collation C (ver 0010).
+INDICE = "equipo_serial_prefijo_idx"
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{INDICE}" ON "accesos_equipo" (("serial")::text text_pattern_ops)'
+    )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{INDICE}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0022_estado_asistencia_eventos'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:05
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import F
+
+
+def publicar_existentes(apps, schema_editor):
+    # Lo ya escrito estaba confirmado en orden de id: seq = id, y los cursores
+    # (alertas, asistencia, clientes de /api/eventos/) siguen valiendo.
+    # Desde 0020 los ids los daba SecuenciaEventos: el autoincremental se
+    # adelanta al máximo para que los INSERT nuevos no choquen.
+    Evento = apps.get_model("accesos", "Evento")
+    Evento.objects.update(seq=F("id"))
+    conexion = schema_editor.connection
+    for sql in conexion.ops.sequence_reset_sql(no_style(), [Evento]):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0023_equipo_serial_prefijo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='seq',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(publicar_existentes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='evento',
+            name='accesos_eve_sede_8bd5c0_idx',
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['sede', 'seq'], name='accesos_eve_sede_d2ceef_idx'),
+        ),
+    ]
@@ -1,10 +1,23 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q, F
 
 
+class UsuarioQuerySet(models.QuerySet):
+    def delete(self):
+        # signals.py acumula las lápidas de la cascada (import diferido: signals importa models)
+        from .signals import cascada_de_usuarios
+
+        with cascada_de_usuarios():
+            return super().delete()
+
+
+class UsuarioManager(UserManager.from_queryset(UsuarioQuerySet)):
+    pass
+
+
 class Usuario(AbstractUser):
     class Rol(models.TextChoices):
         ADMIN = "admin", "Admin"
@@ -38,6 +51,24 @@ class Usuario(AbstractUser):
 
     estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.ACTIVO)
 
+    # Versión de la credencial QR firmada: subirla invalida todos los QR emitidos (ver accesos/credenciales.py)
+    credencial_version = models.PositiveIntegerField(default=0)
+
+    objects = UsuarioManager()
+
+    def delete(self, *args, **kwargs):
+        from .signals import cascada_de_usuarios
+
+        with cascada_de_usuarios():
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Estado al cargar: el post_save registra el bloqueo/desbloqueo (signals.py)
+        instancia = super().from_db(db, field_names, values)
+        instancia._estado_original = instancia.__dict__.get("estado")
+        return instancia
+
 
 class Equipo(models.Model):
     class Estado(models.TextChoices):
@@ -58,10 +89,28 @@ class Equipo(models.Model):
     motivo_rechazo = models.CharField(max_length=255, null=True, blank=True)
 
     creado_en = models.DateTimeField(auto_now_add=True)
+    # Sincronización delta (?updated_since=): los UPDATE masivos deben fijarlo a mano
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["actualizado_en"]),
+            models.Index(fields=["propietario", "actualizado_en"]),
+            # admin: date_hierarchy y filtro por estado (los pendientes son pocos)
+            models.Index(fields=["creado_en"]),
+            models.Index(fields=["estado", "creado_en"]),
+        ]
 
     def __str__(self):
         return f"{self.serial} - {self.marca} {self.modelo} ({self.estado})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Valores al cargar: el cache de equipos aprobados invalida también al dueño/estado anterior
+        instancia = super().from_db(db, field_names, values)
+        instancia._original = (instancia.__dict__.get("propietario_id"), instancia.__dict__.get("estado"))
+        return instancia
+
 
 class Turno(models.Model):
     class Sede(models.TextChoices):
@@ -85,7 +134,19 @@ class Turno(models.Model):
 
     activo = models.BooleanField(default=True)
 
+    # Snapshot calculado una sola vez al cerrar el turno (ver accesos/reportes.py)
+    reporte_cierre = models.JSONField(null=True, blank=True)
+
+    # Sincronización delta (?updated_since=): los UPDATE masivos deben fijarlo a mano
+    actualizado_en = models.DateTimeField(auto_now=True)
+
     class Meta:
+        indexes = [
+            models.Index(fields=["actualizado_en"]),
+            models.Index(fields=["guarda", "actualizado_en"]),
+            # admin: date_hierarchy
+            models.Index(fields=["inicio"]),
+        ]
         constraints = [
             models.CheckConstraint(
                 condition=Q(fin__isnull=True) | Q(fin__gte=F("inicio")),
@@ -95,6 +156,12 @@ class Turno(models.Model):
                 condition=(Q(activo=True, fin__isnull=True) | Q(activo=False, fin__isnull=False)),
                 name="turno_activo_fin_coherente",
             ),
+            # Un solo turno activo por guarda; el índice parcial también sirve la búsqueda del turno actual
+            models.UniqueConstraint(
+                fields=["guarda"],
+                condition=Q(activo=True),
+                name="turno_unico_activo_por_guarda",
+            ),
         ]
 
         
@@ -120,10 +187,140 @@ class Acceso(models.Model):
 
     equipos = models.ManyToManyField(Equipo, blank=True, related_name="accesos")
 
+    class Meta:
+        indexes = [
+            # último acceso del aprendiz y su línea de tiempo (accesos/visitas.py)
+            models.Index(fields=["usuario", "fecha"]),
+            # admin: date_hierarchy y filtro por sede
+            models.Index(fields=["fecha"]),
+            models.Index(fields=["sede", "fecha"]),
+            # conteos por turno (listado de turnos)
+            models.Index(fields=["turno", "tipo"]),
+        ]
+
     def __str__(self):
         return f"{self.usuario.username} - {self.tipo} - {self.fecha}"
 
 
+class Presencia(models.Model):
+    """
+    Quién está dentro ahora: una fila por aprendiz cuyo último acceso es un ingreso.
+    Se mantiene con las señales de Acceso (ver accesos/presencia.py y signals.py).
+    """
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name="presencia")
+    sede = models.CharField(max_length=30, choices=Turno.Sede.choices, null=True, blank=True)
+    ingreso = models.OneToOneField(Acceso, on_delete=models.CASCADE, related_name="presencia")
+    desde = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sede", "desde"]),
+        ]
+
+    def __str__(self):
+        return f"Presencia(usuario={self.usuario_id}, sede={self.sede}, desde={self.desde})"
+
+
+class AsistenciaDiaria(models.Model):
+    """
+    Tiempo dentro de cada aprendiz por día (hora local), derivado de Acceso.
+    Se refresca incrementalmente y se puede reconstruir (ver accesos/asistencia.py).
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="asistencias")
+    dia = models.DateField()
+    segundos = models.PositiveIntegerField(default=0)
+    # ingresos de ese día
+    visitas = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["usuario", "dia"], name="asistencia_usuario_dia_unica"),
+        ]
+        indexes = [
+            models.Index(fields=["dia"]),
+        ]
+
+    def __str__(self):
+        return f"Asistencia({self.usuario_id}, {self.dia}, {self.segundos}s)"
+
+
+class EstadoAsistencia(models.Model):
+    """Hasta qué Evento acceso_creado (seq) está aplicada AsistenciaDiaria. Una sola fila."""
+    cursor = models.BigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"EstadoAsistencia(cursor={self.cursor})"
+
+
+class Evento(models.Model):
+    """
+    Bitácora append-only de cambios para consumidores incrementales. Se
+    escribe en la misma transacción que el cambio (id autoincremental); `seq`,
+    el orden que ven los consumidores, se asigna al publicar (eventos.py).
+    """
+    class Tipo(models.TextChoices):
+        ACCESO_CREADO = "acceso_creado", "Acceso creado"
+        EQUIPO_REVISADO = "equipo_revisado", "Equipo revisado"
+        TURNO_ABIERTO = "turno_abierto", "Turno abierto"
+        TURNO_CERRADO = "turno_cerrado", "Turno cerrado"
+        USUARIO_BLOQUEADO = "usuario_bloqueado", "Usuario bloqueado"
+        USUARIO_DESBLOQUEADO = "usuario_desbloqueado", "Usuario desbloqueado"
+        ESCANEO_RECHAZADO = "escaneo_rechazado", "Escaneo rechazado"
+
+    tipo = models.CharField(max_length=30, choices=Tipo.choices)
+    objeto_id = models.BigIntegerField()
+    sede = models.CharField(max_length=30, choices=Turno.Sede.choices, null=True, blank=True)
+    actor = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    datos = models.JSONField(default=dict, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    seq = models.BigIntegerField(null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sede", "seq"]),
+        ]
+
+    def __str__(self):
+        return f"Evento({self.seq}, {self.tipo}, objeto={self.objeto_id})"
+
+
+class SecuenciaEventos(models.Model):
+    """
+    Último seq publicado, una sola fila. La bloquean solo los que publican
+    (eventos.publicar), no quienes escriben eventos.
+    """
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"SecuenciaEventos(valor={self.valor})"
+
+
+class SnapshotSede(models.Model):
+    """
+    Padrón de aprendices de una sede para validar en portería sin red
+    (ver accesos/snapshots.py). `contenido` es el padrón completo y `delta` el
+    cambio respecto de la versión anterior, ambos JSON comprimido con gzip.
+    """
+    sede = models.CharField(max_length=30, choices=Turno.Sede.choices)
+    version = models.PositiveIntegerField()
+    creado_en = models.DateTimeField(auto_now_add=True)
+    # Última vez que generar_snapshot comprobó que el padrón no cambió
+    verificado_en = models.DateTimeField(default=timezone.now)
+    contenido = models.BinaryField()
+    delta = models.BinaryField(null=True, blank=True)
+    huella = models.CharField(max_length=64)
+    aprendices = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["sede", "version"], name="snapshot_sede_version_unica"),
+        ]
+
+    def __str__(self):
+        return f"Snapshot({self.sede} v{self.version})"
+
+
 class Notificacion(models.Model):
     class Tipo(models.TextChoices):
         INFO = "INFO", "Info"
@@ -151,18 +348,64 @@ class Notificacion(models.Model):
     titulo = models.CharField(max_length=120)
     mensaje = models.TextField()
     data = models.JSONField(null=True, blank=True)
+    # Alertas automáticas (accesos/alertas.py): la misma clave no se emite dos veces
+    clave = models.CharField(max_length=120, unique=True, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
+    # Sincronización delta (?updated_since=); ojo con save(update_fields=...)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["updated_at"]),
+        ]
 
     def __str__(self):
         target = self.user_id if self.user_id else (self.rol_objetivo or "ALL")
         return f"[{self.tipo}] {self.titulo} -> {target}"
 
 
+class EstadoAlertas(models.Model):
+    """
+    Estado del motor de alertas (accesos/alertas.py), una sola fila: hasta qué
+    evento procesó y el estado de cada regla (tamaño fijo por regla).
+    """
+    cursor = models.BigIntegerField(default=0)
+    reglas = models.JSONField(default=dict, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"EstadoAlertas(cursor={self.cursor})"
+
+
+class Borrado(models.Model):
+    """
+    Lápida de un Equipo, Notificacion o Turno eliminado, para que los clientes
+    con sincronización delta sepan qué quitar. El alcance replica quién podía
+    ver el objeto (sin FK: el usuario puede haberse borrado en cascada).
+    """
+    class Modelo(models.TextChoices):
+        EQUIPO = "equipo", "Equipo"
+        NOTIFICACION = "notificacion", "Notificación"
+        TURNO = "turno", "Turno"
+
+    modelo = models.CharField(max_length=20, choices=Modelo.choices)
+    objeto_id = models.BigIntegerField()
+    alcance_usuario_id = models.BigIntegerField(null=True, blank=True)
+    alcance_rol = models.CharField(max_length=20, choices=Usuario.Rol.choices, null=True, blank=True)
+    borrado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["modelo", "borrado_en"]),
+        ]
+
+    def __str__(self):
+        return f"Borrado({self.modelo} {self.objeto_id})"
+
+
 class PasswordResetOTP(models.Model):
     """
     OTP de 6 dígitos para recuperación de contraseña.
@@ -0,0 +1,21 @@
+"""
+Operaciones de migración propias. Los índices de tablas grandes se crean con
+CREATE INDEX CONCURRENTLY en PostgreSQL, que no bloquea las escrituras
+mientras se construyen; las migraciones que los usan llevan atomic = False.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently as _AddIndexConcurrently
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrently(_AddIndexConcurrently):
+    """AddIndexConcurrently de django.contrib.postgres; AddIndex común en otras bases (SQLite de pruebas)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,210 @@
+"""
+Vistas async de la portería: validar_documento, registrar_por_documento y
+stats. Se montan en lugar de las de AccesoViewSet cuando PORTERIA_ASYNC=True
+(accesosen_api/asgi.py lo activa): bajo ASGI las lecturas esperan a la base
+de datos sin retener un hilo. Cuántas porterías atiende un proceso se mide con
+carga_porteria contra cada despliegue y --comparar, no se supone.
+
+Responden lo mismo que las síncronas porque encadenan las mismas reglas de
+views.py (revisar_*) sobre los mismos querysets (consulta_*), leídos aquí con
+el ORM async. Solo las escrituras pasan por sync_to_async: guardar_acceso
+(transaction.atomic no existe en el ORM async) y registrar_rechazo.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .exceptions import ui_exception_handler
+from .instrumentacion import medir
+from .cache_equipos import equipos_aprobados
+from .models import Acceso, Equipo, Turno
+from .permissions import IsGuarda
+from .serializers import RegistrarAccesoDocumentoSerializer, ValidarDocumentoSerializer
+from .views import (
+    SIN_TURNO_REGISTRAR,
+    SIN_TURNO_VALIDAR,
+    consulta_aprendiz,
+    consulta_equipo_dentro,
+    consulta_ultimo,
+    guardar_acceso,
+    registrar_rechazo,
+    respuesta_validacion,
+    revisar_aprendiz,
+    revisar_credencial,
+    revisar_equipo_dentro,
+    revisar_equipos_existen,
+    revisar_equipos_ingreso,
+    revisar_equipos_salida,
+    revisar_tipo,
+    revisar_turno,
+)
+
+PERMISOS = (IsAuthenticated, IsGuarda)
+
+
+# =========================
+# Helpers
+# =========================
+def _respuesta(data, codigo):
+    # Mismo render que las vistas DRF (JSONRenderer compacto, utf-8)
+    return HttpResponse(JSONRenderer().render(data), status=codigo, content_type="application/json")
+
+
+def _error(exc, request):
+    respuesta = ui_exception_handler(exc, {"request": request})
+    salida = _respuesta(respuesta.data, respuesta.status_code)
+    if isinstance(exc, NotAuthenticated) or respuesta.status_code == status.HTTP_401_UNAUTHORIZED:
+        autenticador = request.authenticators[0] if request.authenticators else None
+        if autenticador is not None:
+            salida["WWW-Authenticate"] = autenticador.authenticate_header(request)
+    return salida
+
+
+def _request(request):
+    return Request(
+        request,
+        parsers=[p() for p in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[a() for a in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+
+
+def _autorizar(request):
+    # Igual que APIView.initial(): autenticación (consulta el usuario) y permisos
+    request.user
+    for permiso in PERMISOS:
+        if not permiso().has_permission(request, None):
+            if request.authenticators and not request.successful_authenticator:
+                raise NotAuthenticated()
+            raise PermissionDenied()
+
+
+def vista_porteria(metodo):
+    """
+    Envuelve una vista async: valida el método, autentica y autoriza como
+    AccesoViewSet y convierte las excepciones de DRF con ui_exception_handler.
+    """
+
+    def decorador(funcion):
+        @csrf_exempt
+        @wraps(funcion)
+        async def vista(http_request):
+            request = _request(http_request)
+            # Sin TemplateResponse el middleware no ve el fin de la vista: se mide aquí
+            with medir(request, "vista"):
+                try:
+                    # mismo orden que APIView.dispatch: auth y permisos antes que el método
+                    await sync_to_async(_autorizar)(request)
+                    if http_request.method != metodo:
+                        raise MethodNotAllowed(http_request.method)
+                    return await funcion(request)
+                except APIException as exc:
+                    return _error(exc, request)
+
+        return vista
+
+    return decorador
+
+
+async def obtener_turno_activo(user):
+    """Versión async de views.obtener_turno_activo."""
+    return await Turno.objects.filter(guarda=user, activo=True).afirst()
+
+
+# =========================
+# Vistas
+# =========================
+@vista_porteria("POST")
+async def validar_documento(request):
+    """views.validar_escaneo con el ORM async."""
+    s = ValidarDocumentoSerializer(data=request.data)
+    s.is_valid(raise_exception=True)
+    datos = s.validated_data
+
+    credencial, rechazo = revisar_credencial(request, datos)
+    if rechazo:
+        return _respuesta(rechazo.data, rechazo.status_code)
+
+    turno = await obtener_turno_activo(request.user)
+    rechazo = revisar_turno(request, turno, SIN_TURNO_VALIDAR)
+    if rechazo:
+        return _respuesta(rechazo.data, rechazo.status_code)
+
+    aprendiz = await consulta_aprendiz(datos.get("documento"), credencial).afirst()
+    rechazo = revisar_aprendiz(request, aprendiz)
+    if rechazo:
+        codigo, respuesta = rechazo
+        await sync_to_async(registrar_rechazo)(request.user, turno, codigo, aprendiz and aprendiz.id)
+        return _respuesta(respuesta.data, respuesta.status_code)
+
+    ultimo = await consulta_ultimo(aprendiz).afirst()
+    # equipos_aprobados va a la caché y, si falla, a la BD: ambas sync
+    equipos = await sync_to_async(equipos_aprobados)(aprendiz.id)
+    respuesta = respuesta_validacion(aprendiz, ultimo, turno, equipos)
+    return _respuesta(respuesta.data, respuesta.status_code)
+
+
+@vista_porteria("POST")
+async def registrar_por_documento(request):
+    """views.registrar_escaneo con el ORM async; solo guardar_acceso es sync."""
+    s = RegistrarAccesoDocumentoSerializer(data=request.data)
+    s.is_valid(raise_exception=True)
+    datos = s.validated_data
+    tipo = datos["tipo"]
+    pedidos = datos.get("equipos", [])
+
+    turno = await obtener_turno_activo(request.user)
+    rechazo = revisar_turno(request, turno, SIN_TURNO_REGISTRAR)
+    if rechazo:
+        return _respuesta(rechazo.data, rechazo.status_code)
+
+    aprendiz = await consulta_aprendiz(datos["documento"]).afirst()
+    rechazo = revisar_aprendiz(request, aprendiz, bloqueo=False)
+    if rechazo:
+        return _respuesta(rechazo[1].data, rechazo[1].status_code)
+
+    ultimo = await consulta_ultimo(aprendiz).afirst()
+    rechazo = revisar_tipo(request, tipo, ultimo)
+    if rechazo:
+        return _respuesta(rechazo.data, rechazo.status_code)
+
+    equipos = []
+    if pedidos:
+        equipos = [eq async for eq in Equipo.objects.filter(id__in=pedidos)]
+        revisar_equipos_existen(pedidos, equipos)
+    if tipo == Acceso.Tipo.INGRESO and equipos:
+        revisar_equipos_ingreso(aprendiz, equipos)
+        revisar_equipo_dentro(await consulta_equipo_dentro(equipos).afirst())
+    if tipo == Acceso.Tipo.SALIDA:
+        revisar_equipos_salida([i async for i in ultimo.equipos.values_list("id", flat=True)], equipos)
+
+    respuesta = await sync_to_async(guardar_acceso)(request.user, turno, aprendiz, tipo, equipos)
+    return _respuesta(respuesta.data, respuesta.status_code)
+
+
+@vista_porteria("GET")
+async def stats(request):
+    turno = await obtener_turno_activo(request.user)
+    if not turno:
+        return _respuesta({"permitido": False, "motivo": "No tienes turno activo.", "stats": None}, status.HTTP_400_BAD_REQUEST)
+
+    qs = Acceso.objects.filter(turno=turno)
+    ingresos = await qs.filter(tipo=Acceso.Tipo.INGRESO).acount()
+    salidas = await qs.filter(tipo=Acceso.Tipo.SALIDA).acount()
+
+    return _respuesta(
+        {
+            "permitido": True,
+            "motivo": None,
+            "turno": {"id": turno.id, "sede": turno.sede, "jornada": turno.jornada},
+            "stats": {"ingresos": ingresos, "salidas": salidas, "total": ingresos + salidas},
+        },
+        status.HTTP_200_OK,
+    )
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Acceso, Presencia
+
+
+def actualizar_presencia(acceso):
+    """
+    Aplica un acceso recién creado al roster de presencia. Lo llama el
+    post_save de Acceso (signals.py), en la misma transacción que lo crea.
+    """
+    if acceso.tipo == Acceso.Tipo.INGRESO:
+        Presencia.objects.update_or_create(
+            usuario_id=acceso.usuario_id,
+            defaults={"sede": acceso.sede, "ingreso": acceso, "desde": acceso.fecha},
+        )
+    else:
+        Presencia.objects.filter(usuario_id=acceso.usuario_id).delete()
+
+
+def recalcular_presencia(usuario_id):
+    """
+    Rehace la presencia de un aprendiz desde su último Acceso. Al editar o
+    borrar un acceso (API o admin de Django) el último puede ser otro.
+    """
+    ultimo = Acceso.objects.filter(usuario_id=usuario_id).order_by("-fecha", "-id").first()
+    if ultimo is None:
+        Presencia.objects.filter(usuario_id=usuario_id).delete()
+    else:
+        actualizar_presencia(ultimo)
+
+
+@transaction.atomic
+def reconstruir_presencias(batch_size=2000):
+    """
+    Reconstruye el roster desde cero: aprendices cuyo último Acceso es un ingreso.
+    Devuelve cuántas presencias quedaron.
+    """
+    ultimo = Acceso.objects.filter(usuario=OuterRef("usuario")).order_by("-fecha", "-id").values("id")[:1]
+    ingresos = (
+        Acceso.objects.filter(id=Subquery(ultimo), tipo=Acceso.Tipo.INGRESO)
+        .only("id", "usuario_id", "sede", "fecha")
+    )
+
+    Presencia.objects.all().delete()
+    creadas = Presencia.objects.bulk_create(
+        [Presencia(usuario_id=a.usuario_id, sede=a.sede, ingreso_id=a.id, desde=a.fecha) for a in ingresos.iterator(chunk_size=batch_size)],
+        batch_size=batch_size,
+    )
+    return len(creadas)
@@ -0,0 +1,161 @@
+"""
+Lecturas en la réplica.
+
+Solo van a la réplica (settings.DB_LECTURA) las acciones que un ViewSet
+declara en `acciones_replica` (listados, reportes, exportaciones), y solo si
+la solicitud es de lectura. Los escaneos, las escrituras y todo lo demás
+sigue en la primaria.
+
+Lee-tus-escrituras: si una solicitud escribe, sus lecturas siguientes vuelven
+a la primaria y el usuario queda "pegado" a la primaria REPLICA_PEGADO_SEGUNDOS
+(lo que puede tardar la réplica en ponerse al día).
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from .instrumentacion import _usuario_id
+
+PRIMARIA = "default"
+
+
+class EstadoLectura:
+    __slots__ = ("replica", "escribio")
+
+    def __init__(self):
+        self.replica = False
+        self.escribio = False
+
+
+_estado = ContextVar("accesos_estado_lectura", default=None)
+
+
+def alias_replica():
+    alias = getattr(settings, "DB_LECTURA", None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def alias_lectura():
+    """Alias que usarían ahora las lecturas (para fijar querysets que se evalúan tarde)."""
+    estado = _estado.get()
+    if estado is not None and estado.replica and not estado.escribio:
+        return alias_replica() or PRIMARIA
+    return PRIMARIA
+
+
+def _clave_pegado(usuario_id):
+    return f"replica:pegado:{usuario_id}"
+
+
+def pegado_a_primaria(usuario_id):
+    return bool(usuario_id) and cache.get(_clave_pegado(usuario_id)) is not None
+
+
+def pegar_a_primaria(usuario_id):
+    segundos = getattr(settings, "REPLICA_PEGADO_SEGUNDOS", 5)
+    if usuario_id and segundos > 0:
+        cache.set(_clave_pegado(usuario_id), 1, segundos)
+
+
+# =========================
+# Router
+# =========================
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        alias = alias_lectura()
+        return alias if alias != PRIMARIA else None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escribio = True
+        return PRIMARIA
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # primaria y réplica tienen los mismos datos
+        bases = {PRIMARIA, alias_replica()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # la réplica recibe el esquema por replicación
+        if db == alias_replica():
+            return False
+        return None
+
+
+# =========================
+# ViewSets y middleware
+# =========================
+class LecturaReplicaMixin:
+    """
+    `acciones_replica`: acciones que pueden leer de la réplica. Se decide
+    después de autenticar (la consulta del usuario siempre va a la primaria).
+    """
+
+    acciones_replica = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        estado = _estado.get()
+        if estado is not None and alias_replica() and self.usar_replica(request):
+            estado.replica = True
+
+    def usar_replica(self, request):
+        return (
+            request.method in SAFE_METHODS
+            and self.action in self.acciones_replica
+            and not pegado_a_primaria(getattr(request.user, "pk", None))
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Abre el estado de lectura de cada solicitud y, si escribió (o fue un
+    POST/PUT/PATCH/DELETE exitoso), pega al usuario a la primaria.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        estado = EstadoLectura()
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        self._terminar(request, response, estado)
+        return response
+
+    async def __acall__(self, request):
+        estado = EstadoLectura()
+        token = _estado.set(estado)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        if self._escribio(request, response, estado):
+            await sync_to_async(self._terminar)(request, response, estado)
+        return response
+
+    @staticmethod
+    def _escribio(request, response, estado):
+        return estado.escribio or (request.method not in SAFE_METHODS and response.status_code < 400)
+
+    def _terminar(self, request, response, estado):
+        if self._escribio(request, response, estado):
+            # DRF deja el usuario autenticado en la solicitud de Django
+            pegar_a_primaria(_usuario_id(request))
@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Acceso, Presencia
+
+
+def calcular_reporte_turno(turno, fin=None):
+    """
+    Reporte de cierre del turno a partir de UNA consulta agrupada por
+    (hora, tipo, usuario). Todo lo demás se deriva en memoria de esos grupos.
+
+    "dentro_al_cierre" = aprendices en la sede según el roster de presencia al
+    generar el reporte (incluye a quienes entraron en turnos anteriores). Una
+    consulta más; _cerrar_turno lo llama dentro de su transacción.
+    """
+    fin = fin or turno.fin or timezone.now()
+
+    grupos = (
+        Acceso.objects.filter(turno=turno)
+        .annotate(hora=TruncHour("fecha"))
+        .values("hora", "tipo", "usuario_id")
+        .annotate(n=Count("id", distinct=True), equipos_n=Count("equipos"))
+        .order_by()
+    )
+
+    por_hora = defaultdict(lambda: {"ingresos": 0, "salidas": 0})
+    balance = defaultdict(int)
+    ingresos = salidas = equipos_movidos = 0
+
+    for g in grupos:
+        fila = por_hora[g["hora"]]
+        if g["tipo"] == Acceso.Tipo.INGRESO:
+            fila["ingresos"] += g["n"]
+            ingresos += g["n"]
+            balance[g["usuario_id"]] += g["n"]
+        else:
+            fila["salidas"] += g["n"]
+            salidas += g["n"]
+            balance[g["usuario_id"]] -= g["n"]
+        equipos_movidos += g["equipos_n"]
+
+    horas = [
+        {"hora": hora.isoformat(), **conteos, "total": conteos["ingresos"] + conteos["salidas"]}
+        for hora, conteos in sorted(por_hora.items())
+    ]
+    pico = max(horas, key=lambda h: h["total"], default=None)
+
+    return {
+        "ingresos": ingresos,
+        "salidas": salidas,
+        "total": ingresos + salidas,
+        "duracion_segundos": int((fin - turno.inicio).total_seconds()),
+        "por_hora": horas,
+        "hora_pico": pico["hora"] if pico else None,
+        "aprendices_distintos": len(balance),
+        "equipos_movidos": equipos_movidos,
+        "dentro_al_cierre": Presencia.objects.filter(sede=turno.sede).count(),
+        "generado_en": timezone.now().isoformat(),
+    }
@@ -1,6 +1,69 @@
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 from .models import Usuario, Acceso, Equipo, Turno
-from .models import Notificacion
+from .models import Evento, Notificacion, Presencia
+
+# =========================
+# CAMPOS RELACIONADOS (tablas grandes)
+# =========================
+# En la API navegable: un input de texto en vez de un <select> con toda la tabla
+SIN_DESPLEGABLE = {"base_template": "input.html"}
+
+
+class IdsEnLoteField(serializers.ManyRelatedField):
+    """Resuelve todos los ids con un solo `IN` (ManyRelatedField hace una consulta por id)."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        hijo = self.child_relation
+        queryset = hijo.get_queryset()
+        pks = []
+        for dato in data:
+            if hijo.pk_field is not None:
+                dato = hijo.pk_field.to_internal_value(dato)
+            try:
+                if isinstance(dato, bool):
+                    raise TypeError
+                pks.append(queryset.model._meta.pk.to_python(dato))
+            except (TypeError, ValueError, DjangoValidationError):
+                hijo.fail("incorrect_type", data_type=type(dato).__name__)
+
+        objetos = queryset.in_bulk(set(pks)) if pks else {}
+        for pk in pks:
+            if pk not in objetos:
+                hijo.fail("does_not_exist", pk_value=pk)
+        return [objetos[pk] for pk in pks]
+
+
+class PkRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField sin desplegable; con many=True resuelve en lote
+    (IdsEnLoteField). Las subclases acotan get_queryset según quién pide.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("style", SIN_DESPLEGABLE)
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs.setdefault("style", SIN_DESPLEGABLE)
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return IdsEnLoteField(**list_kwargs)
+
+    def _usuario(self):
+        request = self.context.get("request")
+        return getattr(request, "user", None)
 
 # =========================
 # USUARIOS
@@ -55,17 +118,48 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return instance
 
 
+class AprendizImportSerializer(serializers.Serializer):
+    """
+    Fila de importación masiva. Sin validadores de unicidad: la importación
+    los resuelve por lote con una consulta (ver accesos/importacion.py).
+    """
+    documento = serializers.CharField(max_length=30)
+    username = serializers.CharField(max_length=150, required=False, allow_blank=True, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    sede_principal = serializers.ChoiceField(choices=Usuario.SEDE_CHOICES, required=False, allow_blank=True)
+    programa_formacion = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    password = serializers.CharField(min_length=4, required=False, allow_blank=True)
+
+    def validate_documento(self, value):
+        return value.strip()
+
+    def validate(self, data):
+        # celdas vacías = "no enviar" (no pisan datos existentes)
+        return {k: v for k, v in data.items() if v != ""}
+
+
 # =========================
 # EQUIPOS
 # =========================
+class PropietarioField(PkRelatedField):
+    """Admin: cualquier aprendiz. Aprendiz: solo él mismo (perform_create igual lo fija)."""
+
+    default_error_messages = {"does_not_exist": "No existe un aprendiz con id {pk_value}."}
+
+    def get_queryset(self):
+        user = self._usuario()
+        qs = Usuario.objects.filter(rol=Usuario.Rol.APRENDIZ)
+        if getattr(user, "rol", None) == Usuario.Rol.ADMIN:
+            return qs
+        return qs.filter(pk=getattr(user, "pk", None))
+
+
 class EquipoSerializer(serializers.ModelSerializer):
     # ✅ Para que admin pueda setear propietario (si lo manda)
     # - si NO lo manda, intentamos tomar request.user (aprendiz creando su equipo)
-    propietario = serializers.PrimaryKeyRelatedField(
-        queryset=Usuario.objects.all(),
-        required=False,
-        allow_null=True,
-    )
+    propietario = PropietarioField(required=False, allow_null=True)
 
     class Meta:
         model = Equipo
@@ -80,17 +174,10 @@ class EquipoSerializer(serializers.ModelSerializer):
             "revisado_por",
             "revisado_en",
             "creado_en",
+            "actualizado_en",
         ]
         # 👇 OJO: si tu backend setea estado automáticamente según rol, déjalo read_only
-        read_only_fields = ["estado", "motivo_rechazo", "revisado_por", "revisado_en", "creado_en"]
-
-    def validate_propietario(self, value):
-        if value is None:
-            return value
-        # opcional: solo aprendices pueden ser propietarios
-        if getattr(value, "rol", None) != Usuario.Rol.APRENDIZ:
-            raise serializers.ValidationError("El propietario del equipo debe ser un aprendiz.")
-        return value
+        read_only_fields = ["estado", "motivo_rechazo", "revisado_por", "revisado_en", "creado_en", "actualizado_en"]
 
     def create(self, validated_data):
         # si no mandan propietario, usamos el usuario autenticado (modo aprendiz)
@@ -110,14 +197,66 @@ class EquipoRevisionSerializer(serializers.Serializer):
     motivo_rechazo = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=255)
 
 
+class EquipoRevisionLoteSerializer(EquipoRevisionSerializer):
+    # revisión masiva: lista de ids o un filtro (solo se tocan equipos pendientes)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=1000)
+    filtro_estado = serializers.ChoiceField(choices=[Equipo.Estado.PENDIENTE], required=False)
+    filtro_marca = serializers.CharField(required=False, max_length=100)
+    filtro_sede = serializers.ChoiceField(choices=Usuario.SEDE_CHOICES, required=False)
+
+    def validate(self, data):
+        hay_filtro = any(k in data for k in ["filtro_estado", "filtro_marca", "filtro_sede"])
+        if bool(data.get("ids")) == hay_filtro:
+            raise serializers.ValidationError("Envía 'ids' o algún filtro (filtro_estado, filtro_marca, filtro_sede), no ambos.")
+        return data
+
+
 # =========================
 # TURNOS
 # =========================
 class TurnoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Turno
-        fields = ["id", "guarda", "sede", "jornada", "inicio", "fin", "activo"]
-        read_only_fields = ["guarda", "inicio", "fin", "activo"]
+        fields = ["id", "guarda", "sede", "jornada", "inicio", "fin", "activo", "reporte_cierre", "actualizado_en"]
+        read_only_fields = ["guarda", "inicio", "fin", "activo", "reporte_cierre", "actualizado_en"]
+
+
+class TurnoListadoSerializer(TurnoSerializer):
+    """
+    Listado: conteos anotados en TurnoViewSet.get_queryset (del reporte de
+    cierre si el turno está cerrado, en vivo si está activo) y guarda por
+    select_related. Sin reporte_cierre (JSON grande por fila): está en el detalle.
+    """
+
+    guarda_nombre = serializers.SerializerMethodField()
+    guarda_documento = serializers.CharField(source="guarda.documento", read_only=True)
+    ingresos = serializers.IntegerField(read_only=True)
+    salidas = serializers.IntegerField(read_only=True)
+    total = serializers.SerializerMethodField()
+    duracion_segundos = serializers.SerializerMethodField()
+
+    class Meta(TurnoSerializer.Meta):
+        fields = [f for f in TurnoSerializer.Meta.fields if f != "reporte_cierre"] + [
+            "guarda_nombre", "guarda_documento", "ingresos", "salidas", "total", "duracion_segundos",
+        ]
+
+    def get_guarda_nombre(self, obj):
+        g = obj.guarda
+        return f"{g.first_name} {g.last_name}".strip() or g.username
+
+    def get_total(self, obj):
+        return obj.ingresos + obj.salidas
+
+    def get_duracion_segundos(self, obj):
+        if getattr(obj, "duracion_cierre", None) is not None:
+            return obj.duracion_cierre
+        # turno activo: hasta ahora
+        return int(((obj.fin or timezone.now()) - obj.inicio).total_seconds())
+
+
+class TurnoDetalleSerializer(TurnoListadoSerializer):
+    class Meta(TurnoListadoSerializer.Meta):
+        fields = TurnoListadoSerializer.Meta.fields + ["reporte_cierre"]
 
 
 class TurnoIniciarSerializer(serializers.Serializer):
@@ -128,13 +267,35 @@ class TurnoIniciarSerializer(serializers.Serializer):
 # =========================
 # ACCESOS
 # =========================
+class EquiposAccesoField(PkRelatedField):
+    """
+    Solo los equipos del aprendiz del acceso (`usuario` del mismo payload o,
+    al editar, el del acceso), y solo para admin y guarda.
+    """
+
+    default_error_messages = {"does_not_exist": "El equipo {pk_value} no existe o no es del aprendiz."}
+
+    def get_queryset(self):
+        if getattr(self._usuario(), "rol", None) not in (Usuario.Rol.ADMIN, Usuario.Rol.GUARDA):
+            return Equipo.objects.none()
+
+        raiz = self.root
+        usuario_id = str(getattr(raiz, "initial_data", {}).get("usuario", ""))
+        if not usuario_id and raiz.instance is not None:
+            usuario_id = str(raiz.instance.usuario_id)
+        if not usuario_id.isdigit():
+            return Equipo.objects.none()
+        return Equipo.objects.filter(propietario_id=int(usuario_id))
+
+
 class AccesoSerializer(serializers.ModelSerializer):
-    equipos = serializers.PrimaryKeyRelatedField(queryset=Equipo.objects.all(), many=True, required=False)
+    equipos = EquiposAccesoField(many=True, required=False)
 
     class Meta:
         model = Acceso
         fields = ["id", "usuario", "fecha", "tipo", "sede", "registrado_por", "turno", "equipos"]
         read_only_fields = ["fecha", "sede", "registrado_por", "turno"]
+        extra_kwargs = {"usuario": {"style": SIN_DESPLEGABLE}}
 
     def validate(self, data):
         usuario = data.get("usuario")
@@ -158,11 +319,18 @@ class AccesoSerializer(serializers.ModelSerializer):
 
 
 class ValidarDocumentoSerializer(serializers.Serializer):
-    documento = serializers.CharField(max_length=30)
+    # documento plano (QR legado) o credencial firmada (GET /api/me/qr/)
+    documento = serializers.CharField(max_length=30, required=False)
+    credencial = serializers.CharField(max_length=200, required=False)
 
     def validate_documento(self, value):
         return value.strip()
 
+    def validate(self, data):
+        if bool(data.get("documento")) == bool(data.get("credencial")):
+            raise serializers.ValidationError("Envía 'documento' o 'credencial' (uno de los dos).")
+        return data
+
 
 class RegistrarAccesoDocumentoSerializer(serializers.Serializer):
     documento = serializers.CharField(max_length=30)
@@ -173,14 +341,36 @@ class RegistrarAccesoDocumentoSerializer(serializers.Serializer):
         return value.strip()
 
 
+# =========================
+# PRESENCIA (quién está dentro)
+# =========================
+class PresenciaSerializer(serializers.ModelSerializer):
+    documento = serializers.CharField(source="usuario.documento", read_only=True)
+    nombre = serializers.SerializerMethodField()
+    programa_formacion = serializers.CharField(source="usuario.programa_formacion", read_only=True)
+    equipos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Presencia
+        fields = ["usuario", "documento", "nombre", "programa_formacion", "sede", "desde", "ingreso", "equipos"]
+
+    def get_nombre(self, obj):
+        u = obj.usuario
+        return f"{u.first_name} {u.last_name}".strip() or u.username
+
+    def get_equipos(self, obj):
+        # usa el prefetch de ingreso__equipos
+        return [{"id": e.id, "serial": e.serial, "marca": e.marca, "modelo": e.modelo} for e in obj.ingreso.equipos.all()]
+
+
 # --- NUEVO: Notificaciones + Password Reset ---
 
 
 class NotificacionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notificacion
-        fields = ["id", "tipo", "titulo", "mensaje", "data", "created_at", "read_at", "rol_objetivo", "user"]
-        read_only_fields = ["created_at", "read_at"]
+        fields = ["id", "tipo", "titulo", "mensaje", "data", "created_at", "read_at", "updated_at", "rol_objetivo", "user"]
+        read_only_fields = ["created_at", "read_at", "updated_at"]
 
 
 class PasswordResetRequestSerializer(serializers.Serializer):
@@ -211,3 +401,14 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
 
     def validate_otp(self, value):
         return value.strip()
+
+
+# =========================
+# EVENTOS
+# =========================
+class EventoSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Evento
+        fields = ["seq", "tipo", "objeto_id", "sede", "actor", "datos", "creado_en"]
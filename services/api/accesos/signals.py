@@ -0,0 +1,173 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import tablero
+from .cache_equipos import invalidar_al_confirmar
+from .credenciales import revocar_credenciales
+from .eventos import registrar_evento
+from .models import Acceso, Borrado, Equipo, Evento, Notificacion, Turno, Usuario
+from .presencia import actualizar_presencia, recalcular_presencia
+
+# Lápidas para la sincronización delta. post_delete también cubre los borrados
+# en cascada y los del admin de Django.
+#
+# Al borrar un usuario, sus equipos/turnos/notificaciones caen en cascada: en
+# vez de un INSERT por objeto se acumulan y se insertan juntos en el
+# post_delete del usuario (el Collector lo emite después que el de sus hijos,
+# dentro de la misma transacción).
+_cascada = threading.local()
+
+
+def _pendientes():
+    if not hasattr(_cascada, "usuarios"):
+        _cascada.usuarios = set()
+        _cascada.lapidas = []
+    return _cascada
+
+
+@contextmanager
+def cascada_de_usuarios():
+    """
+    Envuelve Usuario.delete() y UsuarioQuerySet.delete(). Si el borrado falla
+    a mitad (el post_delete del usuario no llega), descarta lo acumulado: sin
+    esto el hilo seguiría tratando a esos usuarios como "borrándose" y sus
+    lápidas posteriores no se guardarían nunca.
+    """
+    try:
+        yield
+    finally:
+        _cascada.__dict__.clear()
+
+
+def _lapida(dueno_id, **campos):
+    estado = _pendientes()
+    lapida = Borrado(**campos)
+    if dueno_id in estado.usuarios:
+        estado.lapidas.append(lapida)
+    else:
+        lapida.save()
+
+
+@receiver(pre_delete, sender=Usuario)
+def iniciar_cascada(sender, instance, **kwargs):
+    _pendientes().usuarios.add(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def cerrar_cascada(sender, instance, **kwargs):
+    estado = _pendientes()
+    estado.usuarios.discard(instance.pk)
+    if not estado.usuarios and estado.lapidas:
+        lapidas, estado.lapidas = estado.lapidas, []
+        Borrado.objects.bulk_create(lapidas, batch_size=1000)
+
+
+@receiver(post_delete, sender=Equipo)
+def lapida_equipo(sender, instance, **kwargs):
+    _lapida(
+        instance.propietario_id,
+        modelo=Borrado.Modelo.EQUIPO,
+        objeto_id=instance.pk,
+        alcance_usuario_id=instance.propietario_id,
+    )
+    _invalidar_equipos(instance)
+
+
+# Cache de equipos aprobados (cache_equipos.py): solo si el equipo estaba o
+# quedó aprobado, para el dueño actual y el anterior.
+@receiver(post_save, sender=Equipo)
+def invalidar_equipos(sender, instance, **kwargs):
+    _invalidar_equipos(instance)
+
+
+def _invalidar_equipos(equipo):
+    propietario_original, estado_original = getattr(equipo, "_original", (None, None))
+    if Equipo.Estado.APROBADO in (equipo.estado, estado_original):
+        invalidar_al_confirmar({equipo.propietario_id, propietario_original})
+    # el tablero cuenta los pendientes
+    if Equipo.Estado.PENDIENTE in (equipo.estado, estado_original):
+        tablero.invalidar_al_confirmar()
+    equipo._original = (equipo.propietario_id, equipo.estado)
+
+
+@receiver(post_delete, sender=Turno)
+def lapida_turno(sender, instance, **kwargs):
+    _lapida(
+        instance.guarda_id,
+        modelo=Borrado.Modelo.TURNO,
+        objeto_id=instance.pk,
+        alcance_usuario_id=instance.guarda_id,
+    )
+    tablero.invalidar_al_confirmar()
+
+
+# Resumen del tablero (tablero.py): usuarios por rol/estado y turnos activos.
+# El login guarda solo last_login: no cambia los conteos.
+@receiver(post_save, sender=Usuario)
+def invalidar_tablero_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or {"rol", "estado"} & set(update_fields):
+        tablero.invalidar_al_confirmar()
+
+
+@receiver(post_delete, sender=Usuario)
+def invalidar_tablero_usuario_borrado(sender, instance, **kwargs):
+    tablero.invalidar_al_confirmar()
+
+
+# Bloqueo/desbloqueo desde cualquier origen (API o admin de Django): evento en
+# la bitácora y, al bloquear, revocación de los QR emitidos. Quien guarda
+# puede dejar el autor en `_actor`.
+@receiver(post_save, sender=Usuario)
+def evento_estado_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "estado" not in update_fields:
+        return
+    anterior = getattr(instance, "_estado_original", None)
+    instance._estado_original = instance.estado
+    if created or anterior is None or anterior == instance.estado:
+        return
+    bloqueado = instance.estado == Usuario.Estado.BLOQUEADO
+    if bloqueado:
+        revocar_credenciales(instance.pk)
+    registrar_evento(
+        Evento.Tipo.USUARIO_BLOQUEADO if bloqueado else Evento.Tipo.USUARIO_DESBLOQUEADO,
+        instance.pk,
+        sede=instance.sede_principal,
+        actor=getattr(instance, "_actor", None),
+        rol=instance.rol,
+    )
+
+
+@receiver(post_save, sender=Turno)
+def invalidar_tablero_turno(sender, instance, **kwargs):
+    tablero.invalidar_al_confirmar()
+
+
+@receiver(post_delete, sender=Notificacion)
+def lapida_notificacion(sender, instance, **kwargs):
+    _lapida(
+        instance.user_id,
+        modelo=Borrado.Modelo.NOTIFICACION,
+        objeto_id=instance.pk,
+        alcance_usuario_id=instance.user_id,
+        alcance_rol=instance.rol_objetivo,
+    )
+
+
+# Roster de presencia (presencia.py) para cualquier origen: API, portería o
+# admin de Django. Crear aplica el acceso; editar o borrar recalcula al
+# aprendiz. Si se está borrando el aprendiz, su presencia cae en cascada.
+@receiver(post_save, sender=Acceso)
+def presencia_acceso(sender, instance, created, **kwargs):
+    if created:
+        actualizar_presencia(instance)
+    else:
+        recalcular_presencia(instance.usuario_id)
+
+
+@receiver(post_delete, sender=Acceso)
+def presencia_acceso_borrado(sender, instance, **kwargs):
+    if instance.usuario_id not in _pendientes().usuarios:
+        recalcular_presencia(instance.usuario_id)
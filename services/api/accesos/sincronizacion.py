@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Borrado
+from .visitas import escribir_cursor, leer_cursor
+
+SINCRONIZACION_LIMITE = 500
+SINCRONIZACION_LIMITE_MAX = 2000
+
+
+class SincronizacionDeltaMixin:
+    """
+    `?updated_since=<ISO 8601>` en el listado devuelve solo lo creado/cambiado
+    desde esa marca y los ids borrados, por páginas de `?limit=` filas
+    (SINCRONIZACION_LIMITE por defecto):
+
+        {"results": [...], "borrados": [ids], "hasta": "<marca>", "hay_mas": false, "completo": false}
+
+    El cliente guarda `hasta` y lo envía como próximo `updated_since`; mientras
+    `hay_mas` sea true, `hasta` es la continuación "<µs>-<id>" de la última
+    fila entregada (keyset sobre (actualizado_en, id)) y se pide enseguida.
+    La última página deja `hasta` EVENTOS_MARGEN_SEGUNDOS atrás y nada más
+    nuevo que eso se entrega todavía: no se pierden filas de transacciones que
+    confirmaron tarde.
+    Si la marca es anterior a la retención de lápidas, `completo` es true y las
+    páginas recorren la colección entera: el cliente debe reemplazar, no
+    fusionar. Las continuaciones siempre son `completo: false`.
+    """
+
+    campo_actualizado = "actualizado_en"
+    modelo_borrado = None
+    # El admin ve las lápidas de todos (en notificaciones solo ve las suyas)
+    borrados_admin_ve_todo = True
+
+    def list(self, request, *args, **kwargs):
+        valor = request.query_params.get("updated_since")
+        if valor is None:
+            return super().list(request, *args, **kwargs)
+
+        ahora = timezone.now()
+        tope = ahora - timedelta(seconds=getattr(settings, "EVENTOS_MARGEN_SEGUNDOS", 2))
+        # Continuación de una página anterior, o marca ISO del cliente
+        continuacion = leer_cursor(valor.strip())
+        if continuacion:
+            desde, despues_de = continuacion
+        else:
+            desde, despues_de = parse_datetime(valor.strip().replace(" ", "+")), None
+            if desde is None:
+                return Response(
+                    {"permitido": False, "motivo": "updated_since debe ser una fecha ISO 8601."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+        completo = despues_de is None and desde < ahora - timedelta(days=getattr(settings, "BORRADOS_RETENCION_DIAS", 30))
+
+        limite = (request.query_params.get("limit") or "").strip()
+        limite = min(int(limite), SINCRONIZACION_LIMITE_MAX) if limite.isdigit() and int(limite) > 0 else SINCRONIZACION_LIMITE
+
+        campo = self.campo_actualizado
+        cambios = self.filter_queryset(self.get_queryset()).filter(**{f"{campo}__lte": tope})
+        borrados = []
+        if not completo:
+            if despues_de is None:
+                cambios = cambios.filter(**{f"{campo}__gt": desde})
+            else:
+                cambios = cambios.filter(Q(**{f"{campo}__gt": desde}) | Q(**{campo: desde, "id__gt": despues_de}))
+            borrados = list(
+                self.borrados_visibles(
+                    Borrado.objects.filter(modelo=self.modelo_borrado, borrado_en__gt=desde, borrado_en__lte=tope)
+                )
+                .values_list("objeto_id", flat=True)
+                .distinct()
+            )
+
+        # Uno de más para saber si quedan sin hacer COUNT
+        pagina = list(cambios.order_by(campo, "id")[: limite + 1])
+        hay_mas = len(pagina) > limite
+        pagina = pagina[:limite]
+        hasta = escribir_cursor(getattr(pagina[-1], campo), pagina[-1].id) if hay_mas else tope.isoformat()
+        return Response(
+            {
+                "results": self.get_serializer(pagina, many=True).data,
+                "borrados": borrados,
+                "hasta": hasta,
+                "hay_mas": hay_mas,
+                "completo": completo,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def usar_replica(self, request):
+        # `hasta` supone que se leyó todo lo confirmado: la delta no va a la réplica
+        if "updated_since" in request.query_params:
+            return False
+        return super().usar_replica(request)
+
+    def borrados_visibles(self, qs):
+        user = self.request.user
+        rol = getattr(user, "rol", None)
+        if rol == "admin" and self.borrados_admin_ve_todo:
+            return qs
+        return qs.filter(
+            Q(alcance_usuario_id=user.id)
+            | Q(alcance_usuario_id__isnull=True, alcance_rol=rol)
+            | Q(alcance_usuario_id__isnull=True, alcance_rol__isnull=True)
+        )
@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import json
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Equipo, Presencia, SnapshotSede, Usuario
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+def comprimir(obj):
+    # mtime=0: mismo contenido -> mismos bytes
+    return gzip.compress(_json(obj), mtime=0)
+
+
+def descomprimir(datos):
+    return json.loads(gzip.decompress(bytes(datos)))
+
+
+def construir_padron(sede):
+    """
+    documento -> {id, nombre, estado, credencial, equipos} de los aprendices de la
+    sede (sede_principal), con sus equipos aprobados como [id, serial, marca, modelo].
+    Dos consultas, sin importar el tamaño de la sede.
+
+    Quién está dentro no va aquí: cambia con cada escaneo y generaría una versión
+    por minuto en hora pico (ver presencia()).
+    """
+    por_id = {}
+    padron = {}
+    aprendices = (
+        Usuario.objects.filter(rol=Usuario.Rol.APRENDIZ, sede_principal=sede, documento__isnull=False)
+        .exclude(documento="")
+        .values("id", "documento", "username", "first_name", "last_name", "estado", "credencial_version")
+    )
+    for u in aprendices:
+        entrada = {
+            "id": u["id"],
+            "nombre": f"{u['first_name']} {u['last_name']}".strip() or u["username"],
+            "estado": u["estado"],
+            # versión vigente del QR firmado: la app rechaza sin red los revocados
+            "credencial": u["credencial_version"],
+            "equipos": [],
+        }
+        padron[u["documento"]] = por_id[u["id"]] = entrada
+
+    equipos = (
+        Equipo.objects.filter(
+            estado=Equipo.Estado.APROBADO,
+            propietario__rol=Usuario.Rol.APRENDIZ,
+            propietario__sede_principal=sede,
+        )
+        .order_by("id")
+        .values_list("propietario_id", "id", "serial", "marca", "modelo")
+    )
+    for propietario_id, *equipo in equipos:
+        if propietario_id in por_id:
+            por_id[propietario_id]["equipos"].append(equipo)
+
+    return padron
+
+
+def presencia(sede):
+    """Documentos de los aprendices de la sede que están dentro ahora (una consulta, índice de Presencia)."""
+    return sorted(
+        Presencia.objects.filter(usuario__sede_principal=sede, usuario__documento__isnull=False)
+        .exclude(usuario__documento="")
+        .values_list("usuario__documento", flat=True)
+    )
+
+
+def _diferencia(anterior, actual):
+    return {
+        "cambios": {doc: e for doc, e in actual.items() if anterior.get(doc) != e},
+        "quitados": sorted(doc for doc in anterior if doc not in actual),
+    }
+
+
+def generar_snapshot(sede):
+    """
+    Reconstruye el padrón y, solo si cambió, guarda una versión nueva con su
+    delta respecto de la anterior. Devuelve la última versión.
+    """
+    padron = construir_padron(sede)
+    huella = hashlib.sha256(_json(padron)).hexdigest()
+    ultimo = SnapshotSede.objects.filter(sede=sede).order_by("-version").first()
+
+    if ultimo is not None and ultimo.huella == huella:
+        ultimo.verificado_en = timezone.now()
+        SnapshotSede.objects.filter(pk=ultimo.pk).update(verificado_en=ultimo.verificado_en)
+        return ultimo
+
+    version = ultimo.version + 1 if ultimo else 1
+    delta = None
+    if ultimo is not None:
+        delta = comprimir(_diferencia(descomprimir(ultimo.contenido)["aprendices"], padron))
+
+    try:
+        with transaction.atomic():
+            nuevo = SnapshotSede.objects.create(
+                sede=sede,
+                version=version,
+                contenido=comprimir(
+                    {
+                        "sede": sede,
+                        "version": version,
+                        "tipo": "completo",
+                        "generado_en": timezone.now().isoformat(),
+                        "aprendices": padron,
+                    }
+                ),
+                delta=delta,
+                huella=huella,
+                aprendices=len(padron),
+            )
+    except IntegrityError:
+        # Otro worker generó la misma versión al mismo tiempo
+        return SnapshotSede.objects.filter(sede=sede).order_by("-version").first()
+
+    # Solo se guardan las últimas N versiones; clientes más viejos reciben el completo
+    conservar = getattr(settings, "SNAPSHOT_VERSIONES", 50)
+    SnapshotSede.objects.filter(sede=sede, version__lte=version - conservar).delete()
+    return nuevo
+
+
+def snapshot_vigente(sede):
+    """
+    Última versión guardada. La descarga no reconstruye el padrón: lo hace
+    manage.py generar_snapshots (cron o --intervalo). Solo si la sede aún no
+    tiene ninguna se genera aquí la primera.
+    """
+    ultimo = SnapshotSede.objects.filter(sede=sede).defer("contenido", "delta").order_by("-version").first()
+    if ultimo is None:
+        return generar_snapshot(sede)
+    return ultimo
+
+
+def componer_delta(sede, desde, hasta):
+    """
+    Suma los deltas (desde, hasta] en uno solo. None si falta alguna versión
+    intermedia (se purgó): el cliente debe bajar el completo.
+    """
+    filas = list(
+        SnapshotSede.objects.filter(sede=sede, version__gt=desde, version__lte=hasta)
+        .order_by("version")
+        .values_list("delta", flat=True)
+    )
+    if len(filas) != hasta - desde or any(d is None for d in filas):
+        return None
+
+    cambios, quitados = {}, set()
+    for d in map(descomprimir, filas):
+        for doc in d["quitados"]:
+            cambios.pop(doc, None)
+            quitados.add(doc)
+        for doc, entrada in d["cambios"].items():
+            cambios[doc] = entrada
+            quitados.discard(doc)
+
+    return {
+        "sede": sede,
+        "version": hasta,
+        "base": desde,
+        "tipo": "delta",
+        "cambios": cambios,
+        "quitados": sorted(quitados),
+    }
@@ -0,0 +1,100 @@
+"""
+Resumen del tablero de administración (/api/admin/resumen/): usuarios por
+rol y estado, equipos pendientes de revisión, turnos activos, accesos de
+hoy y ocupación actual por sede. Cinco consultas agrupadas, guardadas en el
+cache de Django.
+
+Se invalida al confirmar los cambios de usuarios, equipos y turnos
+(signals.py y los UPDATE masivos que los tocan). Los accesos no invalidan:
+en hora pico llegan varios por segundo y cada escaneo vaciaría el cache de
+todas las pestañas abiertas. Los conteos de hoy y la ocupación se atrasan a
+lo sumo RESUMEN_ADMIN_TTL segundos, lo mismo que un cálculo que estaba en
+curso al invalidar y guarda datos de antes.
+
+Sin estampida: el resumen se guarda sin vencer junto con una marca de
+vigencia de RESUMEN_ADMIN_TTL segundos, y invalidar borra solo la marca. Al
+faltar la marca recalcula quien toma el candado (cache.add); los demás
+responden el resumen anterior mientras tanto. Solo sin resumen guardado
+(arranque, expulsión del cache) calculan todos.
+
+Se calcula en la primaria: con la réplica atrasada, lo leído justo después
+de invalidar quedaría guardado viejo.
+"""
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Acceso, Equipo, Presencia, Turno, Usuario
+
+CLAVE = "tablero:resumen"
+CLAVE_VIGENTE = "tablero:resumen:vigente"
+CLAVE_CANDADO = "tablero:resumen:candado"
+# Lo que puede tardar un cálculo: si el proceso muere con el candado, otro lo toma después
+CANDADO_SEGUNDOS = 30
+
+
+def _por_sede(qs):
+    return dict(qs.values("sede").annotate(n=Count("pk")).values_list("sede", "n").order_by())
+
+
+def calcular():
+    usuarios = {}
+    for rol, estado, n in Usuario.objects.values("rol", "estado").annotate(n=Count("id")).values_list("rol", "estado", "n").order_by():
+        usuarios.setdefault(rol, {})[estado] = n
+
+    hoy = {}
+    medianoche = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    filas = (
+        Acceso.objects.filter(fecha__gte=medianoche)
+        .values("sede", "tipo")
+        .annotate(n=Count("id"))
+        .values_list("sede", "tipo", "n")
+        .order_by()
+    )
+    for sede, tipo, n in filas:
+        hoy.setdefault(sede, {Acceso.Tipo.INGRESO: 0, Acceso.Tipo.SALIDA: 0})[tipo] = n
+
+    dentro = _por_sede(Presencia.objects.all())
+    return {
+        "usuarios": usuarios,
+        "equipos_pendientes": Equipo.objects.filter(estado=Equipo.Estado.PENDIENTE).count(),
+        "turnos_activos": _por_sede(Turno.objects.filter(activo=True)),
+        "accesos_hoy": hoy,
+        "dentro": dentro,
+        "dentro_total": sum(dentro.values()),
+        "calculado_en": timezone.now().isoformat(),
+    }
+
+
+def resumen():
+    guardado = cache.get_many([CLAVE, CLAVE_VIGENTE])
+    datos = guardado.get(CLAVE)
+    if datos is not None and CLAVE_VIGENTE in guardado:
+        return datos
+
+    if not cache.add(CLAVE_CANDADO, 1, CANDADO_SEGUNDOS):
+        if datos is not None:
+            return datos
+        return calcular()
+
+    try:
+        datos = calcular()
+        cache.set(CLAVE, datos, None)
+        cache.set(CLAVE_VIGENTE, 1, getattr(settings, "RESUMEN_ADMIN_TTL", 15))
+    finally:
+        cache.delete(CLAVE_CANDADO)
+    return datos
+
+
+def invalidar():
+    # El resumen anterior queda para quien no toma el candado
+    cache.delete(CLAVE_VIGENTE)
+
+
+def invalidar_al_confirmar():
+    """Invalida cuando confirme la transacción actual (inmediato fuera de una)."""
+    transaction.on_commit(invalidar)
@@ -1,3 +1,2517 @@
-from django.test import TestCase
+"""
+Rendimiento de la API.
 
-# Create your tests here.
+Presupuesto de consultas por endpoint: cada escenario corre dos veces, con 1 y con N objetos relacionados, dentro de
+una transacción que se revierte. El número de consultas debe ser el mismo en
+ambas corridas (sin N+1) y no superar el presupuesto fijo del endpoint.
+Si falla, el mensaje incluye el SQL capturado.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+from unittest import mock, skipUnless
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+
+from django.apps import apps as django_apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    Acceso, AsistenciaDiaria, Borrado, EstadoAlertas, Equipo, Evento, Notificacion, PasswordResetOTP, Presencia, SecuenciaEventos, Turno, Usuario,
+)
+from . import importacion
+from . import porteria
+from . import metricas
+from .alertas import procesar
+from .asistencia import reconstruir, refrescar
+from . import tablero
+from .cache_equipos import equipos_aprobados
+from .credenciales import CredencialInvalida, emitir, verificar
+from .eventos import eventos_desde, registrar_evento, registrar_eventos
+from .management.commands.fix_turnos import REGLAS
+from .instrumentacion import ServerTimingMiddleware
+from .replicas import pegado_a_primaria
+from .snapshots import generar_snapshot
+from .serializers import AccesoSerializer
+from .views import _cerrar_turno, _hash_code
+
+N = 6
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+# Se cuentan las consultas de la primaria: sin réplica aunque esté configurada
+@override_settings(DB_LECTURA=None)
+class PresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.guarda_libre = Usuario.objects.create(username="guarda2", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(
+            username="aprendiz",
+            rol=Usuario.Rol.APRENDIZ,
+            documento="100200300",
+            email="aprendiz@sadi.local",
+            sede_principal="CEGAFE",
+        )
+        cls.turno = Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    # ---------- helpers ----------
+    def cliente(self, user=None):
+        c = APIClient()
+        if user is not None:
+            c.force_authenticate(user)
+        return c
+
+    def assertPresupuesto(self, presupuesto, escenario, status):
+        """
+        escenario(n) prepara datos y devuelve un callable que hace el request.
+        `status` es obligatorio: un escenario que termina en 400/404 mide otra ruta.
+        """
+        conteos = {}
+        for n in (1, N):
+            cache.clear()  # cache de equipos: cada corrida parte en frío
+            with transaction.atomic():
+                hacer = escenario(n)
+                with CaptureQueriesContext(connection) as ctx:
+                    resp = hacer()
+                transaction.set_rollback(True)
+
+
+            self.assertEqual(resp.status_code, status, getattr(resp, "data", resp))
+
+            sql = "\n".join(f"  {i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, start=1))
+            conteos[n] = len(ctx)
+            self.assertLessEqual(
+                len(ctx), presupuesto, f"{len(ctx)} consultas con n={n} (presupuesto {presupuesto}):\n{sql}"
+            )
+
+        self.assertEqual(conteos[1], conteos[N], f"El número de consultas depende de N: {conteos}\n{sql}")
+
+    def crear_aprendices(self, n, prefijo="ap"):
+        return Usuario.objects.bulk_create(
+            [
+                Usuario(username=f"{prefijo}{i}", rol=Usuario.Rol.APRENDIZ, documento=f"{prefijo}-{i}", sede_principal="CEGAFE")
+                for i in range(n)
+            ]
+        )
+
+    def crear_equipos(self, propietario, n, estado=Equipo.Estado.APROBADO, prefijo="eq"):
+        return Equipo.objects.bulk_create(
+            [
+                Equipo(propietario=propietario, serial=f"{prefijo}-{propietario.id}-{i}", marca="HP", modelo="X", estado=estado)
+                for i in range(n)
+            ]
+        )
+
+    def crear_accesos(self, n, usuario=None, turno=None, tipo=Acceso.Tipo.INGRESO):
+        """n accesos (de n aprendices distintos si no se da usuario), cada uno con n equipos."""
+        turno = turno or self.turno
+        usuarios = [usuario] * n if usuario else self.crear_aprendices(n, prefijo=f"acc{tipo}")
+        accesos = []
+        for i, u in enumerate(usuarios):
+            a = Acceso.objects.create(usuario=u, tipo=tipo, sede=turno.sede, turno=turno, registrado_por=turno.guarda)
+            a.equipos.set(self.crear_equipos(u, n, prefijo=f"acc{a.id}"))
+            accesos.append(a)
+        return accesos
+
+    # ---------- /me y password reset ----------
+    @override_settings(QR_CLAVES={"k1": "secreto-1"}, QR_CLAVE_ACTIVA="k1")
+    def test_me(self):
+        for user in [self.admin, self.guarda, self.aprendiz]:
+            self.assertPresupuesto(0, lambda n: lambda: self.cliente(user).get("/api/me/"), status=200)
+            self.assertPresupuesto(0, lambda n: lambda: self.cliente(user).get("/api/me/qr/"), status=200)
+        self.assertPresupuesto(0, lambda n: lambda: self.cliente(self.guarda).get("/api/credenciales/claves/"), status=200)
+
+    def test_password_reset(self):
+        c = self.cliente()
+
+        def request(n):
+            return lambda: c.post("/api/auth/password-reset/request/", {"email": self.aprendiz.email})
+
+        def otp(n):
+            for _ in range(n):
+                PasswordResetOTP.objects.create(
+                    user=self.aprendiz, salt="s", code_hash=_hash_code("s", "123456"), expires_at=timezone.now() + timedelta(minutes=5)
+                )
+
+        def verify(n):
+            otp(n)
+            return lambda: c.post("/api/auth/password-reset/verify/", {"email": self.aprendiz.email, "otp": "123456"})
+
+        def confirm(n):
+            otp(n)
+            return lambda: c.post(
+                "/api/auth/password-reset/confirm/",
+                {"email": self.aprendiz.email, "otp": "123456", "new_password": "nueva123"},
+            )
+
+        self.assertPresupuesto(2, request, status=200)
+        self.assertPresupuesto(2, verify, status=200)
+        self.assertPresupuesto(4, confirm, status=200)
+
+    # ---------- usuarios (admin) ----------
+    def test_usuarios(self):
+        c = self.cliente(self.admin)
+
+        def listar(n):
+            self.crear_aprendices(n)
+            return lambda: c.get("/api/usuarios/")
+
+        def detalle(n):
+            u = self.crear_aprendices(n)[0]
+            return lambda: c.get(f"/api/usuarios/{u.id}/")
+
+        def crear(n):
+            self.crear_aprendices(n)
+            return lambda: c.post("/api/usuarios/", {"username": "nuevo", "documento": "555666777", "rol": "aprendiz"})
+
+        def editar(n):
+            u = self.crear_aprendices(n)[0]
+            return lambda: c.patch(f"/api/usuarios/{u.id}/", {"first_name": "Editado"})
+
+        def borrar(n):
+            u = self.crear_aprendices(1)[0]
+            self.crear_accesos(n, usuario=u)
+            return lambda: c.delete(f"/api/usuarios/{u.id}/")
+
+        def buscar(n):
+            self.crear_aprendices(n)
+            return lambda: c.get("/api/usuarios/buscar/", {"q": "ap", "rol": "aprendiz"})
+
+        def buscar_ids(n):
+            ids = ",".join(str(u.id) for u in self.crear_aprendices(n))
+            return lambda: c.get("/api/usuarios/buscar/", {"ids": ids})
+
+        def importar(n):
+            filas = "documento,first_name\n" + "".join(f"9{i:08d},Nombre{i}\n" for i in range(n))
+            archivo = SimpleUploadedFile("aprendices.csv", filas.encode("utf-8"))
+            return lambda: c.post("/api/usuarios/importar/", {"archivo": archivo}, format="multipart")
+
+        self.assertPresupuesto(2, listar, status=200)
+        self.assertPresupuesto(1, detalle, status=200)
+        self.assertPresupuesto(3, crear, status=201)
+        self.assertPresupuesto(4, editar, status=200)
+        self.assertPresupuesto(21, borrar, status=204)
+        # UNION de una rama por columna; SQLite no admite LIMIT en un UNION y hace una consulta por rama
+        self.assertPresupuesto(1 if connection.features.supports_slicing_ordering_in_compound else 4, buscar, status=200)
+        self.assertPresupuesto(1, buscar_ids, status=200)
+        self.assertPresupuesto(5, importar, status=200)
+
+    # ---------- equipos ----------
+    def test_equipos(self):
+        admin = self.cliente(self.admin)
+        aprendiz = self.cliente(self.aprendiz)
+
+        # el guarda no ve equipos (queryset vacío): ni siquiera el COUNT
+        for user, consultas, status_detalle in [(self.admin, 2, 200), (self.aprendiz, 2, 200), (self.guarda, 0, 404)]:
+            c = self.cliente(user)
+
+            def listar(n):
+                self.crear_equipos(self.aprendiz, n)
+                return lambda: c.get("/api/equipos/")
+
+            def detalle(n):
+                e = self.crear_equipos(self.aprendiz, n)[0]
+                return lambda: c.get(f"/api/equipos/{e.id}/")
+
+            self.assertPresupuesto(consultas, listar, status=200)
+            self.assertPresupuesto(consultas // 2, detalle, status=status_detalle)
+
+        def crear(n):
+            self.crear_equipos(self.aprendiz, n)
+            return lambda: aprendiz.post("/api/equipos/", {"serial": "NUEVO-1", "marca": "Lenovo", "modelo": "T14"})
+
+        def editar(n):
+            e = self.crear_equipos(self.aprendiz, n)[0]
+            return lambda: admin.patch(f"/api/equipos/{e.id}/", {"modelo": "T15"})
+
+        def borrar(n):
+            e = self.crear_equipos(self.aprendiz, 1)[0]
+            for _ in range(n):
+                Acceso.objects.create(usuario=self.aprendiz, tipo=Acceso.Tipo.INGRESO).equipos.add(e)
+            return lambda: admin.delete(f"/api/equipos/{e.id}/")
+
+        def delta(cliente):
+            def escenario(n):
+                desde = timezone.now().isoformat()
+                for e in self.crear_equipos(self.aprendiz, 2 * n, prefijo="delta")[:n]:
+                    e.delete()
+                return lambda: cliente.get("/api/equipos/", {"updated_since": desde})
+
+            return escenario
+
+        def revisar(n):
+            e = self.crear_equipos(self.aprendiz, n, estado=Equipo.Estado.PENDIENTE)[0]
+            return lambda: admin.patch(f"/api/equipos/{e.id}/revisar/", {"estado": "aprobado"})
+
+        def revisar_lote(n):
+            ids = [e.id for e in self.crear_equipos(self.aprendiz, n, estado=Equipo.Estado.PENDIENTE)]
+            return lambda: admin.post("/api/equipos/revisar_lote/", {"estado": "aprobado", "ids": ids}, format="json")
+
+        self.assertPresupuesto(2, crear, status=201)
+        self.assertPresupuesto(2, editar, status=200)
+        self.assertPresupuesto(4, borrar, status=204)
+        self.assertPresupuesto(5, revisar, status=200)
+        self.assertPresupuesto(6, revisar_lote, status=200)
+        self.assertPresupuesto(2, delta(admin), status=200)
+        self.assertPresupuesto(2, delta(aprendiz), status=200)
+
+    # ---------- turnos ----------
+    def test_turnos(self):
+        admin = self.cliente(self.admin)
+        guarda = self.cliente(self.guarda)
+        libre = self.cliente(self.guarda_libre)
+
+        def cerrados(n, guarda=None):
+            ahora = timezone.now()
+            return Turno.objects.bulk_create(
+                [
+                    Turno(
+                        guarda=guarda or self.guarda,
+                        sede=Turno.Sede.CEGAFE,
+                        jornada=Turno.Jornada.TARDE,
+                        inicio=ahora - timedelta(hours=8),
+                        fin=ahora,
+                        activo=False,
+                        reporte_cierre={"ingresos": 0, "salidas": 0, "total": 0},
+                    )
+                    for _ in range(n)
+                ]
+            )
+
+        def listar(n):
+            cerrados(n)
+            return lambda: admin.get("/api/turnos/")
+
+        def listar_guarda(n):
+            cerrados(n)
+            return lambda: guarda.get("/api/turnos/", {"activo": "false"})
+
+        def listar_con_accesos(n):
+            # n guardas con un turno y accesos cada uno: nombre y conteos van en el mismo SELECT
+            for i, u in enumerate(self.crear_aprendices(n, prefijo="lt")):
+                [t] = cerrados(1, guarda=Usuario.objects.create(username=f"lg{i}", rol=Usuario.Rol.GUARDA))
+                Acceso.objects.bulk_create([Acceso(usuario=u, tipo=tipo, sede=t.sede, turno=t) for tipo in ("ingreso", "salida")])
+            return lambda: admin.get("/api/turnos/", {"sede": "CEGAFE", "jornada": "TARDE"})
+
+        def detalle(cliente):
+            def escenario(n):
+                t = cerrados(n)[0]
+                return lambda: cliente.get(f"/api/turnos/{t.id}/")
+
+            return escenario
+
+        def iniciar(n):
+            cerrados(n, guarda=self.guarda_libre)
+            return lambda: libre.post("/api/turnos/iniciar/", {"sede": "CEGAFE", "jornada": "MANANA"})
+
+        def finalizar(n):
+            self.crear_accesos(n)
+            return lambda: guarda.post("/api/turnos/finalizar/")
+
+        def actual(n):
+            cerrados(n)
+            return lambda: guarda.get("/api/turnos/actual/")
+
+        def finalizar_admin(n):
+            self.crear_accesos(n)
+            return lambda: admin.post(f"/api/turnos/{self.turno.id}/finalizar_admin/")
+
+        def resumen_cerrado(cliente):
+            def escenario(n):
+                t = cerrados(n)[0]
+                return lambda: cliente.get(f"/api/turnos/{t.id}/resumen/")
+
+            return escenario
+
+        def resumen_activo(cliente):
+            def escenario(n):
+                self.crear_accesos(n)
+                return lambda: cliente.get(f"/api/turnos/{self.turno.id}/resumen/")
+
+            return escenario
+
+        self.assertPresupuesto(2, listar, status=200)
+        self.assertPresupuesto(2, listar_guarda, status=200)
+        self.assertPresupuesto(2, listar_con_accesos, status=200)
+        self.assertPresupuesto(1, detalle(admin), status=200)
+        self.assertPresupuesto(1, detalle(guarda), status=200)
+        self.assertPresupuesto(4, iniciar, status=201)
+        self.assertPresupuesto(7, finalizar, status=200)
+        self.assertPresupuesto(1, actual, status=200)
+        self.assertPresupuesto(7, finalizar_admin, status=200)
+        for cliente in (admin, guarda):
+            self.assertPresupuesto(1, resumen_cerrado(cliente), status=200)
+            self.assertPresupuesto(3, resumen_activo(cliente), status=200)
+
+    # ---------- accesos ----------
+    def test_accesos_listado(self):
+        for user in [self.admin, self.guarda]:
+            c = self.cliente(user)
+
+            def listar(n):
+                self.crear_accesos(n)
+                return lambda: c.get("/api/accesos/")
+
+            def buscar(n):
+                self.crear_accesos(n)
+                return lambda: c.get("/api/accesos/", {"q": "acc", "sede": "CEGAFE"})
+
+            def detalle_turno(n):
+                a = self.crear_accesos(n)[0]
+                return lambda: c.get(f"/api/accesos/{a.id}/")
+
+            self.assertPresupuesto(3, listar, status=200)
+            self.assertPresupuesto(3, buscar, status=200)
+            self.assertPresupuesto(2, detalle_turno, status=200)
+
+        aprendiz = self.cliente(self.aprendiz)
+
+        def listar_aprendiz(n):
+            self.crear_accesos(n, usuario=self.aprendiz)
+            return lambda: aprendiz.get("/api/accesos/")
+
+        def detalle(n):
+            a = self.crear_accesos(n, usuario=self.aprendiz)[0]
+            return lambda: aprendiz.get(f"/api/accesos/{a.id}/")
+
+        def mis_accesos(n):
+            self.crear_accesos(n, usuario=self.aprendiz)
+            return lambda: aprendiz.get("/api/accesos/mis_accesos/")
+
+        def estado(n):
+            self.crear_accesos(n, usuario=self.aprendiz)
+            return lambda: aprendiz.get("/api/accesos/estado/")
+
+        def visitas(n):
+            self.crear_accesos(n, usuario=self.aprendiz)
+            return lambda: aprendiz.get("/api/accesos/visitas/")
+
+        def visitas_resumen(n):
+            self.crear_accesos(n, usuario=self.aprendiz)
+            return lambda: aprendiz.get("/api/accesos/visitas_resumen/", {"por": "dia"})
+
+        self.assertPresupuesto(3, listar_aprendiz, status=200)
+        self.assertPresupuesto(2, detalle, status=200)
+        self.assertPresupuesto(2, mis_accesos, status=200)
+        self.assertPresupuesto(1, estado, status=200)
+        self.assertPresupuesto(2, visitas, status=200)
+        self.assertPresupuesto(1, visitas_resumen, status=200)
+
+    def test_accesos_escritura(self):
+        # el guarda además busca su turno activo
+        for user, consultas_crear in [(self.admin, 18), (self.guarda, 19)]:
+            c = self.cliente(user)
+
+            def crear(n):
+                # historial de n accesos previos (ingreso/salida alternados, termina en salida)
+                # e ingreso con n equipos: se resuelven en un solo IN
+                for i in range(2 * n):
+                    Acceso.objects.create(usuario=self.aprendiz, tipo=Acceso.Tipo.INGRESO if i % 2 == 0 else Acceso.Tipo.SALIDA)
+                ids = [e.id for e in self.crear_equipos(self.aprendiz, n, prefijo="ce")]
+                return lambda: c.post("/api/accesos/", {"usuario": self.aprendiz.id, "tipo": "ingreso", "equipos": ids}, format="json")
+
+            def editar(n):
+                # el último de n ingresos pasa a salida (la validación lo compara con el último acceso)
+                a = self.crear_accesos(n, usuario=self.aprendiz)[-1]
+                return lambda: c.patch(f"/api/accesos/{a.id}/", {"usuario": self.aprendiz.id, "tipo": "salida"}, format="json")
+
+            def borrar(n):
+                # con al menos un acceso restante: la presencia se recalcula, no solo se borra
+                a = self.crear_accesos(n + 1, usuario=self.aprendiz)[0]
+                return lambda: c.delete(f"/api/accesos/{a.id}/")
+
+            self.assertPresupuesto(consultas_crear, crear, status=201)
+            self.assertPresupuesto(8, editar, status=200)
+            self.assertPresupuesto(10, borrar, status=204)
+
+    def test_porteria(self):
+        guarda = self.cliente(self.guarda)
+
+        def validar(n):
+            self.crear_equipos(self.aprendiz, n)
+            return lambda: guarda.post("/api/accesos/validar_documento/", {"documento": self.aprendiz.documento})
+
+        def registrar_ingreso(n):
+            ids = [e.id for e in self.crear_equipos(self.aprendiz, n)]
+            return lambda: guarda.post(
+                "/api/accesos/registrar_por_documento/",
+                {"documento": self.aprendiz.documento, "tipo": "ingreso", "equipos": ids},
+                format="json",
+            )
+
+        def registrar_salida(n):
+            ingreso = self.crear_accesos(1, usuario=self.aprendiz)[0]
+            extra = self.crear_equipos(self.aprendiz, n - 1, prefijo="extra")
+            ingreso.equipos.add(*extra)
+            ids = list(ingreso.equipos.values_list("id", flat=True))
+            return lambda: guarda.post(
+                "/api/accesos/registrar_por_documento/",
+                {"documento": self.aprendiz.documento, "tipo": "salida", "equipos": ids},
+                format="json",
+            )
+
+        def stats(n):
+            self.crear_accesos(n)
+            return lambda: guarda.get("/api/accesos/stats/")
+
+        # Rechazos por documento: turno, usuario y el INSERT del Evento
+        def rechazo(documento=None, credencial=None):
+            def escenario(n):
+                for i in range(n):
+                    registrar_evento(Evento.Tipo.ESCANEO_RECHAZADO, self.turno.id, sede=self.turno.sede, motivo="previo")
+                datos = {"credencial": credencial} if credencial else {"documento": documento}
+                return lambda: guarda.post("/api/accesos/validar_documento/", datos, format="json")
+            return escenario
+
+        bloqueado = Usuario.objects.create(
+            username="bloq", rol=Usuario.Rol.APRENDIZ, documento="bloq", estado=Usuario.Estado.BLOQUEADO
+        )
+
+        self.assertPresupuesto(4, validar, status=200)
+        self.assertPresupuesto(3, rechazo(documento="no-existe"), status=404)
+        self.assertPresupuesto(3, rechazo(documento=bloqueado.documento), status=403)
+        # QR falso o de un bloqueado: cero consultas (lista de revocación ya en memoria)
+        bloqueado_qr, _ = emitir(bloqueado)
+        with override_settings(QR_REVOCACION_TTL=60):
+            with self.assertRaises(CredencialInvalida):
+                verificar(bloqueado_qr)
+            self.assertPresupuesto(0, rechazo(credencial="basura"), status=403)
+            self.assertPresupuesto(0, rechazo(credencial=bloqueado_qr), status=403)
+        self.assertPresupuesto(18, registrar_ingreso, status=201)
+        self.assertPresupuesto(13, registrar_salida, status=201)
+        self.assertPresupuesto(3, stats, status=200)
+
+    # ---------- notificaciones ----------
+    def test_notificaciones(self):
+        admin = self.cliente(self.admin)
+
+        def crear_notis(n):
+            # la primera es global: visible (y editable) para todos los roles
+            return Notificacion.objects.bulk_create(
+                [Notificacion(titulo=f"g{i}", mensaje="m") for i in range(n)]
+                + [Notificacion(titulo=f"n{i}", mensaje="m", rol_objetivo=Usuario.Rol.GUARDA) for i in range(n)]
+                + [Notificacion(titulo=f"u{i}", mensaje="m", user=self.aprendiz) for i in range(n)]
+            )
+
+        for user in [self.admin, self.guarda, self.aprendiz]:
+            c = self.cliente(user)
+
+            def listar(n):
+                crear_notis(n)
+                return lambda: c.get("/api/notificaciones/")
+
+            def detalle(n):
+                noti = crear_notis(n)[0]
+                return lambda: c.get(f"/api/notificaciones/{noti.id}/")
+
+            def leer(n):
+                noti = crear_notis(n)[0]
+                return lambda: c.patch(f"/api/notificaciones/{noti.id}/leer/")
+
+            self.assertPresupuesto(2, listar, status=200)
+            self.assertPresupuesto(1, detalle, status=200)
+            self.assertPresupuesto(2, leer, status=200)
+
+        def crear(n):
+            crear_notis(n)
+            return lambda: admin.post("/api/notificaciones/", {"titulo": "t", "mensaje": "m"}, format="json")
+
+        def editar(n):
+            noti = crear_notis(n)[0]
+            return lambda: admin.patch(f"/api/notificaciones/{noti.id}/", {"titulo": "t2"}, format="json")
+
+        def borrar(n):
+            noti = crear_notis(n)[0]
+            return lambda: admin.delete(f"/api/notificaciones/{noti.id}/")
+
+        self.assertPresupuesto(1, crear, status=201)
+        self.assertPresupuesto(2, editar, status=200)
+        self.assertPresupuesto(3, borrar, status=204)
+
+    # ---------- sedes: quién está dentro ----------
+    def test_sedes_dentro(self):
+        def presentes(n):
+            # el post_save de Acceso los deja en el roster
+            self.crear_accesos(n)
+
+        for user in [self.admin, self.guarda]:
+            c = self.cliente(user)
+
+            def dentro(n):
+                presentes(n)
+                return lambda: c.get("/api/sedes/CEGAFE/dentro/")
+
+            def exportar(n):
+                presentes(n)
+
+                def hacer():
+                    resp = c.get("/api/sedes/CEGAFE/dentro/export/")
+                    b"".join(resp.streaming_content)  # consumir el stream dentro de la medición
+                    return resp
+
+                return hacer
+
+            self.assertPresupuesto(3, dentro, status=200)
+            self.assertPresupuesto(2, exportar, status=200)
+
+        def snapshot(n):
+            presentes(n)
+            for a in self.crear_aprendices(n, prefijo="snap"):
+                self.crear_equipos(a, 2, prefijo=f"snap{a.id}-")
+            generar_snapshot("CEGAFE")
+            return lambda: self.cliente(self.guarda).get("/api/sedes/CEGAFE/snapshot/")
+
+        def snapshot_presencia(n):
+            presentes(n)
+            return lambda: self.cliente(self.guarda).get("/api/sedes/CEGAFE/snapshot/presencia/")
+
+        # la descarga no reconstruye: última versión + su contenido (diferido)
+        self.assertPresupuesto(2, snapshot, status=200)
+        self.assertPresupuesto(1, snapshot_presencia, status=200)
+
+    # ---------- tablero de administración ----------
+    def test_admin_resumen(self):
+        def resumen(n):
+            self.crear_accesos(n)
+            self.crear_equipos(self.aprendiz, n, estado=Equipo.Estado.PENDIENTE, prefijo="pend")
+            return lambda: self.cliente(self.admin).get("/api/admin/resumen/")
+
+        # frío: usuarios, pendientes, turnos, accesos de hoy y ocupación
+        self.assertPresupuesto(5, resumen, status=200)
+
+    # ---------- asistencia (admin) ----------
+    def test_asistencia(self):
+        admin = self.cliente(self.admin)
+
+        def dias(n):
+            hoy = timezone.localdate()
+            AsistenciaDiaria.objects.bulk_create(
+                [
+                    AsistenciaDiaria(usuario=u, dia=hoy - timedelta(days=d), segundos=3600, visitas=1)
+                    for u in self.crear_aprendices(n, prefijo="as")
+                    for d in range(n)
+                ]
+            )
+
+        def listar(n):
+            dias(n)
+            return lambda: admin.get("/api/asistencia/")
+
+        def programas(n):
+            dias(n)
+            return lambda: admin.get("/api/asistencia/programas/", {"sede": "CEGAFE"})
+
+        self.assertPresupuesto(2, listar, status=200)
+        self.assertPresupuesto(1, programas, status=200)
+
+    # ---------- rutas de otro rol: 403 sin tocar la BD ----------
+    def test_prohibidos(self):
+        turno = f"/api/turnos/{self.turno.id}"
+        rutas = {
+            self.guarda: [
+                ("get", "/api/usuarios/"), ("get", "/api/admin/resumen/"), ("get", "/api/asistencia/"),
+                ("post", "/api/equipos/revisar_lote/"), ("post", f"{turno}/finalizar_admin/"), ("post", "/api/notificaciones/"),
+                ("get", "/api/accesos/mis_accesos/"), ("get", "/api/accesos/visitas/"),
+            ],
+            self.aprendiz: [
+                ("get", "/api/usuarios/"), ("get", "/api/admin/resumen/"), ("get", "/api/asistencia/"),
+                ("get", "/api/turnos/"), ("post", "/api/turnos/iniciar/"), ("get", "/api/sedes/CEGAFE/dentro/"),
+                ("get", "/api/eventos/"), ("post", "/api/accesos/"), ("post", "/api/accesos/validar_documento/"),
+                ("get", "/api/credenciales/claves/"),
+            ],
+            self.admin: [
+                ("get", "/api/accesos/mis_accesos/"), ("get", "/api/accesos/estado/"), ("post", "/api/turnos/iniciar/"),
+                ("get", "/api/credenciales/claves/"),
+            ],
+        }
+        for user, lista in rutas.items():
+            c = self.cliente(user)
+            for metodo, ruta in lista:
+                with self.subTest(rol=user.rol, ruta=ruta):
+                    self.assertPresupuesto(0, lambda n: lambda: getattr(c, metodo)(ruta), status=403)
+
+    def test_eventos(self):
+        def feed(user):
+            def escenario(n):
+                registrar_eventos(
+                    [Evento(tipo=Evento.Tipo.ACCESO_CREADO, objeto_id=i, sede="CEGAFE", actor=self.guarda) for i in range(n)]
+                )
+                return lambda: self.cliente(user).get("/api/eventos/?since=0")
+
+            return escenario
+
+        # publicar lo pendiente (lock, pendientes, UPDATE de seq y del contador) + el SELECT
+        self.assertPresupuesto(5, feed(self.admin), status=200)
+        self.assertPresupuesto(6, feed(self.guarda), status=200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(username="aprendiz", rol=Usuario.Rol.APRENDIZ, documento="100200300")
+        Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    def setUp(self):
+        cache.clear()
+        self.c = APIClient()
+        self.c.force_authenticate(self.guarda)
+
+    def test_cabecera(self):
+        resp = self.c.post("/api/accesos/validar_documento/", {"documento": "100200300"}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        fases = [p.split(";")[0] for p in resp["Server-Timing"].split(", ")]
+        self.assertEqual(fases[0], "db")
+        self.assertIn("vista", fases)
+        self.assertIn("render", fases)
+        self.assertEqual(fases[-1], "total")
+
+    def test_excepcion_en_cabecera(self):
+        resp = self.c.post("/api/accesos/validar_documento/", {}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("excepcion;dur=", resp["Server-Timing"])
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_log_solicitud_lenta_con_accion(self):
+        with self.assertLogs("accesos.rendimiento", level="WARNING") as logs:
+            self.c.post("/api/accesos/validar_documento/", {"documento": "100200300"}, format="json")
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro["accion"], "accesos.validar_documento")
+        self.assertEqual(registro["status"], 200)
+        self.assertEqual(registro["usuario_id"], self.guarda.id)
+        self.assertGreater(registro["sql_n"], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0, DB_LECTURA=None)
+    def test_accion_por_viewset(self):
+        with self.assertLogs("accesos.rendimiento", level="WARNING") as logs:
+            self.c.get("/api/turnos/")
+            self.c.get("/api/notificaciones/")
+        acciones = [json.loads(r.getMessage())["accion"] for r in logs.records]
+        self.assertEqual(acciones, ["turnos.list", "notificaciones.list"])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        Usuario.objects.create(
+            username="bloq", rol=Usuario.Rol.APRENDIZ, documento="555", estado=Usuario.Estado.BLOQUEADO
+        )
+        Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.enterContext(override_settings(METRICS_DIR=tmp.name, METRICS_TOKEN="", METRICS_IPS=["127.0.0.1"]))
+        # Los contadores son del proceso: sin lo que sumaron otras clases de tests
+        metricas._contadores.clear()
+        metricas._histogramas.clear()
+
+    def test_agrega_workers_y_clasifica_escaneos(self):
+        c = APIClient()
+        c.force_authenticate(self.guarda)
+        resp = c.post("/api/accesos/validar_documento/", {"documento": "555"}, format="json")
+        self.assertEqual(resp.status_code, 403)
+
+        # Otro worker ya volcó su archivo
+        (self.dir / "worker-999999.json").write_text(
+            json.dumps(
+                {
+                    "contadores": [["sadi_escaneos_total", [["resultado", "bloqueado"], ["sede", "CEGAFE"]], 4]],
+                    "histogramas": [],
+                }
+            )
+        )
+
+        texto = APIClient().get("/metrics").content.decode()
+        self.assertIn('sadi_escaneos_total{resultado="bloqueado",sede="CEGAFE"} 5', texto)
+        self.assertIn('sadi_solicitud_duracion_ms_count{accion="accesos.validar_documento",sede="CEGAFE"}', texto)
+        self.assertIn('sadi_db_duracion_ms_bucket{accion="accesos.validar_documento",le="+Inf"}', texto)
+        self.assertIn('sadi_turnos_activos{sede="CEGAFE"} 1', texto)
+
+    def test_create_de_otros_viewsets_no_es_escaneo(self):
+        aprendiz = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="777")
+        c = APIClient()
+        c.force_authenticate(aprendiz)
+        resp = c.post("/api/equipos/", {"serial": "NUEVO-1", "marca": "Lenovo", "modelo": "T14"})
+        self.assertEqual(resp.status_code, 201)
+
+        texto = APIClient().get("/metrics").content.decode()
+        self.assertIn('sadi_solicitudes_total{accion="equipos.create",status="201"} 1', texto)
+        self.assertNotIn("sadi_escaneos_total{", texto)
+
+    def test_resultado_por_codigo_de_la_vista(self):
+        aprendiz = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="777")
+        equipo = Equipo.objects.create(
+            propietario=aprendiz, marca="M", modelo="X", serial="S-1", estado=Equipo.Estado.PENDIENTE
+        )
+        c = APIClient()
+        c.force_authenticate(self.guarda)
+        url = "/api/accesos/registrar_por_documento/"
+        self.assertEqual(c.post(url, {"documento": "777", "tipo": "ingreso", "equipos": [equipo.id]}, format="json").status_code, 400)
+        self.assertEqual(c.post(url, {"documento": "777", "tipo": "ingreso"}, format="json").status_code, 201)
+        self.assertEqual(c.post(url, {"documento": "777", "tipo": "ingreso"}, format="json").status_code, 400)
+        self.assertEqual(c.post(url, {"tipo": "ingreso"}, format="json").status_code, 400)
+
+        def escaneos(resultado):
+            return sum(
+                v for (n, e), v in metricas._contadores.items() if n == "sadi_escaneos_total" and ("resultado", resultado) in e
+            )
+
+        self.assertEqual(escaneos("equipo_no_aprobado"), 1)
+        self.assertEqual(escaneos("permitido"), 1)
+        self.assertEqual(escaneos("doble_ingreso"), 1)
+        # errores del serializer: sin etiqueta propia
+        self.assertEqual(escaneos("otro"), 1)
+
+    def test_descarta_archivos_de_workers_terminados(self):
+        viejo = self.dir / "worker-999999-1.json"
+        viejo.write_text(
+            json.dumps({"contadores": [["sadi_escaneos_total", [["resultado", "bloqueado"], ["sede", "CEGAFE"]], 4]], "histogramas": []})
+        )
+        hace = timezone.now().timestamp() - 120
+        os.utime(viejo, (hace, hace))
+
+        with override_settings(METRICS_STALE_SECONDS=60):
+            texto = APIClient().get("/metrics").content.decode()
+        self.assertNotIn("sadi_escaneos_total{", texto)
+        self.assertFalse(viejo.exists())
+        # el propio proceso se vuelca con pid y arranque en el nombre
+        self.assertEqual([p.name for p in self.dir.glob("worker-*.json")], [f"{metricas._nombre_proceso()}.json"])
+
+    def test_token(self):
+        # Cerrado por defecto: sin token ni IP permitida nadie lee
+        with override_settings(METRICS_IPS=[]):
+            self.assertEqual(APIClient().get("/metrics").status_code, 403)
+        with override_settings(METRICS_TOKEN="s3creto"):
+            self.assertEqual(APIClient().get("/metrics").status_code, 401)
+            resp = APIClient().get("/metrics", HTTP_AUTHORIZATION="Bearer s3creto")
+            self.assertEqual(resp.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class EventosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(username="aprendiz", rol=Usuario.Rol.APRENDIZ, documento="100200300")
+
+    def cliente(self, user):
+        c = APIClient()
+        c.force_authenticate(user)
+        return c
+
+    def test_feed_incremental(self):
+        guarda = self.cliente(self.guarda)
+        guarda.post("/api/turnos/iniciar/", {"sede": "CEGAFE", "jornada": "MANANA"}, format="json")
+        for tipo in ["ingreso", "salida", "ingreso"]:
+            resp = guarda.post(
+                "/api/accesos/registrar_por_documento/", {"documento": "100200300", "tipo": tipo}, format="json"
+            )
+            self.assertEqual(resp.status_code, 201)
+        # rechazado: no deja evento
+        guarda.post("/api/accesos/registrar_por_documento/", {"documento": "100200300", "tipo": "ingreso"}, format="json")
+        self.cliente(self.admin).patch(f"/api/usuarios/{self.aprendiz.id}/", {"estado": "bloqueado"}, format="json")
+
+        admin = self.cliente(self.admin)
+        vistos, since = [], 0
+        while True:
+            data = admin.get(f"/api/eventos/?since={since}&limit=2").data
+            vistos += data["eventos"]
+            since = data["siguiente"]
+            if not data["hay_mas"]:
+                break
+
+        self.assertEqual(
+            [e["tipo"] for e in vistos],
+            ["turno_abierto", "acceso_creado", "acceso_creado", "acceso_creado", "usuario_bloqueado"],
+        )
+        self.assertEqual([e["datos"].get("tipo_acceso") for e in vistos[1:4]], ["ingreso", "salida", "ingreso"])
+        self.assertEqual(admin.get(f"/api/eventos/?since={since}").data["eventos"], [])
+
+    def test_seq_en_orden_de_publicacion(self):
+        SecuenciaEventos.objects.update_or_create(pk=1, defaults={"valor": 41})
+        primero = registrar_evento(Evento.Tipo.TURNO_ABIERTO, 1)
+        registrar_eventos([Evento(tipo=Evento.Tipo.TURNO_CERRADO, objeto_id=i) for i in range(3)])
+        # escribir no numera: el seq se asigna al leer
+        self.assertIsNone(primero.seq)
+        admin = self.cliente(self.admin)
+        data = admin.get("/api/eventos/?since=41").data
+        self.assertEqual([e["seq"] for e in data["eventos"]], [42, 43, 44, 45])
+        self.assertEqual(SecuenciaEventos.objects.get(pk=1).valor, 45)
+
+        # Un id menor que se confirma después (transacción larga) recibe un seq mayor: el cursor no lo salta
+        Evento.objects.create(id=primero.id - 1, tipo=Evento.Tipo.TURNO_ABIERTO, objeto_id=99)
+        data = admin.get("/api/eventos/?since=45").data
+        self.assertEqual([(e["seq"], e["objeto_id"]) for e in data["eventos"]], [(46, 99)])
+
+    def test_bloqueo_desde_el_admin_de_django(self):
+        admin = Usuario.objects.create(username="super", rol=Usuario.Rol.ADMIN, is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        formulario = {
+            "username": "aprendiz",
+            "rol": "aprendiz",
+            "documento": "100200300",
+            "estado": "bloqueado",
+            "date_joined_0": "2026-01-01",
+            "date_joined_1": "08:00:00",
+        }
+        resp = self.client.post(f"/admin/accesos/usuario/{self.aprendiz.id}/change/", formulario)
+        self.assertEqual(resp.status_code, 302)
+        # guardar otra vez sin cambiar el estado no repite el evento
+        self.client.post(f"/admin/accesos/usuario/{self.aprendiz.id}/change/", formulario)
+
+        eventos = list(Evento.objects.filter(objeto_id=self.aprendiz.id).values_list("tipo", "actor_id"))
+        self.assertEqual(eventos, [(Evento.Tipo.USUARIO_BLOQUEADO, admin.id)])
+        # y revoca los QR emitidos, igual que la API
+        self.assertEqual(Usuario.objects.get(pk=self.aprendiz.id).credencial_version, 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "escrituras concurrentes reales: solo PostgreSQL")
+class SecuenciaEventosConcurrenciaTests(TransactionTestCase):
+    def test_escribir_no_espera_y_el_cursor_no_salta(self):
+        escrito, seguir = threading.Event(), threading.Event()
+
+        def larga():
+            try:
+                with transaction.atomic():
+                    registrar_evento(Evento.Tipo.TURNO_ABIERTO, 1)
+                    escrito.set()
+                    seguir.wait(10)
+            finally:
+                connection.close()
+
+        def corta():
+            try:
+                registrar_evento(Evento.Tipo.TURNO_ABIERTO, 2)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=larga), threading.Thread(target=corta)]
+        hilos[0].start()
+        self.assertTrue(escrito.wait(10))
+        hilos[1].start()
+        hilos[1].join(5)
+        # la corta no espera a la larga (id mayor, confirmado antes)
+        self.assertFalse(hilos[1].is_alive())
+
+        lote, _ = eventos_desde(0)
+        self.assertEqual([(e.seq, e.objeto_id) for e in lote], [(1, 2)])
+
+        seguir.set()
+        hilos[0].join(10)
+        # la larga tiene el id menor pero se publica después, con seq mayor
+        lote, _ = eventos_desde(1)
+        self.assertEqual([(e.seq, e.objeto_id) for e in lote], [(2, 1)])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"], EVENTOS_MARGEN_SEGUNDOS=0)
+class SincronizacionDeltaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(username="aprendiz", rol=Usuario.Rol.APRENDIZ, documento="100200300")
+
+    def cliente(self, user):
+        c = APIClient()
+        c.force_authenticate(user)
+        return c
+
+    def test_equipos_cambios_y_borrados(self):
+        a = Equipo.objects.create(propietario=self.aprendiz, serial="A", marca="m", modelo="m")
+        b = Equipo.objects.create(propietario=self.aprendiz, serial="B", marca="m", modelo="m")
+        c = self.cliente(self.aprendiz)
+
+        hasta = c.get("/api/equipos/", {"updated_since": "2000-01-01T00:00:00+00:00"}).data
+        self.assertTrue(hasta["completo"])
+        self.assertEqual({e["id"] for e in hasta["results"]}, {a.id, b.id})
+
+        desde = timezone.now().isoformat()
+        self.cliente(self.admin).patch(f"/api/equipos/{a.id}/revisar/", {"estado": "aprobado"})
+        b_id = b.id
+        b.delete()
+
+        data = c.get("/api/equipos/", {"updated_since": desde}).data
+        self.assertFalse(data["completo"])
+        self.assertEqual([e["id"] for e in data["results"]], [a.id])
+        self.assertEqual(data["borrados"], [b_id])
+
+        # La lápida de un equipo ajeno no se filtra a otros aprendices
+        otro = Usuario.objects.create(username="otro", rol=Usuario.Rol.APRENDIZ, documento="9")
+        self.assertEqual(self.cliente(otro).get("/api/equipos/", {"updated_since": desde}).data["borrados"], [])
+
+    def test_revision_masiva_actualiza_marca(self):
+        e = Equipo.objects.create(propietario=self.aprendiz, serial="A", marca="m", modelo="m")
+        desde = timezone.now().isoformat()
+        self.cliente(self.admin).post("/api/equipos/revisar_lote/", {"estado": "aprobado", "ids": [e.id]}, format="json")
+        data = self.cliente(self.aprendiz).get("/api/equipos/", {"updated_since": desde}).data
+        self.assertEqual([x["estado"] for x in data["results"]], ["aprobado"])
+
+    def test_borrado_en_cascada_deja_lapidas(self):
+        turno_id = Turno.objects.create(guarda=self.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA).id
+        noti_id = Notificacion.objects.create(titulo="t", mensaje="m", user=self.guarda).id
+        desde = timezone.now().isoformat()
+
+        self.cliente(self.admin).delete(f"/api/usuarios/{self.guarda.id}/")
+
+        admin = self.cliente(self.admin)
+        self.assertEqual(admin.get("/api/turnos/", {"updated_since": desde}).data["borrados"], [turno_id])
+        # el admin no veía esa notificación: tampoco su lápida
+        self.assertEqual(admin.get("/api/notificaciones/", {"updated_since": desde}).data["borrados"], [])
+        self.assertTrue(Borrado.objects.filter(modelo=Borrado.Modelo.NOTIFICACION, objeto_id=noti_id).exists())
+
+    def test_borrado_fallido_no_deja_la_cascada_abierta(self):
+        def falla(sender, **kwargs):
+            raise RuntimeError("falla a mitad del borrado")
+
+        borrados = [
+            lambda: Usuario.objects.filter(pk=self.aprendiz.pk).delete(),
+            lambda: Usuario.objects.get(pk=self.aprendiz.pk).delete(),
+        ]
+        for i, borrar in enumerate(borrados):
+            Equipo.objects.create(propietario=self.aprendiz, serial=f"F{i}", marca="m", modelo="m")
+            post_delete.connect(falla, sender=Equipo)
+            try:
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    borrar()
+            finally:
+                post_delete.disconnect(falla, sender=Equipo)
+
+            # el aprendiz sigue ahí: borrar su equipo guarda la lápida en el acto
+            equipo = Equipo.objects.get(serial=f"F{i}")
+            equipo_id = equipo.id
+            equipo.delete()
+            self.assertTrue(Borrado.objects.filter(modelo=Borrado.Modelo.EQUIPO, objeto_id=equipo_id).exists())
+
+    def test_paginas_por_keyset(self):
+        equipos = [Equipo.objects.create(propietario=self.aprendiz, serial=f"P{i}", marca="m", modelo="m") for i in range(5)]
+        # tres con la misma marca: el id desempata
+        marca = timezone.now() - timedelta(minutes=1)
+        Equipo.objects.filter(id__in=[e.id for e in equipos[:3]]).update(actualizado_en=marca)
+        c = self.cliente(self.aprendiz)
+
+        desde, vistos, paginas = (marca - timedelta(seconds=1)).isoformat(), [], []
+        while True:
+            data = c.get("/api/equipos/", {"updated_since": desde, "limit": 2}).data
+            vistos += [e["id"] for e in data["results"]]
+            paginas.append((len(data["results"]), data["hay_mas"], data["completo"]))
+            desde = data["hasta"]
+            if not data["hay_mas"]:
+                break
+        self.assertEqual(vistos, [e.id for e in equipos])
+        self.assertEqual(paginas, [(2, True, False), (2, True, False), (1, False, False)])
+        self.assertEqual(c.get("/api/equipos/", {"updated_since": desde}).data["results"], [])
+
+        # colección completa: solo la primera página pide reemplazar
+        data = c.get("/api/equipos/", {"updated_since": "2000-01-01T00:00:00+00:00", "limit": 4}).data
+        self.assertEqual((len(data["results"]), data["hay_mas"], data["completo"]), (4, True, True))
+        data = c.get("/api/equipos/", {"updated_since": data["hasta"], "limit": 4}).data
+        self.assertEqual((len(data["results"]), data["hay_mas"], data["completo"]), (1, False, False))
+
+    def test_marca_invalida(self):
+        resp = self.cliente(self.aprendiz).get("/api/equipos/", {"updated_since": "ayer"})
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SnapshotSedeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.ana = Usuario.objects.create(
+            username="ana", first_name="Ana", rol=Usuario.Rol.APRENDIZ, documento="111", sede_principal="CEGAFE"
+        )
+        cls.beto = Usuario.objects.create(username="beto", rol=Usuario.Rol.APRENDIZ, documento="222", sede_principal="CEGAFE")
+        Usuario.objects.create(username="otra", rol=Usuario.Rol.APRENDIZ, documento="333", sede_principal="ITEDRIS")
+        cls.equipo = Equipo.objects.create(
+            propietario=cls.ana, serial="S1", marca="Lenovo", modelo="T14", estado=Equipo.Estado.PENDIENTE
+        )
+
+    def setUp(self):
+        self.c = APIClient()
+        self.c.force_authenticate(self.guarda)
+
+    def bajar(self, **params):
+        resp = self.c.get("/api/sedes/CEGAFE/snapshot/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp, json.loads(resp.content)
+
+    def test_completo_delta_y_304(self):
+        resp, v1 = self.bajar()
+        self.assertEqual((v1["tipo"], v1["version"]), ("completo", 1))
+        self.assertEqual(set(v1["aprendices"]), {"111", "222"})
+        self.assertEqual(v1["aprendices"]["111"], {"id": self.ana.id, "nombre": "Ana", "estado": "activo", "credencial": 0, "equipos": []})
+
+        # Sin cambios: misma versión y 304 con el ETag
+        generar_snapshot("CEGAFE")
+        self.assertEqual(self.bajar()[1]["version"], 1)
+        self.assertEqual(self.c.get("/api/sedes/CEGAFE/snapshot/", HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+        Equipo.objects.filter(pk=self.equipo.pk).update(estado=Equipo.Estado.APROBADO)
+        # la descarga no regenera: sigue la v1 hasta la próxima pasada de generar_snapshots
+        self.assertEqual(self.bajar()[1]["version"], 1)
+        call_command("generar_snapshots", sede="CEGAFE", stdout=StringIO())  # v2
+        Usuario.objects.filter(pk=self.beto.pk).update(estado=Usuario.Estado.BLOQUEADO)
+        generar_snapshot("CEGAFE")
+        self.assertEqual(self.bajar()[1]["version"], 3)
+
+        resp_delta, delta = self.bajar(desde=1)
+        self.assertEqual((delta["tipo"], delta["base"], delta["version"]), ("delta", 1, 3))
+        self.assertEqual(set(delta["cambios"]), {"111", "222"})
+        self.assertEqual(delta["cambios"]["111"]["equipos"], [[self.equipo.id, "S1", "Lenovo", "T14"]])
+        self.assertEqual(delta["cambios"]["222"]["estado"], "bloqueado")
+
+        resp_2, delta_2 = self.bajar(desde=2)
+        self.assertEqual(set(delta_2["cambios"]), {"222"})
+        # cada `desde` es otro cuerpo: otro ETag, y el del completo no vale para un delta
+        etags = {self.bajar()[0]["ETag"], resp_delta["ETag"], resp_2["ETag"]}
+        self.assertEqual(len(etags), 3)
+        completo = self.bajar()[0]["ETag"]
+        resp = self.c.get("/api/sedes/CEGAFE/snapshot/", {"desde": 1}, HTTP_IF_NONE_MATCH=completo)
+        self.assertEqual(resp.status_code, 200)
+        resp = self.c.get("/api/sedes/CEGAFE/snapshot/", {"desde": 1}, HTTP_IF_NONE_MATCH=resp_delta["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_presencia_fuera_del_padron_versionado(self):
+        self.assertEqual(self.bajar()[1]["version"], 1)
+        Turno.objects.create(guarda=self.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+        resp = self.c.post("/api/accesos/registrar_por_documento/", {"documento": "111", "tipo": "ingreso"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+
+        # el ingreso no crea versión nueva del padrón
+        self.assertEqual(generar_snapshot("CEGAFE").version, 1)
+        data = self.c.get("/api/sedes/CEGAFE/snapshot/presencia/").data
+        self.assertEqual((data["sede"], data["dentro"]), ("CEGAFE", ["111"]))
+
+    def test_gzip_y_versiones_purgadas(self):
+        self.bajar()
+        with override_settings(SNAPSHOT_VERSIONES=1):
+            Usuario.objects.filter(pk=self.beto.pk).delete()
+            generar_snapshot("CEGAFE")  # v2
+            Equipo.objects.filter(pk=self.equipo.pk).update(estado=Equipo.Estado.APROBADO)
+            generar_snapshot("CEGAFE")  # v3
+
+        resp = self.c.get("/api/sedes/CEGAFE/snapshot/", {"desde": 1}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        datos = json.loads(gzip.decompress(resp.content))
+        # la v2 (delta 1 -> 2) se purgó: no hay delta posible desde 1
+        self.assertEqual((datos["tipo"], set(datos["aprendices"])), ("completo", {"111"}))
+
+
+@override_settings(QR_CLAVES={"k1": "secreto-1"}, QR_CLAVE_ACTIVA="k1", QR_REVOCACION_TTL=0)
+class CredencialQRTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="111")
+        Turno.objects.create(guarda=cls.guarda, sede="CEGAFE", activo=True)
+
+    def setUp(self):
+        cache.clear()
+        self.c = APIClient()
+
+    def credencial(self):
+        self.aprendiz.refresh_from_db()
+        self.c.force_authenticate(self.aprendiz)
+        resp = self.c.get("/api/me/qr/")
+        self.assertEqual(resp.status_code, 200)
+        return resp.data["credencial"]
+
+    def validar(self, credencial):
+        self.c.force_authenticate(self.guarda)
+        return self.c.post("/api/accesos/validar_documento/", {"credencial": credencial}, format="json")
+
+    def test_emitir_y_validar(self):
+        resp = self.validar(self.credencial())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["aprendiz"]["id"], self.aprendiz.id)
+
+    def test_alterada_o_expirada_se_rechaza_sin_consultas(self):
+        credencial, expira = emitir(self.aprendiz)
+        verificar(credencial)  # carga la lista de revocación
+        alterada = credencial.replace(f".{self.aprendiz.id}.", f".{self.guarda.id}.")
+        with override_settings(QR_REVOCACION_TTL=60), self.assertNumQueries(1):
+            verificar(credencial)
+            for mala, motivo in ((alterada, "firma"), ("S1.k1.x", "formato"), ("S1.k9.1.a.0.0.xx", "firma")):
+                with self.assertRaisesMessage(CredencialInvalida, motivo):
+                    verificar(mala)
+            with self.assertRaisesMessage(CredencialInvalida, "expirada"):
+                verificar(credencial, ahora=expira + 1)
+
+        resp = self.validar(alterada)
+        self.assertEqual((resp.status_code, resp.data["permitido"]), (403, False))
+
+    def test_revocar_y_bloquear(self):
+        credencial = self.credencial()
+        self.c.force_authenticate(self.admin)
+        self.assertEqual(self.c.post(f"/api/usuarios/{self.aprendiz.id}/revocar_qr/").status_code, 200)
+        self.assertEqual(self.validar(credencial).data["motivo"], "Credencial revocada.")
+
+        nueva = self.credencial()
+        self.assertEqual(self.validar(nueva).status_code, 200)
+        self.c.force_authenticate(self.admin)
+        self.c.patch(f"/api/usuarios/{self.aprendiz.id}/", {"estado": Usuario.Estado.BLOQUEADO}, format="json")
+        self.assertEqual(self.validar(nueva).status_code, 403)
+
+    def test_rotacion_de_claves(self):
+        vieja = self.credencial()
+        with override_settings(QR_CLAVES={"k1": "secreto-1", "k2": "secreto-2"}, QR_CLAVE_ACTIVA="k2"):
+            self.assertTrue(self.credencial().startswith("S1.k2."))
+            self.assertEqual(self.validar(vieja).status_code, 200)
+            self.c.force_authenticate(self.guarda)
+            self.assertEqual(self.c.get("/api/credenciales/claves/").data["activa"], "k2")
+        with override_settings(QR_CLAVES={"k2": "secreto-2"}, QR_CLAVE_ACTIVA="k2"):
+            self.assertEqual(self.validar(vieja).data["motivo"], "Credencial con firma inválida.")
+
+    def test_exigir_firma(self):
+        self.c.force_authenticate(self.guarda)
+        with override_settings(QR_EXIGIR_FIRMA=True):
+            resp = self.c.post("/api/accesos/validar_documento/", {"documento": "111"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.c.post("/api/accesos/validar_documento/", {"documento": "111"}, format="json")
+        self.assertEqual(resp.status_code, 200)
+
+
+class PorteriaAsyncTests(TestCase):
+    """Las vistas async de accesos/porteria.py responden igual que las de AccesoViewSet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.sin_turno = Usuario.objects.create(username="guarda2", rol=Usuario.Rol.GUARDA)
+        cls.aprendiz = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="111")
+        cls.otro = Usuario.objects.create(username="otro", rol=Usuario.Rol.APRENDIZ, documento="222")
+        cls.equipo = Equipo.objects.create(propietario=cls.aprendiz, serial="S1", estado=Equipo.Estado.APROBADO)
+        cls.ajeno = Equipo.objects.create(propietario=cls.otro, serial="S2", estado=Equipo.Estado.APROBADO)
+        Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    def setUp(self):
+        cache.clear()
+
+    def _sync(self, metodo, accion, usuario, datos):
+        c = APIClient()
+        if usuario:
+            c.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(usuario).access_token}")
+        resp = getattr(c, metodo)(f"/api/accesos/{accion}/", datos, format="json")
+        return resp.status_code, json.loads(resp.content)
+
+    def _async(self, metodo, accion, usuario, datos):
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(usuario).access_token}"} if usuario else {}
+        if metodo == "post":
+            request = AsyncRequestFactory().post("/", json.dumps(datos), content_type="application/json", headers=headers)
+        else:
+            request = AsyncRequestFactory().get("/", datos, headers=headers)
+        resp = async_to_sync(getattr(porteria, accion))(request)
+        return resp.status_code, json.loads(resp.content)
+
+    def assertIguales(self, metodo, accion, usuario, datos):
+        resultados = []
+        for llamar in (self._sync, self._async):
+            with transaction.atomic():
+                codigo, cuerpo = llamar(metodo, accion, usuario, datos)
+                transaction.set_rollback(True)
+            for campo in ("id", "fecha"):
+                (cuerpo.get("acceso") or {}).pop(campo, None)
+            resultados.append((codigo, cuerpo))
+        self.assertEqual(resultados[0], resultados[1])
+        return resultados[0]
+
+    def test_mismas_respuestas(self):
+        equipo, ajeno = self.equipo.id, self.ajeno.id
+        casos = [
+            ("post", "validar_documento", self.guarda, {"documento": "111"}, 200),
+            ("post", "validar_documento", self.guarda, {"documento": "999"}, 404),
+            ("post", "validar_documento", self.guarda, {}, 400),
+            ("post", "validar_documento", self.sin_turno, {"documento": "111"}, 400),
+            ("post", "validar_documento", self.aprendiz, {"documento": "111"}, 403),
+            ("post", "validar_documento", None, {"documento": "111"}, 401),
+            ("get", "validar_documento", self.guarda, {}, 405),
+            ("post", "registrar_por_documento", self.guarda, {"documento": "111", "tipo": "ingreso", "equipos": [equipo]}, 201),
+            ("post", "registrar_por_documento", self.guarda, {"documento": "111", "tipo": "salida"}, 400),
+            ("post", "registrar_por_documento", self.guarda, {"documento": "111", "tipo": "ingreso", "equipos": [ajeno]}, 400),
+            ("post", "registrar_por_documento", self.guarda, {"documento": "111", "tipo": "x"}, 400),
+            ("get", "stats", self.guarda, {}, 200),
+            ("get", "stats", self.sin_turno, {}, 400),
+        ]
+        for metodo, accion, usuario, datos, esperado in casos:
+            with self.subTest(accion=accion, datos=datos, usuario=usuario and usuario.username):
+                self.assertEqual(self.assertIguales(metodo, accion, usuario, datos)[0], esperado)
+
+    def test_mismas_respuestas_con_ingreso_previo(self):
+        acceso = Acceso.objects.create(usuario=self.aprendiz, tipo=Acceso.Tipo.INGRESO, sede=Turno.Sede.CEGAFE)
+        acceso.equipos.set([self.equipo])
+        Usuario.objects.filter(pk=self.otro.pk).update(estado=Usuario.Estado.BLOQUEADO)
+        equipo = self.equipo.id
+        casos = [
+            ("validar_documento", {"documento": "111"}, 200),
+            ("validar_documento", {"documento": "222"}, 403),
+            ("registrar_por_documento", {"documento": "111", "tipo": "salida", "equipos": [equipo]}, 201),
+            ("registrar_por_documento", {"documento": "111", "tipo": "salida"}, 400),
+            ("registrar_por_documento", {"documento": "111", "tipo": "ingreso"}, 400),
+            ("registrar_por_documento", {"documento": "222", "tipo": "ingreso", "equipos": [equipo]}, 400),
+            ("registrar_por_documento", {"documento": "111", "tipo": "salida", "equipos": [equipo, 999999]}, 400),
+        ]
+        for accion, datos, esperado in casos:
+            with self.subTest(accion=accion, datos=datos):
+                self.assertEqual(self.assertIguales("post", accion, self.guarda, datos)[0], esperado)
+
+    def test_solo_la_escritura_es_sync(self):
+        # Las lecturas van por el ORM async; a sync_to_async solo llegan la
+        # autenticación, la caché de equipos y las escrituras
+        llamadas = []
+        original = porteria.sync_to_async
+
+        def espiar(funcion, *args, **kwargs):
+            llamadas.append(funcion.__name__)
+            return original(funcion, *args, **kwargs)
+
+        with mock.patch.object(porteria, "sync_to_async", espiar):
+            self._async("post", "registrar_por_documento", self.guarda, {"documento": "111", "tipo": "ingreso", "equipos": [self.equipo.id]})
+            self.assertEqual(llamadas, ["_autorizar", "guardar_acceso"])
+            llamadas.clear()
+            self._async("post", "validar_documento", self.guarda, {"documento": "999"})
+            self.assertEqual(llamadas, ["_autorizar", "registrar_rechazo"])
+            llamadas.clear()
+            self._async("post", "validar_documento", self.guarda, {"documento": "111"})
+            self.assertEqual(llamadas, ["_autorizar", "equipos_aprobados"])
+
+    def test_registro_y_stats(self):
+        token = {"headers": {"Authorization": f"Bearer {RefreshToken.for_user(self.guarda).access_token}"}}
+        f = AsyncRequestFactory()
+        datos = json.dumps({"documento": "111", "tipo": "ingreso", "equipos": [self.equipo.id]})
+        resp = async_to_sync(porteria.registrar_por_documento)(f.post("/", datos, content_type="application/json", **token))
+        self.assertEqual(resp.status_code, 201)
+        self.assertTrue(Presencia.objects.filter(usuario=self.aprendiz).exists())
+        self.assertEqual(Evento.objects.filter(tipo=Evento.Tipo.ACCESO_CREADO).count(), 1)
+
+        resp = async_to_sync(porteria.stats)(f.get("/", **token))
+        self.assertEqual(json.loads(resp.content)["stats"], {"ingresos": 1, "salidas": 0, "total": 1})
+
+    def test_middleware_async(self):
+        mw = ServerTimingMiddleware(porteria.validar_documento)
+        request = AsyncRequestFactory().post(
+            "/", json.dumps({"documento": "111"}), content_type="application/json",
+            headers={"Authorization": f"Bearer {RefreshToken.for_user(self.guarda).access_token}"},
+        )
+        resp = async_to_sync(mw)(request)
+        self.assertEqual(resp.status_code, 200)
+        db, *resto = resp["Server-Timing"].split(", ")
+        self.assertNotIn('desc="0 consultas"', db)
+        self.assertIn("vista", [p.split(";")[0] for p in resto])
+        self.assertEqual(request._medicion.sede, Turno.Sede.CEGAFE)
+
+
+class ReplicaTests(TransactionTestCase):
+    # Transaccional: la réplica (MIRROR de default en tests) es otra conexión y
+    # no vería datos sin confirmar
+    databases = "__all__"
+
+    def setUp(self):
+        self.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        self.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        self.aprendiz = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="111")
+        Turno.objects.create(guarda=self.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+        cache.clear()
+        self.c = APIClient()
+
+    def consultas_replica(self, metodo, url, usuario, datos=None):
+        self.c.force_authenticate(usuario)
+        with CaptureQueriesContext(connections[settings.DB_LECTURA]) as ctx:
+            resp = getattr(self.c, metodo)(url, datos, format="json")
+            if resp.streaming:
+                b"".join(resp.streaming_content)
+        self.assertLess(resp.status_code, 300)
+        return len(ctx.captured_queries)
+
+    def test_escribir_pega_a_la_primaria(self):
+        self.c.force_authenticate(self.admin)
+        self.c.get("/api/usuarios/")
+        self.assertFalse(pegado_a_primaria(self.admin.id))
+        resp = self.c.post("/api/equipos/", {"propietario": self.aprendiz.id, "serial": "S1", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertTrue(pegado_a_primaria(self.admin.id))
+        self.assertFalse(pegado_a_primaria(self.guarda.id))
+
+    @skipUnless(getattr(settings, "DB_LECTURA", None), "sin réplica configurada (DJANGO_DB_REPLICA_HOST)")
+    def test_listados_a_la_replica_y_escaneos_a_la_primaria(self):
+        self.assertGreater(self.consultas_replica("get", "/api/accesos/", self.admin), 0)
+        self.assertGreater(self.consultas_replica("get", "/api/equipos/", self.admin), 0)
+        self.assertGreater(self.consultas_replica("get", "/api/sedes/CEGAFE/dentro/export/", self.admin), 0)
+        # delta sync, escaneos y la bitácora: primaria
+        self.assertEqual(self.consultas_replica("get", "/api/equipos/", self.admin, {"updated_since": "2020-01-01T00:00:00Z"}), 0)
+        self.assertEqual(self.consultas_replica("post", "/api/accesos/validar_documento/", self.guarda, {"documento": "111"}), 0)
+        self.assertEqual(self.consultas_replica("get", "/api/accesos/stats/", self.guarda), 0)
+
+    @skipUnless(getattr(settings, "DB_LECTURA", None), "sin réplica configurada (DJANGO_DB_REPLICA_HOST)")
+    def test_lee_sus_escrituras(self):
+        self.c.force_authenticate(self.admin)
+        self.c.post("/api/equipos/", {"propietario": self.aprendiz.id, "serial": "S1", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(self.consultas_replica("get", "/api/equipos/", self.admin), 0)
+        # los demás siguen leyendo de la réplica
+        self.assertGreater(self.consultas_replica("get", "/api/accesos/", self.guarda), 0)
+
+
+@override_settings(CACHE_EQUIPOS_VERIFICAR=0)
+class CacheEquiposTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.ana = Usuario.objects.create(username="ana", rol=Usuario.Rol.APRENDIZ, documento="111")
+        cls.beto = Usuario.objects.create(username="beto", rol=Usuario.Rol.APRENDIZ, documento="222")
+        cls.equipo = Equipo.objects.create(propietario=cls.ana, serial="S1", marca="Lenovo", modelo="T14", estado=Equipo.Estado.APROBADO)
+        Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    def setUp(self):
+        cache.clear()
+        self.c = APIClient()
+        self.c.force_authenticate(self.admin)
+
+    def seriales(self, aprendiz):
+        # Sin consultas = salió del cache
+        with CaptureQueriesContext(connection) as ctx:
+            datos = equipos_aprobados(aprendiz.id)
+        return [e["serial"] for e in datos], len(ctx)
+
+    def test_acierto_sin_consultas(self):
+        self.assertEqual(self.seriales(self.ana), (["S1"], 1))
+        self.assertEqual(self.seriales(self.ana), (["S1"], 0))
+
+        self.c.force_authenticate(self.guarda)
+        resp = self.c.post("/api/accesos/validar_documento/", {"documento": "111"}, format="json")
+        self.assertEqual([e["serial"] for e in resp.data["equipos"]], ["S1"])
+
+    def test_invalida_al_revisar_y_borrar(self):
+        pendiente = Equipo.objects.create(propietario=self.ana, serial="S2", estado=Equipo.Estado.PENDIENTE)
+        self.seriales(self.ana)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.patch(f"/api/equipos/{pendiente.id}/revisar/", {"estado": "aprobado"})
+        self.assertEqual(self.seriales(self.ana), (["S2", "S1"], 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.delete(f"/api/equipos/{pendiente.id}/")
+        self.assertEqual(self.seriales(self.ana), (["S1"], 1))
+
+    def test_invalida_revisar_lote(self):
+        pendiente = Equipo.objects.create(propietario=self.beto, serial="S3", estado=Equipo.Estado.PENDIENTE)
+        self.assertEqual(self.seriales(self.beto), ([], 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.c.post("/api/equipos/revisar_lote/", {"estado": "aprobado", "ids": [pendiente.id]}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.seriales(self.beto), (["S3"], 1))
+
+    def test_cambio_de_propietario_invalida_ambos(self):
+        self.seriales(self.ana)
+        self.seriales(self.beto)
+
+        equipo = Equipo.objects.get(pk=self.equipo.pk)
+        equipo.propietario = self.beto
+        with self.captureOnCommitCallbacks(execute=True):
+            equipo.save()
+        self.assertEqual(self.seriales(self.ana), ([], 1))
+        self.assertEqual(self.seriales(self.beto), (["S1"], 1))
+
+    def test_pendiente_no_invalida(self):
+        self.seriales(self.ana)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Equipo.objects.create(propietario=self.ana, serial="S4", estado=Equipo.Estado.PENDIENTE)
+        # solo el tablero, que cuenta los pendientes
+        self.assertEqual(callbacks, [tablero.invalidar])
+        self.assertEqual(self.seriales(self.ana), (["S1"], 0))
+
+    def test_verificacion_cuenta_stale(self):
+        def contador(resultado):
+            # contadores del proceso: se comparan antes y después
+            return metricas._contadores.get(("sadi_cache_equipos_total", (("resultado", resultado),)), 0)
+
+        self.seriales(self.ana)
+        # UPDATE masivo sin invalidar: el cache queda viejo
+        Equipo.objects.filter(pk=self.equipo.pk).update(estado=Equipo.Estado.RECHAZADO)
+
+        antes = contador("stale"), contador("hit")
+        with override_settings(METRICS_ENABLED=True, CACHE_EQUIPOS_VERIFICAR=1):
+            self.assertEqual(self.seriales(self.ana)[0], [])
+            self.assertEqual(self.seriales(self.ana)[0], [])
+        self.assertEqual((contador("stale"), contador("hit")), (antes[0] + 1, antes[1] + 1))
+
+
+@override_settings(ALERTAS_RAFAGA_UMBRAL=3, ALERTAS_EQUIPO_HORAS=12)
+class AlertasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.bloq = Usuario.objects.create(
+            username="bloq", rol=Usuario.Rol.APRENDIZ, documento="555", estado=Usuario.Estado.BLOQUEADO
+        )
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="111")
+        cls.equipo = Equipo.objects.create(propietario=cls.apr, serial="S1", estado=Equipo.Estado.APROBADO)
+        cls.turno = Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+
+    def setUp(self):
+        cache.clear()
+        self.c = APIClient()
+        self.c.force_authenticate(self.guarda)
+
+    def escanear(self, documento):
+        return self.c.post("/api/accesos/validar_documento/", {"documento": documento}, format="json")
+
+    def alertas(self, prefijo):
+        return list(Notificacion.objects.filter(clave__startswith=prefijo))
+
+    def test_bloqueado_una_alerta_por_dia(self):
+        self.assertEqual(self.escanear("555").status_code, 403)
+        self.escanear("555")
+        self.assertEqual(procesar(), {"eventos": 2, "alertas": 1})
+
+        [alerta] = self.alertas("bloqueado:")
+        self.assertEqual((alerta.tipo, alerta.rol_objetivo), (Notificacion.Tipo.URGENT, Usuario.Rol.ADMIN))
+        self.assertEqual(alerta.data["usuario_id"], self.bloq.id)
+
+        # Reprocesar desde cero no duplica
+        EstadoAlertas.objects.update(cursor=0, reglas={})
+        self.assertEqual(procesar()["alertas"], 0)
+        self.assertEqual(procesar()["eventos"], 0)
+
+    def test_rafaga_de_rechazos(self):
+        self.escanear("999")
+        self.escanear("998")
+        self.assertEqual(procesar()["alertas"], 0)
+        self.escanear("997")
+        self.escanear("996")
+        # El estado de la regla sobrevive entre pasadas: el tercero dispara, el cuarto es la misma alerta
+        self.assertEqual(procesar(), {"eventos": 2, "alertas": 1})
+        [alerta] = self.alertas("rafaga:CEGAFE:")
+        self.assertEqual(alerta.data["sede"], "CEGAFE")
+
+    def test_equipos_dentro_y_turno_excedido(self):
+        resp = self.c.post(
+            "/api/accesos/registrar_por_documento/",
+            {"documento": "111", "tipo": "ingreso", "equipos": [self.equipo.id]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 201)
+        ahora = timezone.now()
+
+        self.assertEqual(procesar(ahora=ahora + timedelta(hours=1))["alertas"], 0)
+        self.assertEqual(procesar(ahora=ahora + timedelta(days=1, hours=1))["alertas"], 2)
+        self.assertEqual(procesar(ahora=ahora + timedelta(days=1, hours=2))["alertas"], 0)
+
+        [dentro] = self.alertas("equipos_dentro:")
+        self.assertEqual((dentro.data["usuario_id"], dentro.data["equipos"]), (self.apr.id, 1))
+        [turno] = self.alertas("turno_excedido:")
+        self.assertEqual(turno.data["turno_id"], self.turno.id)
+
+    def test_alertas_en_lote(self):
+        for documento in ("555", "999", "998", "997"):
+            self.escanear(documento)
+        # estado + eventos + claves existentes + un INSERT + cursor, y las reglas de tiempo
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(procesar()["alertas"], 2)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT") and '"accesos_notificacion"' in q["sql"]]
+        self.assertEqual(len(inserts), 1)
+
+
+# Acciones de réplica: en TestCase los datos sin confirmar solo están en la primaria
+@override_settings(DB_LECTURA=None)
+class VisitasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="111")
+        cls.equipo = Equipo.objects.create(propietario=cls.apr, serial="S1", marca="Lenovo", modelo="T14", estado=Equipo.Estado.APROBADO)
+
+        # lunes 6 y martes 7 (con equipo) con salida; jueves 9 en curso
+        base = datetime(2026, 10, 5, tzinfo=dt_timezone.utc)
+        cls.accesos = []
+        for dia, hora, tipo in ((1, 8, "ingreso"), (1, 12, "salida"), (2, 8, "ingreso"), (2, 10, "salida"), (4, 9, "ingreso")):
+            a = Acceso.objects.create(usuario=cls.apr, tipo=tipo, sede="CEGAFE")
+            # fecha es auto_now_add: se fija después
+            Acceso.objects.filter(pk=a.pk).update(fecha=base + timedelta(days=dia, hours=hora))
+            cls.accesos.append(a)
+        cls.accesos[2].equipos.add(cls.equipo)
+
+    def setUp(self):
+        self.c = APIClient()
+        self.c.force_authenticate(self.apr)
+
+    def test_empareja_y_pagina(self):
+        resp = self.c.get("/api/accesos/visitas/", {"limit": 1})
+        [en_curso] = resp.data["visitas"]
+        self.assertTrue(en_curso["en_curso"])
+        self.assertIsNone(en_curso["salida"])
+
+        vistas = []
+        siguiente = resp.data["siguiente"]
+        while siguiente:
+            # limit=1: cada página empieza justo después de un ingreso y debe encontrar su salida
+            resp = self.c.get("/api/accesos/visitas/", {"limit": 1, "cursor": siguiente})
+            vistas += resp.data["visitas"]
+            siguiente = resp.data["siguiente"]
+
+        self.assertEqual([v["ingreso_id"] for v in vistas], [self.accesos[2].id, self.accesos[0].id])
+        self.assertEqual([v["salida_id"] for v in vistas], [self.accesos[3].id, self.accesos[1].id])
+        self.assertEqual([v["duracion_segundos"] for v in vistas], [7200, 14400])
+        self.assertEqual([e["serial"] for e in vistas[0]["equipos"]], ["S1"])
+        self.assertEqual(vistas[1]["equipos"], [])
+
+    def test_resumen_por_dia_y_semana(self):
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"por": "dia", "desde": "2026-10-05", "hasta": "2026-10-11"})
+        self.assertEqual(
+            [(str(p["inicio"]), p["visitas"], p["segundos"], p["sin_salida"]) for p in resp.data["periodos"]],
+            [("2026-10-06", 1, 14400, 0), ("2026-10-07", 1, 7200, 0), ("2026-10-09", 1, 0, 1)],
+        )
+
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"desde": "2026-10-01", "hasta": "2026-10-31"})
+        self.assertEqual([(str(p["inicio"]), p["visitas"], p["segundos"]) for p in resp.data["periodos"]], [("2026-10-05", 3, 21600)])
+
+        # rango de un solo día
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"por": "dia", "desde": "2026-10-07", "hasta": "2026-10-07"})
+        self.assertEqual([p["segundos"] for p in resp.data["periodos"]], [7200])
+
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"desde": "2025-01-01", "hasta": "2026-10-31"})
+        self.assertEqual((resp.status_code, resp.data), (400, {"permitido": False, "motivo": "El rango debe tener entre 1 y 366 días."}))
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"hasta": "2026-10-31"})
+        self.assertEqual(resp.data["desde"], date(2026, 8, 8))
+        resp = self.c.get("/api/accesos/visitas_resumen/", {"desde": "05/10/2026"})
+        self.assertEqual((resp.status_code, resp.data), (400, {"permitido": False, "motivo": "Fechas con formato AAAA-MM-DD."}))
+
+    def test_permisos(self):
+        self.c.force_authenticate(self.admin)
+        self.assertEqual(self.c.get("/api/accesos/visitas/").status_code, 400)
+        resp = self.c.get("/api/accesos/visitas/", {"usuario": self.apr.id})
+        self.assertEqual(len(resp.data["visitas"]), 3)
+
+        self.c.force_authenticate(self.guarda)
+        self.assertEqual(self.c.get("/api/accesos/visitas/", {"usuario": self.apr.id}).status_code, 403)
+        self.assertEqual(self.c.get("/api/accesos/visitas/", {"cursor": "x"}).status_code, 403)
+
+
+@override_settings(DB_LECTURA=None)
+class AsistenciaTests(TestCase):
+    # lunes 6 de octubre de 2025, UTC
+    BASE = datetime(2025, 10, 6, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.apr1 = Usuario.objects.create(
+            username="apr1", rol=Usuario.Rol.APRENDIZ, documento="1", programa_formacion="ADSO", sede_principal="CEGAFE"
+        )
+        cls.apr2 = Usuario.objects.create(
+            username="apr2", rol=Usuario.Rol.APRENDIZ, documento="2", programa_formacion="ADSO", sede_principal="ITEDRIS"
+        )
+        cls.apr3 = Usuario.objects.create(
+            username="apr3", rol=Usuario.Rol.APRENDIZ, documento="3", programa_formacion="COCINA", sede_principal="CEGAFE"
+        )
+
+    def setUp(self):
+        self.c = APIClient()
+        self.c.force_authenticate(self.admin)
+
+    def _acceso(self, usuario, tipo, dia, hora):
+        a = Acceso.objects.create(usuario=usuario, tipo=tipo, sede="CEGAFE")
+        # fecha es auto_now_add: se fija después
+        Acceso.objects.filter(pk=a.pk).update(fecha=self.BASE + timedelta(days=dia, hours=hora))
+        registrar_evento(Evento.Tipo.ACCESO_CREADO, a.id, sede=a.sede, usuario_id=usuario.id, tipo_acceso=tipo)
+        return a
+
+    def _filas(self):
+        return sorted(AsistenciaDiaria.objects.values_list("usuario__username", "dia", "segundos", "visitas"))
+
+    def _cargar(self):
+        self._acceso(self.apr1, "ingreso", 0, 8)
+        self._acceso(self.apr1, "salida", 0, 12)
+        self._acceso(self.apr1, "ingreso", 0, 22)
+        self._acceso(self.apr2, "ingreso", 1, 8)
+        self._acceso(self.apr2, "salida", 1, 11)
+        self._acceso(self.apr3, "ingreso", 2, 9)
+
+    def test_refresco_incremental_y_medianoche(self):
+        self._cargar()
+        self.assertEqual(refrescar(), 6)
+        lunes, martes, miercoles = (self.BASE.date() + timedelta(days=d) for d in range(3))
+        self.assertEqual(
+            self._filas(),
+            [("apr1", lunes, 4 * 3600, 2), ("apr2", martes, 3 * 3600, 1), ("apr3", miercoles, 0, 1)],
+        )
+        self.assertEqual(refrescar(), 0)
+
+        # la salida del martes 02:00 cierra el ingreso del lunes 22:00: dos horas a cada día
+        self._acceso(self.apr1, "salida", 1, 2)
+        self.assertEqual(refrescar(), 1)
+        esperado = [
+            ("apr1", lunes, 6 * 3600, 2),
+            ("apr1", martes, 2 * 3600, 0),
+            ("apr2", martes, 3 * 3600, 1),
+            ("apr3", miercoles, 0, 1),
+        ]
+        self.assertEqual(self._filas(), esperado)
+
+        AsistenciaDiaria.objects.all().delete()
+        self.assertEqual(reconstruir(), 3)
+        self.assertEqual(self._filas(), esperado)
+        self.assertEqual(refrescar(), 0)
+
+    def test_sigue_el_orden_de_la_bitacora(self):
+        # Un acceso con id menor cuyo evento se confirma después (transacción más lenta) no se pierde
+        lento = Acceso.objects.create(usuario=self.apr2, tipo="ingreso", sede="CEGAFE")
+        Acceso.objects.filter(pk=lento.pk).update(fecha=self.BASE + timedelta(hours=9))
+        self._acceso(self.apr1, "ingreso", 0, 8)
+        self.assertEqual(refrescar(), 1)
+
+        registrar_evento(Evento.Tipo.ACCESO_CREADO, lento.id, sede="CEGAFE", usuario_id=self.apr2.id)
+        self.assertEqual(refrescar(), 1)
+        self.assertEqual([f[0] for f in self._filas()], ["apr1", "apr2"])
+
+    def test_acceso_creado_en_el_admin(self):
+        self.admin.is_staff = self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+        resp = self.client.post(
+            "/admin/accesos/acceso/add/", {"usuario": self.apr3.id, "tipo": "ingreso", "sede": "CEGAFE"}
+        )
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(refrescar(), 1)
+        self.assertEqual([f[:2] for f in self._filas()], [("apr3", timezone.localdate())])
+
+    def test_reportes(self):
+        self._cargar()
+        self._acceso(self.apr1, "salida", 1, 2)
+        refrescar()
+        rango = {"desde": "2025-10-01", "hasta": "2025-10-31"}
+
+        resp = self.c.get("/api/asistencia/", rango)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [(str(f["semana"]), f["documento"], f["horas"], f["dias"], f["visitas"]) for f in resp.data["results"]],
+            [("2025-10-06", "1", 8.0, 2, 2), ("2025-10-06", "2", 3.0, 1, 1), ("2025-10-06", "3", 0.0, 1, 1)],
+        )
+
+        resp = self.c.get("/api/asistencia/", {**rango, "programa": "ADSO", "sede": "ITEDRIS"})
+        self.assertEqual([f["documento"] for f in resp.data["results"]], ["2"])
+
+        resp = self.c.get("/api/asistencia/programas/", rango)
+        self.assertEqual(
+            [(f["programa"], f["sede"], f["aprendices"], f["horas"], f["horas_por_aprendiz"]) for f in resp.data["resultados"]],
+            [("ADSO", "CEGAFE", 1, 8.0, 8.0), ("ADSO", "ITEDRIS", 1, 3.0, 3.0), ("COCINA", "CEGAFE", 1, 0.0, 0.0)],
+        )
+
+        resp = self.c.get("/api/asistencia/programas/", {**rango, "sede": "CEGAFE", "desde": "2025-10-07"})
+        self.assertEqual([(f["programa"], f["horas"]) for f in resp.data["resultados"]], [("ADSO", 2.0), ("COCINA", 0.0)])
+
+        self.assertEqual(self.c.get("/api/asistencia/", {"desde": "2024-01-01", "hasta": "2025-10-31"}).status_code, 400)
+
+        self.c.force_authenticate(self.apr1)
+        self.assertEqual(self.c.get("/api/asistencia/", rango).status_code, 403)
+
+
+class TableroTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="1")
+        Usuario.objects.create(username="apr2", rol=Usuario.Rol.APRENDIZ, documento="2", estado=Usuario.Estado.BLOQUEADO)
+        cls.turno = Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+        Equipo.objects.create(propietario=cls.apr, serial="P1", marca="HP", modelo="X")
+        Acceso.objects.create(usuario=cls.apr, tipo=Acceso.Tipo.INGRESO, sede="CEGAFE", turno=cls.turno)
+
+    def setUp(self):
+        cache.clear()
+        self.c = APIClient()
+        self.c.force_authenticate(self.admin)
+
+    def test_resumen(self):
+        datos = self.c.get("/api/admin/resumen/").data
+        self.assertEqual(datos["usuarios"], {"admin": {"activo": 1}, "guarda": {"activo": 1}, "aprendiz": {"activo": 1, "bloqueado": 1}})
+        self.assertEqual(datos["equipos_pendientes"], 1)
+        self.assertEqual(datos["turnos_activos"], {"CEGAFE": 1})
+        self.assertEqual(datos["accesos_hoy"], {"CEGAFE": {"ingreso": 1, "salida": 0}})
+        self.assertEqual(datos["dentro"], {"CEGAFE": 1})
+        self.assertEqual(datos["dentro_total"], 1)
+
+        # cacheado
+        with self.assertNumQueries(0):
+            self.assertEqual(tablero.resumen(), datos)
+
+    def test_invalidacion(self):
+        tablero.resumen()
+        # los accesos y el login no invalidan
+        Acceso.objects.create(usuario=self.apr, tipo=Acceso.Tipo.SALIDA, sede="CEGAFE", turno=self.turno)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apr.last_login = timezone.now()
+            self.apr.save(update_fields=["last_login"])
+        self.assertIsNotNone(cache.get(tablero.CLAVE_VIGENTE))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipo.objects.create(propietario=self.apr, serial="P2", marca="HP", modelo="X")
+        self.assertEqual(tablero.resumen()["equipos_pendientes"], 2)
+
+        self.c.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.c.post("/api/equipos/revisar_lote/", {"estado": "aprobado", "filtro_marca": "HP"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(tablero.resumen()["equipos_pendientes"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(_cerrar_turno(self.turno))
+        self.assertEqual(tablero.resumen()["turnos_activos"], {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.filter(username="apr2").get().delete()
+        self.assertEqual(tablero.resumen()["usuarios"]["aprendiz"], {"activo": 1})
+
+    def test_sin_estampida(self):
+        anterior = tablero.resumen()
+        Equipo.objects.create(propietario=self.apr, serial="P2", marca="HP", modelo="X")
+        tablero.invalidar()
+
+        # Otro proceso está recalculando: se responde el resumen anterior sin consultar
+        cache.add(tablero.CLAVE_CANDADO, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(tablero.resumen(), anterior)
+
+        cache.delete(tablero.CLAVE_CANDADO)
+        self.assertEqual(tablero.resumen()["equipos_pendientes"], 2)
+        self.assertIsNone(cache.get(tablero.CLAVE_CANDADO))
+        with self.assertNumQueries(0):
+            tablero.resumen()
+
+    def test_permisos(self):
+        self.c.force_authenticate(self.guarda)
+        self.assertEqual(self.c.get("/api/admin/resumen/").status_code, 403)
+        self.c.force_authenticate(None)
+        self.assertEqual(self.c.get("/api/admin/resumen/").status_code, 401)
+
+
+@override_settings(DB_LECTURA=None)
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="root", rol=Usuario.Rol.ADMIN, is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def crear(self, n):
+        guarda = Usuario.objects.create(username=f"g{n}", rol=Usuario.Rol.GUARDA)
+        turno = Turno.objects.create(guarda=guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA)
+        aprendices = Usuario.objects.bulk_create(
+            [Usuario(username=f"a{n}-{i}", rol=Usuario.Rol.APRENDIZ, documento=f"{n}-{i}") for i in range(n)]
+        )
+        Acceso.objects.bulk_create(
+            [Acceso(usuario=a, tipo=Acceso.Tipo.INGRESO, sede="CEGAFE", turno=turno, registrado_por=guarda) for a in aprendices]
+        )
+
+    def test_changelist_sin_n_mas_1(self):
+        conteos = []
+        for n in (1, 10):
+            self.crear(n)
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get("/admin/accesos/acceso/")
+            self.assertEqual(resp.status_code, 200)
+            conteos.append(len(ctx))
+        self.assertEqual(conteos[0], conteos[1])
+
+    def test_busqueda_indexable(self):
+        self.crear(3)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/admin/accesos/acceso/", {"q": "3-1"})
+        self.assertEqual(resp.context["cl"].result_count, 1)
+        sql = "\n".join(q["sql"] for q in ctx.captured_queries)
+        # documento exacto / username por prefijo, no icontains
+        self.assertNotIn("%3-1%", sql)
+
+        # username sin distinguir mayúsculas, como el índice UPPER(username) de 0010
+        resp = self.client.get("/admin/accesos/acceso/", {"q": "A3-"})
+        self.assertEqual(resp.context["cl"].result_count, 3)
+
+    def test_exportar_csv(self):
+        self.crear(3)
+        resp = self.client.post(
+            "/admin/accesos/acceso/",
+            {"action": "exportar_csv", "select_across": "1", "index": "0", "_selected_action": list(Acceso.objects.values_list("pk", flat=True))},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        lineas = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], "id,fecha,tipo,sede,usuario__documento,usuario__username,registrado_por__username,turno_id")
+        self.assertEqual(len(lineas), 4)
+        self.assertIn(",ingreso,CEGAFE,3-0,a3-0,g3,", lineas[1])
+
+
+@override_settings(DB_LECTURA=None)
+class TurnoListadoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA, first_name="Ana", last_name="Ruiz", documento="9")
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="1")
+        ahora = timezone.now()
+        cls.cerrado = Turno.objects.create(
+            guarda=cls.guarda, sede=Turno.Sede.CEGAFE, jornada=Turno.Jornada.MANANA,
+            inicio=ahora - timedelta(hours=10), fin=ahora - timedelta(hours=4), activo=False,
+        )
+        cls.activo = Turno.objects.create(guarda=cls.guarda, sede=Turno.Sede.ITEDRIS, jornada=Turno.Jornada.TARDE, inicio=ahora - timedelta(hours=1))
+        for turno, tipos in ((cls.cerrado, ("ingreso", "salida", "ingreso")), (cls.activo, ("salida",))):
+            Acceso.objects.bulk_create([Acceso(usuario=cls.apr, tipo=t, sede=turno.sede, turno=turno) for t in tipos])
+
+    def test_listado_anotado(self):
+        c = APIClient()
+        c.force_authenticate(self.guarda)
+        filas = {t["id"]: t for t in c.get("/api/turnos/").data["results"]}
+
+        cerrado = filas[self.cerrado.id]
+        self.assertEqual((cerrado["ingresos"], cerrado["salidas"]), (2, 1))
+        self.assertEqual(cerrado["duracion_segundos"], 6 * 3600)
+        self.assertEqual((cerrado["guarda_nombre"], cerrado["guarda_documento"]), ("Ana Ruiz", "9"))
+
+        activo = filas[self.activo.id]
+        self.assertEqual((activo["ingresos"], activo["salidas"]), (0, 1))
+        self.assertGreaterEqual(activo["duracion_segundos"], 3600)
+
+        c.force_authenticate(self.admin)
+        [solo] = c.get("/api/turnos/", {"sede": "ITEDRIS", "activo": "true"}).data["results"]
+        self.assertEqual(solo["id"], self.activo.id)
+        self.assertEqual(c.get(f"/api/turnos/{self.cerrado.id}/").data["ingresos"], 2)
+
+
+@override_settings(DB_LECTURA=None)
+class RelacionesEnLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="1")
+        cls.otro = Usuario.objects.create(username="otro", rol=Usuario.Rol.APRENDIZ, documento="2")
+        cls.equipos = Equipo.objects.bulk_create(
+            [Equipo(propietario=cls.apr, serial=f"S{i}", marca="HP", modelo="X", estado=Equipo.Estado.APROBADO) for i in range(10)]
+        )
+        cls.ajeno = Equipo.objects.create(propietario=cls.otro, serial="AJENO", marca="HP", modelo="X")
+
+    def serializer(self, user, data):
+        request = APIRequestFactory().post("/api/accesos/")
+        request.user = user
+        return AccesoSerializer(data=data, context={"request": request})
+
+    def test_diez_equipos_una_consulta(self):
+        ids = [e.id for e in reversed(self.equipos)]
+        s = self.serializer(self.guarda, {"usuario": self.apr.id, "tipo": "ingreso", "equipos": ids})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(s.is_valid(), s.errors)
+        self.assertEqual([e.id for e in s.validated_data["equipos"]], ids)
+        self.assertEqual(sum('FROM "accesos_equipo"' in q["sql"] for q in ctx.captured_queries), 1)
+
+    def test_alcance(self):
+        s = self.serializer(self.guarda, {"usuario": self.apr.id, "tipo": "ingreso", "equipos": [self.equipos[0].id, self.ajeno.id]})
+        self.assertFalse(s.is_valid())
+        self.assertEqual(s.errors["equipos"], [f"El equipo {self.ajeno.id} no existe o no es del aprendiz."])
+
+        s = self.serializer(self.guarda, {"usuario": self.apr.id, "tipo": "ingreso", "equipos": ["x"]})
+        self.assertFalse(s.is_valid())
+        self.assertIn("equipos", s.errors)
+
+        # el aprendiz no registra accesos: ningún equipo le resuelve
+        s = self.serializer(self.apr, {"usuario": self.apr.id, "tipo": "ingreso", "equipos": [self.equipos[0].id]})
+        self.assertFalse(s.is_valid())
+        self.assertIn("equipos", s.errors)
+
+    def test_propietario_por_rol(self):
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        resp = c.post("/api/equipos/", {"propietario": self.guarda.id, "serial": "N1", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = c.post("/api/equipos/", {"propietario": self.otro.id, "serial": "N1", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data["propietario"], self.otro.id)
+
+        # un aprendiz solo puede nombrarse a sí mismo
+        c.force_authenticate(self.apr)
+        resp = c.post("/api/equipos/", {"propietario": self.otro.id, "serial": "N2", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = c.post("/api/equipos/", {"serial": "N2", "marca": "M", "modelo": "X"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data["propietario"], self.apr.id)
+
+    def test_api_navegable_sin_desplegable(self):
+        Usuario.objects.bulk_create([Usuario(username=f"u{i}", documento=f"u{i}") for i in range(50)])
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = c.get("/api/accesos/", HTTP_ACCEPT="text/html")
+        self.assertEqual(resp.status_code, 200)
+        # el formulario no lista usuarios ni equipos
+        self.assertFalse(any('FROM "accesos_usuario"' in q["sql"] and "LIMIT 1000" in q["sql"] for q in ctx.captured_queries))
+        self.assertNotContains(resp, "<option value=\"%d\"" % self.otro.id)
+
+
+def _sin_restricciones_turno(test):
+    """
+    Permite sembrar turnos como los de antes de 0006/0007 (fin < inicio,
+    activo/fin incoherente, dos activos por guarda). Se revierte con la
+    transacción del test.
+    """
+    with connection.cursor() as c:
+        c.execute('DROP INDEX "turno_unico_activo_por_guarda"')
+        if connection.vendor == "sqlite":
+            c.execute("PRAGMA ignore_check_constraints = ON")
+            test.addCleanup(lambda: connection.cursor().execute("PRAGMA ignore_check_constraints = OFF"))
+        else:
+            for nombre in ("turno_fin_gte_inicio_or_null", "turno_activo_fin_coherente"):
+                c.execute(f'ALTER TABLE accesos_turno DROP CONSTRAINT "{nombre}"')
+
+
+class FixTurnosTests(TestCase):
+    def setUp(self):
+        _sin_restricciones_turno(self)
+        ahora = timezone.now()
+        viejo = ahora - timedelta(days=40)
+        filas = {
+            "fin_antes_inicio": ("CEGAFE", ahora - timedelta(hours=2), ahora - timedelta(hours=3), False),
+            "activo_con_fin": ("CEGAFE", ahora - timedelta(hours=2), ahora - timedelta(hours=1), True),
+            "inactivo_sin_fin": ("ITEDRIS", ahora - timedelta(hours=2), None, False),
+            "inactivo_sin_fin_viejo": ("CEGAFE", viejo, None, False),
+            "activo": ("CEGAFE", ahora - timedelta(hours=1), None, True),
+            "cerrado": ("CEGAFE", viejo, viejo + timedelta(hours=6), False),
+        }
+        self.turnos = {}
+        for nombre, (sede, inicio, fin, activo) in filas.items():
+            guarda = Usuario.objects.create(username=f"g-{nombre}", rol=Usuario.Rol.GUARDA)
+            self.turnos[nombre] = Turno.objects.create(
+                guarda=guarda, sede=sede, jornada=Turno.Jornada.MANANA, inicio=inicio, fin=fin, activo=activo
+            )
+        self.desde = (ahora - timedelta(days=7)).date().isoformat()
+
+    def correr(self, *args):
+        salida = StringIO()
+        call_command("fix_turnos", *args, stdout=salida)
+        return salida.getvalue().splitlines()
+
+    def sucios(self):
+        return {nombre: Turno.objects.filter(cond).count() for nombre, cond in REGLAS.items()}
+
+    def test_dry_run_cuenta_por_regla(self):
+        lineas = self.correr()
+        self.assertIn("Total turnos: 6", lineas)
+        self.assertIn("  fin_antes_inicio: 1", lineas)
+        self.assertIn("  activo_con_fin: 1", lineas)
+        self.assertIn("  inactivo_sin_fin: 2", lineas)
+        # sin --apply no toca nada
+        self.assertEqual(self.sucios(), {"fin_antes_inicio": 1, "activo_con_fin": 1, "inactivo_sin_fin": 2})
+
+    def test_apply_por_lotes(self):
+        lineas = self.correr("--apply", "--batch-size", "2")
+        self.assertIn("  fin_antes_inicio corregidos: 1", lineas)
+        self.assertIn("  activo_con_fin corregidos: 1", lineas)
+        self.assertIn("  inactivo_sin_fin corregidos: 2", lineas)
+        self.assertEqual(self.sucios(), {"fin_antes_inicio": 0, "activo_con_fin": 0, "inactivo_sin_fin": 0})
+
+        t = {nombre: Turno.objects.get(pk=turno.pk) for nombre, turno in self.turnos.items()}
+        self.assertEqual(t["fin_antes_inicio"].fin, t["fin_antes_inicio"].inicio)
+        self.assertEqual((t["activo_con_fin"].activo, t["activo_con_fin"].fin), (False, self.turnos["activo_con_fin"].fin))
+        self.assertGreaterEqual(t["inactivo_sin_fin"].fin, t["inactivo_sin_fin"].inicio)
+        # los limpios quedan igual
+        self.assertEqual((t["activo"].activo, t["activo"].fin), (True, None))
+        self.assertEqual(t["cerrado"].actualizado_en, self.turnos["cerrado"].actualizado_en)
+
+    def test_sede_y_since(self):
+        lineas = self.correr("--sede", "ITEDRIS", "--apply")
+        self.assertIn("Total turnos: 1", lineas)
+        self.assertIn("  inactivo_sin_fin corregidos: 1", lineas)
+        self.assertIn("  fin_antes_inicio corregidos: 0", lineas)
+        self.assertEqual(self.sucios(), {"fin_antes_inicio": 1, "activo_con_fin": 1, "inactivo_sin_fin": 1})
+
+        # el turno viejo de CEGAFE queda fuera de --since
+        lineas = self.correr("--sede", "CEGAFE", "--since", self.desde, "--apply")
+        self.assertIn("Total turnos: 3", lineas)
+        self.assertIn("  fin_antes_inicio corregidos: 1", lineas)
+        self.assertIn("  activo_con_fin corregidos: 1", lineas)
+        self.assertIn("  inactivo_sin_fin corregidos: 0", lineas)
+        self.assertEqual(self.sucios(), {"fin_antes_inicio": 0, "activo_con_fin": 0, "inactivo_sin_fin": 1})
+        self.assertIsNone(Turno.objects.get(pk=self.turnos["inactivo_sin_fin_viejo"].pk).fin)
+
+    def test_opciones_invalidas(self):
+        with self.assertRaises(CommandError):
+            self.correr("--since", "19/10/2026")
+        with self.assertRaises(CommandError):
+            self.correr("--batch-size", "0")
+
+
+class TurnoCierreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+
+    def test_iniciar_dos_veces(self):
+        c = APIClient()
+        c.force_authenticate(self.guarda)
+        datos = {"sede": "CEGAFE", "jornada": "MANANA"}
+        primero = c.post("/api/turnos/iniciar/", datos, format="json")
+        self.assertEqual(primero.status_code, 201)
+
+        segundo = c.post("/api/turnos/iniciar/", {"sede": "ITEDRIS", "jornada": "TARDE"}, format="json")
+        self.assertEqual(segundo.status_code, 400)
+        self.assertEqual(segundo.data["motivo"], "Ya tienes un turno activo.")
+        self.assertEqual(segundo.data["turno"]["id"], primero.data["turno"]["id"])
+        self.assertEqual(Turno.objects.filter(guarda=self.guarda).count(), 1)
+
+    def test_finalizar_admin_repara_inactivo_sin_fin(self):
+        _sin_restricciones_turno(self)
+        turno = Turno.objects.create(guarda=self.guarda, sede="CEGAFE", jornada="MANANA", activo=False, fin=None)
+        c = APIClient()
+        c.force_authenticate(self.admin)
+
+        resp = c.post(f"/api/turnos/{turno.id}/finalizar_admin/")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        turno.refresh_from_db()
+        self.assertFalse(turno.activo)
+        self.assertGreaterEqual(turno.fin, turno.inicio)
+        self.assertEqual(turno.reporte_cierre["total"], 0)
+
+        resp = c.post(f"/api/turnos/{turno.id}/finalizar_admin/")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data["motivo"], "El turno ya estaba finalizado.")
+
+    def test_migracion_cierra_activos_duplicados(self):
+        _sin_restricciones_turno(self)
+        migracion = import_module("accesos.migrations.0007_turno_unico_activo_por_guarda")
+        otro = Usuario.objects.create(username="otro", rol=Usuario.Rol.GUARDA)
+        ahora = timezone.now()
+        viejos = [
+            Turno.objects.create(guarda=self.guarda, sede="CEGAFE", jornada="MANANA", inicio=ahora - timedelta(hours=h))
+            for h in (5, 3)
+        ]
+        reciente = Turno.objects.create(guarda=self.guarda, sede="CEGAFE", jornada="TARDE", inicio=ahora - timedelta(hours=1))
+        unico = Turno.objects.create(guarda=otro, sede="ITEDRIS", jornada="MANANA", inicio=ahora - timedelta(hours=8))
+
+        migracion.cerrar_turnos_activos_duplicados(django_apps, None)
+
+        self.assertEqual(set(Turno.objects.filter(activo=True).values_list("id", flat=True)), {reciente.id, unico.id})
+        for turno in viejos:
+            turno.refresh_from_db()
+            self.assertFalse(turno.activo)
+            self.assertGreaterEqual(turno.fin, turno.inicio)
+
+
+@override_settings(DB_LECTURA=None)
+class ReporteCierreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.aprendices = [Usuario.objects.create(username=f"a{i}", rol=Usuario.Rol.APRENDIZ, documento=f"{i}") for i in range(4)]
+        hace_un_dia = timezone.now() - timedelta(days=1)
+        cls.anterior = Turno.objects.create(
+            guarda=cls.guarda, sede="CEGAFE", jornada="NOCHE", inicio=hace_un_dia, fin=hace_un_dia + timedelta(hours=8), activo=False
+        )
+        cls.turno = Turno.objects.create(guarda=cls.guarda, sede="CEGAFE", jornada="MANANA")
+        otro = Turno.objects.create(guarda=Usuario.objects.create(username="g2", rol=Usuario.Rol.GUARDA), sede="ITEDRIS", jornada="MANANA")
+        cls.equipo = Equipo.objects.create(propietario=cls.aprendices[0], serial="S1", marca="HP", modelo="X", estado=Equipo.Estado.APROBADO)
+
+        a0, a1, a2, a3 = cls.aprendices
+        # a2 entró en el turno anterior y sigue dentro; a3 está en otra sede
+        for turno, usuario, tipo in (
+            (cls.anterior, a2, "ingreso"),
+            (otro, a3, "ingreso"),
+            (cls.turno, a0, "ingreso"),
+            (cls.turno, a1, "ingreso"),
+            (cls.turno, a1, "salida"),
+        ):
+            acceso = Acceso.objects.create(usuario=usuario, tipo=tipo, sede=turno.sede, turno=turno, registrado_por=turno.guarda)
+            if usuario == a0:
+                acceso.equipos.set([cls.equipo])
+
+    def test_snapshot_al_cerrar(self):
+        c = APIClient()
+        c.force_authenticate(self.guarda)
+        self.assertEqual(c.post("/api/turnos/finalizar/").status_code, 200)
+
+        self.turno.refresh_from_db()
+        reporte = self.turno.reporte_cierre
+        self.assertEqual((reporte["ingresos"], reporte["salidas"], reporte["total"]), (2, 1, 3))
+        self.assertEqual(reporte["aprendices_distintos"], 2)
+        self.assertEqual(reporte["equipos_movidos"], 1)
+        # a0 (este turno) y a2 (turno anterior); no a3, que está en otra sede
+        self.assertEqual(reporte["dentro_al_cierre"], 2)
+        self.assertEqual(sum(h["total"] for h in reporte["por_hora"]), 3)
+        self.assertEqual(reporte["hora_pico"], reporte["por_hora"][0]["hora"])
+        self.assertEqual(reporte["duracion_segundos"], int((self.turno.fin - self.turno.inicio).total_seconds()))
+
+        # el resumen sirve el snapshot sin recalcular
+        Acceso.objects.filter(turno=self.turno).delete()
+        resp = c.get(f"/api/turnos/{self.turno.id}/resumen/")
+        self.assertEqual(resp.data["resumen"], reporte)
+
+    def test_solo_en_el_detalle(self):
+        _cerrar_turno(self.turno)
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        filas = c.get("/api/turnos/").data["results"]
+        self.assertTrue(filas)
+        self.assertTrue(all("reporte_cierre" not in f for f in filas))
+        detalle = c.get(f"/api/turnos/{self.turno.id}/").data
+        self.assertEqual(detalle["reporte_cierre"]["dentro_al_cierre"], 2)
+
+    def test_un_solo_update(self):
+        # inicio adelantado (reloj de otro servidor): fin queda en inicio y el reporte lo dice
+        Turno.objects.filter(pk=self.turno.pk).update(inicio=timezone.now() + timedelta(minutes=5))
+        self.turno.refresh_from_db()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(_cerrar_turno(self.turno))
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "accesos_turno"')]
+        self.assertEqual(len(updates), 1)
+
+        self.turno.refresh_from_db()
+        self.assertEqual(self.turno.fin, self.turno.inicio)
+        self.assertEqual(self.turno.reporte_cierre["duracion_segundos"], 0)
+        self.assertFalse(_cerrar_turno(self.turno))
+
+    def test_listado_con_el_snapshot(self):
+        _cerrar_turno(self.turno)
+        self.turno.refresh_from_db()
+        reporte = self.turno.reporte_cierre
+        # Cerrado con reporte: el listado no recuenta. Activo, o cerrado sin
+        # reporte (anterior): en vivo
+        Acceso.objects.filter(turno=self.turno).delete()
+        otro = Turno.objects.get(sede="ITEDRIS")
+        Acceso.objects.create(usuario=self.aprendices[3], tipo="salida", sede=otro.sede, turno=otro, registrado_por=otro.guarda)
+
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        filas = {f["id"]: f for f in c.get("/api/turnos/").data["results"]}
+        campos = ("ingresos", "salidas", "total", "duracion_segundos")
+        self.assertEqual(tuple(filas[self.turno.id][k] for k in campos), tuple(reporte[k] for k in campos))
+        self.assertEqual((filas[otro.id]["ingresos"], filas[otro.id]["salidas"], filas[otro.id]["total"]), (1, 1, 2))
+        self.assertEqual((filas[self.anterior.id]["ingresos"], filas[self.anterior.id]["total"]), (1, 1))
+        self.assertEqual(filas[self.anterior.id]["duracion_segundos"], 8 * 3600)
+
+
+@override_settings(DB_LECTURA=None)
+class PresenciaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN, is_staff=True, is_superuser=True)
+        cls.guarda = Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA)
+        cls.apr = Usuario.objects.create(
+            username="apr", rol=Usuario.Rol.APRENDIZ, documento="111", first_name="Ana", last_name="Ruiz", programa_formacion="ADSO"
+        )
+        cls.turno = Turno.objects.create(guarda=cls.guarda, sede="CEGAFE", jornada="MANANA")
+        cls.equipo = Equipo.objects.create(propietario=cls.apr, serial="S1", marca="HP", modelo="X", estado=Equipo.Estado.APROBADO)
+
+    def setUp(self):
+        self.c = APIClient()
+        self.c.force_authenticate(self.guarda)
+
+    def registrar(self, tipo, usuario=None, equipos=()):
+        resp = self.c.post("/api/accesos/", {"usuario": (usuario or self.apr).id, "tipo": tipo, "equipos": list(equipos)}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        return Acceso.objects.get(pk=resp.data["acceso"]["id"])
+
+    def presencia(self, usuario=None):
+        return Presencia.objects.filter(usuario=usuario or self.apr).values_list("ingreso_id", flat=True).first()
+
+    def test_editar_por_api(self):
+        ingreso = self.registrar("ingreso")
+        self.assertEqual(self.presencia(), ingreso.id)
+
+        self.c.force_authenticate(self.admin)
+        resp = self.c.patch(f"/api/accesos/{ingreso.id}/", {"usuario": self.apr.id, "tipo": "salida"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertIsNone(self.presencia())
+
+    def test_borrar_por_api(self):
+        ingreso = self.registrar("ingreso")
+        salida = self.registrar("salida")
+        self.assertIsNone(self.presencia())
+
+        self.c.force_authenticate(self.admin)
+        self.assertEqual(self.c.delete(f"/api/accesos/{salida.id}/").status_code, 204)
+        self.assertEqual(self.presencia(), ingreso.id)
+        self.assertEqual(self.c.delete(f"/api/accesos/{ingreso.id}/").status_code, 204)
+        self.assertIsNone(self.presencia())
+
+    def test_admin_de_django(self):
+        ingreso = self.registrar("ingreso")
+        salida = self.registrar("salida")
+        self.client.force_login(self.admin)
+
+        resp = self.client.post(
+            f"/admin/accesos/acceso/{salida.id}/change/",
+            {"usuario": self.apr.id, "tipo": "ingreso", "sede": "CEGAFE", "registrado_por": "", "turno": self.turno.id},
+        )
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.presencia(), salida.id)
+
+        resp = self.client.post(f"/admin/accesos/acceso/{salida.id}/delete/", {"post": "yes"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.presencia(), ingreso.id)
+
+        resp = self.client.post("/admin/accesos/acceso/add/", {"usuario": self.apr.id, "tipo": "salida", "sede": "CEGAFE"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertIsNone(self.presencia())
+
+    def test_borrar_aprendiz_dentro(self):
+        self.registrar("ingreso")
+        self.apr.delete()
+        self.assertFalse(Presencia.objects.exists())
+
+    def test_roster_y_export(self):
+        otro = Usuario.objects.create(username="otro", rol=Usuario.Rol.APRENDIZ, documento="222")
+        fuera = Usuario.objects.create(username="fuera", rol=Usuario.Rol.APRENDIZ, documento="333")
+        self.registrar("ingreso", equipos=[self.equipo.id])
+        self.registrar("ingreso", usuario=otro)
+        self.registrar("ingreso", usuario=fuera)
+        self.registrar("salida", usuario=fuera)
+        itedris = Usuario.objects.create(username="it", rol=Usuario.Rol.APRENDIZ, documento="444")
+        Acceso.objects.create(usuario=itedris, tipo="ingreso", sede="ITEDRIS")
+
+        filas = self.c.get("/api/sedes/CEGAFE/dentro/").data["results"]
+        # más recientes primero; sin el que salió ni el de otra sede
+        self.assertEqual([f["documento"] for f in filas], ["222", "111"])
+        self.assertEqual(filas[1]["nombre"], "Ana Ruiz")
+        self.assertEqual(filas[1]["programa_formacion"], "ADSO")
+        self.assertEqual([e["serial"] for e in filas[1]["equipos"]], ["S1"])
+        self.assertEqual(self.c.get("/api/sedes/NINGUNA/dentro/").status_code, 404)
+
+        resp = self.c.get("/api/sedes/CEGAFE/dentro/export/")
+        self.assertEqual(resp.status_code, 200)
+        lineas = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], "documento,nombre,programa_formacion,sede,desde,equipos")
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(lineas[2].startswith("111,Ana Ruiz,ADSO,CEGAFE,"))
+        self.assertTrue(lineas[2].endswith(",S1"))
+        self.assertEqual(resp["Content-Disposition"], 'attachment; filename="dentro_CEGAFE.csv"')
+
+        self.c.force_authenticate(self.apr)
+        self.assertEqual(self.c.get("/api/sedes/CEGAFE/dentro/").status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.ana = Usuario.objects.create(
+            username="ana", rol=Usuario.Rol.APRENDIZ, documento="1001", email="ana@sadi.local", first_name="Ana", last_name="Ruiz"
+        )
+        Usuario.objects.create(username="guarda", rol=Usuario.Rol.GUARDA, documento="2002")
+
+    def importar(self, contenido, nombre="aprendices.csv"):
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        archivo = SimpleUploadedFile(nombre, contenido.encode("utf-8"))
+        return c.post("/api/usuarios/importar/", {"archivo": archivo}, format="multipart")
+
+    def test_reimportar_conserva_lo_no_enviado(self):
+        resp = self.importar("documento,first_name,programa_formacion\n1001,,ADSO\n3003,Luis,\n")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data["creados"], resp.data["actualizados"], resp.data["errores"]), (1, 1, []))
+
+        self.ana.refresh_from_db()
+        self.assertEqual(
+            (self.ana.username, self.ana.email, self.ana.first_name, self.ana.last_name, self.ana.programa_formacion),
+            ("ana", "ana@sadi.local", "Ana", "Ruiz", "ADSO"),
+        )
+        nuevo = Usuario.objects.get(documento="3003")
+        self.assertEqual((nuevo.username, nuevo.first_name, nuevo.rol), ("3003", "Luis", Usuario.Rol.APRENDIZ))
+        self.assertTrue(nuevo.check_password("3003"))
+
+        # el mismo archivo otra vez: nada nuevo, ana sigue igual
+        resp = self.importar("documento,first_name,programa_formacion\n1001,,ADSO\n3003,Luis,\n")
+        self.assertEqual((resp.data["creados"], resp.data["actualizados"]), (0, 2))
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).username, "ana")
+
+        # username explícito sí se actualiza
+        self.importar("documento,username\n1001,ana.ruiz\n")
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).username, "ana.ruiz")
+
+    def test_errores_por_fila(self):
+        resp = self.importar(
+            "\n".join(
+                [
+                    '{"documento": "4004", "email": "no-es-email"}',
+                    '{"documento": "4005", "username": "ana"}',
+                    '{"documento": "2002"}',
+                    "{no json",
+                    '{"documento": "4006"}',
+                    '{"documento": "4006"}',
+                    "[1]",
+                ]
+            ),
+            nombre="aprendices.jsonl",
+        )
+        self.assertEqual(resp.status_code, 200)
+        errores = {e["fila"]: e["errores"] for e in resp.data["errores"]}
+        self.assertEqual(sorted(errores), [1, 2, 3, 4, 6, 7])
+        self.assertIn("email", errores[1])
+        self.assertEqual(errores[2], {"username": "Ya existe un usuario con este username."})
+        self.assertEqual(errores[3], {"documento": "El documento pertenece a un usuario que no es aprendiz."})
+        self.assertEqual(errores[4], "JSON inválido.")
+        self.assertEqual(errores[6], {"documento": "Valor repetido en el archivo."})
+        self.assertEqual(errores[7], "La fila debe ser un objeto JSON.")
+        self.assertEqual(resp.data["creados"], 1)
+
+    def test_insercion_concurrente_es_error_de_la_fila(self):
+        hashear = importacion.make_password
+
+        def con_carrera(password):
+            # otro proceso inserta el documento 5005 entre la consulta y el INSERT
+            if not Usuario.objects.filter(documento="5005").exists():
+                Usuario.objects.create(username="otro", rol=Usuario.Rol.APRENDIZ, documento="5005")
+            return hashear(password)
+
+        with mock.patch("accesos.importacion.make_password", con_carrera):
+            resultado = importacion.importar_aprendices(
+                [{"documento": "5005"}, {"documento": "5006"}, {"documento": "1001", "last_name": "Ríos"}], workers=1
+            )
+        self.assertEqual((resultado["creados"], resultado["actualizados"]), (1, 1))
+        self.assertEqual(resultado["errores"], [{"fila": 1, "errores": {"documento": "Ya existe un usuario con este documento o username."}}])
+        self.assertEqual(Usuario.objects.get(documento="5005").username, "otro")
+        self.assertEqual(Usuario.objects.get(documento="5006").username, "5006")
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).last_name, "Ríos")
+
+    @override_settings(IMPORTAR_MAX_FILAS=2)
+    def test_limite_en_la_api(self):
+        resp = self.importar("documento\n6001\n6002\n6003\n")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("manage.py importar_aprendices", resp.data["motivo"])
+        self.assertFalse(Usuario.objects.filter(documento__startswith="600").exists())
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("documento,first_name\n7001,Eva\n1001,\n")
+        self.addCleanup(Path(f.name).unlink)
+        salida = StringIO()
+        call_command("importar_aprendices", f.name, "--workers", "1", stdout=salida)
+        self.assertIn("Creados: 1", salida.getvalue())
+        self.assertIn("Actualizados: 1", salida.getvalue())
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).first_name, "Ana")
+
+
+class RevisarLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        cls.otro_admin = Usuario.objects.create(username="admin2", rol=Usuario.Rol.ADMIN)
+        cls.apr = Usuario.objects.create(username="apr", rol=Usuario.Rol.APRENDIZ, documento="1", sede_principal="CEGAFE")
+        cls.pendientes = [Equipo.objects.create(propietario=cls.apr, serial=f"P{i}", marca="HP", modelo="X") for i in range(3)]
+        cls.lenovo = Equipo.objects.create(propietario=cls.apr, serial="L1", marca="Lenovo", modelo="X")
+
+    def revisar(self, admin, **datos):
+        c = APIClient()
+        c.force_authenticate(admin)
+        resp = c.post("/api/equipos/revisar_lote/", datos, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def test_resultado_por_id(self):
+        p0, p1, p2 = self.pendientes
+        # otro admin ya rechazó p1
+        self.revisar(self.otro_admin, estado="rechazado", motivo_rechazo="Serial ilegible", ids=[p1.id])
+
+        datos = self.revisar(self.admin, estado="aprobado", ids=[p0.id, p1.id, 999999, p2.id, p0.id])
+        self.assertEqual(datos["actualizados"], 2)
+        self.assertEqual(
+            datos["resultados"],
+            [
+                {"id": p0.id, "resultado": "actualizado"},
+                {"id": p1.id, "resultado": "ya_revisado"},
+                {"id": 999999, "resultado": "no_encontrado"},
+                {"id": p2.id, "resultado": "actualizado"},
+            ],
+        )
+
+        # lo revisado por el otro admin no se pisa
+        p1.refresh_from_db()
+        self.assertEqual((p1.estado, p1.revisado_por_id, p1.motivo_rechazo), ("rechazado", self.otro_admin.id, "Serial ilegible"))
+        for e in (p0, p2):
+            e.refresh_from_db()
+            self.assertEqual((e.estado, e.revisado_por_id, e.motivo_rechazo), ("aprobado", self.admin.id, None))
+
+        eventos = Evento.objects.filter(tipo=Evento.Tipo.EQUIPO_REVISADO, actor=self.admin).order_by("objeto_id")
+        self.assertEqual([(ev.objeto_id, ev.datos["estado"]) for ev in eventos], [(p0.id, "aprobado"), (p2.id, "aprobado")])
+
+        # repetir el lote ya no cambia nada
+        datos = self.revisar(self.admin, estado="aprobado", ids=[p0.id, p2.id])
+        self.assertEqual(datos["actualizados"], 0)
+        self.assertEqual({r["resultado"] for r in datos["resultados"]}, {"ya_revisado"})
+
+    def test_por_filtro(self):
+        datos = self.revisar(self.admin, estado="aprobado", filtro_marca="hp", filtro_sede="CEGAFE")
+        self.assertEqual(datos["resultados"], [{"id": e.id, "resultado": "actualizado"} for e in self.pendientes])
+        self.lenovo.refresh_from_db()
+        self.assertEqual(self.lenovo.estado, Equipo.Estado.PENDIENTE)
+
+
+@override_settings(DB_LECTURA=None)
+class BuscarUsuariosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(username="admin", rol=Usuario.Rol.ADMIN)
+        crear = Usuario.objects.create
+        cls.carlos = crear(username="carlos", rol="aprendiz", documento="5001", first_name="Ana", last_name="Perez", sede_principal="CEGAFE")
+        cls.ana = crear(username="ana.m", rol="aprendiz", documento="7001", first_name="Anabel", sede_principal="ITEDRIS")
+        cls.pedro = crear(username="pedro", rol="aprendiz", documento="5002", first_name="Anastasia", sede_principal="CEGAFE")
+        cls.andres = crear(username="andres", rol="guarda")
+
+    def buscar(self, **params):
+        c = APIClient()
+        c.force_authenticate(self.admin)
+        resp = c.get("/api/usuarios/buscar/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_prefijos(self):
+        # username, nombre (dos columnas a la vez: una sola fila) y orden por username
+        self.assertEqual([f["id"] for f in self.buscar(q="an")], [self.ana.id, self.andres.id, self.carlos.id, self.pedro.id])
+        self.assertEqual([f["id"] for f in self.buscar(q="50")], [self.carlos.id, self.pedro.id])
+        self.assertEqual([f["id"] for f in self.buscar(q="PER")], [self.carlos.id])
+        # prefijo, no contiene
+        self.assertEqual(self.buscar(q="001"), [])
+        self.assertEqual(self.buscar(q="an", limit="2"), [
+            {"id": self.ana.id, "label": "Anabel (7001)", "rol": "aprendiz"},
+            {"id": self.andres.id, "label": "andres", "rol": "guarda"},
+        ])
+
+    def test_filtros(self):
+        self.assertEqual([f["id"] for f in self.buscar(q="an", rol="aprendiz")], [self.ana.id, self.carlos.id, self.pedro.id])
+        self.assertEqual([f["id"] for f in self.buscar(q="an", rol="aprendiz", sede="CEGAFE")], [self.carlos.id, self.pedro.id])
+        self.assertEqual([f["id"] for f in self.buscar(rol="aprendiz", limit="1")], [self.ana.id])
+
+    def test_ids(self):
+        datos = self.buscar(ids=f"{self.pedro.id},x,{self.carlos.id},999999")
+        self.assertEqual(datos, [
+            {"id": self.carlos.id, "label": "Ana Perez (5001)", "rol": "aprendiz"},
+            {"id": self.pedro.id, "label": "Anastasia (5002)", "rol": "aprendiz"},
+        ])
+        # ids manda sobre q
+        self.assertEqual([f["id"] for f in self.buscar(ids=str(self.andres.id), q="zzz")], [self.andres.id])
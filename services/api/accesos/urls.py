@@ -1,13 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from . import porteria
+
 from .views import (
     UsuarioViewSet,
     AccesoViewSet,
     EquipoViewSet,
     TurnoViewSet,
     NotificacionViewSet,
+    SedeViewSet,
+    EventoViewSet,
+    AsistenciaViewSet,
+    AdminResumenView,
     MeView,
+    MeQRView,
+    CredencialClavesView,
     PasswordResetRequestView,
     PasswordResetVerifyView,
     PasswordResetConfirmView,
@@ -19,9 +28,15 @@ router.register(r"accesos", AccesoViewSet, basename="accesos")
 router.register(r"equipos", EquipoViewSet, basename="equipos")
 router.register(r"turnos", TurnoViewSet, basename="turnos")
 router.register(r"notificaciones", NotificacionViewSet, basename="notificaciones")
+router.register(r"sedes", SedeViewSet, basename="sedes")
+router.register(r"eventos", EventoViewSet, basename="eventos")
+router.register(r"asistencia", AsistenciaViewSet, basename="asistencia")
 
 urlpatterns = [
     path("me/", MeView.as_view(), name="me"),
+    path("me/qr/", MeQRView.as_view(), name="me-qr"),
+    path("credenciales/claves/", CredencialClavesView.as_view(), name="credenciales-claves"),
+    path("admin/resumen/", AdminResumenView.as_view(), name="admin-resumen"),
 
     # Password reset OTP
     path("auth/password-reset/request/", PasswordResetRequestView.as_view(), name="password-reset-request"),
@@ -29,4 +44,13 @@ urlpatterns = [
     path("auth/password-reset/confirm/", PasswordResetConfirmView.as_view(), name="password-reset-confirm"),
 ]
 
+# Bajo ASGI (PORTERIA_ASYNC) las acciones de portería las atienden las vistas
+# async de accesos/porteria.py; van antes que las del router para taparlas.
+if settings.PORTERIA_ASYNC:
+    urlpatterns += [
+        path("accesos/validar_documento/", porteria.validar_documento, name="accesos-validar-documento"),
+        path("accesos/registrar_por_documento/", porteria.registrar_por_documento, name="accesos-registrar-por-documento"),
+        path("accesos/stats/", porteria.stats, name="accesos-stats"),
+    ]
+
 urlpatterns += router.urls
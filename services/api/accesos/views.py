@@ -1,10 +1,18 @@
+import csv
+import gzip
 import hashlib
 import secrets
-from datetime import timedelta
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from itertools import islice
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, TruncWeek
 from django.template.loader import render_to_string
 from django.utils import timezone
 from rest_framework import status, viewsets
@@ -14,18 +22,35 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Acceso, Equipo, Notificacion, PasswordResetOTP, Turno, Usuario
+from .models import Acceso, AsistenciaDiaria, Borrado, Equipo, Evento, Notificacion, PasswordResetOTP, Presencia, Turno, Usuario
 from .permissions import IsAdmin, IsAprendiz, IsGuarda
+from . import metricas
+from .cache_equipos import equipos_aprobados, invalidar_al_confirmar
+from .credenciales import CredencialInvalida, clave_activa, claves, emitir, revocar_credenciales, verificar
+from .eventos import EVENTOS_LOTE, EVENTOS_LOTE_MAX, eventos_desde, registrar_evento, registrar_eventos
+from .importacion import importar_aprendices, leer_filas
+from .instrumentacion import etiquetar_resultado, etiquetar_sede
+from .replicas import LecturaReplicaMixin, alias_lectura
+from .reportes import calcular_reporte_turno
+from .sincronizacion import SincronizacionDeltaMixin
+from .snapshots import componer_delta, comprimir, presencia, snapshot_vigente
+from . import tablero
+from .visitas import RESUMEN_MAX_DIAS, VISITAS_LIMITE, VISITAS_LIMITE_MAX, leer_cursor, pagina_visitas, resumen_visitas
 from .serializers import (
     AccesoSerializer,
+    EquipoRevisionLoteSerializer,
     EquipoRevisionSerializer,
     EquipoSerializer,
+    EventoSerializer,
     NotificacionSerializer,
     PasswordResetConfirmSerializer,
     PasswordResetRequestSerializer,
     PasswordResetVerifySerializer,
+    PresenciaSerializer,
     RegistrarAccesoDocumentoSerializer,
+    TurnoDetalleSerializer,
     TurnoIniciarSerializer,
+    TurnoListadoSerializer,
     TurnoSerializer,
     UsuarioSerializer,
     ValidarDocumentoSerializer,
@@ -36,23 +61,12 @@ from .serializers import (
 # =========================
 def obtener_turno_activo(user):
     """
-    Devuelve el turno activo coherente del guarda.
+    Devuelve el turno activo del guarda (solo lectura).
 
-    Además, auto-corrige inconsistencias comunes que pueden existir en BD:
-    - turno con activo=True pero fin != NULL  -> lo marca activo=False
+    La restricción `turno_unico_activo_por_guarda` garantiza a lo sumo una fila,
+    y su índice parcial (guarda) WHERE activo resuelve la búsqueda.
     """
-    qs = Turno.objects.filter(guarda=user, activo=True).order_by("-inicio")
-
-    # Revisa unos pocos por seguridad (si hay datos sucios)
-    for t in qs[:5]:
-        if t.fin is None:
-            return t
-
-        # Inconsistencia: activo=True pero fin existe -> corregir
-        t.activo = False
-        t.save(update_fields=["activo"])
-
-    return None
+    return Turno.objects.filter(guarda=user, activo=True).first()
 
 
 def _safe_fin(now, inicio):
@@ -64,6 +78,328 @@ def _safe_fin(now, inicio):
     return now
 
 
+def _cerrar_turno(turno, actor=None) -> bool:
+    """
+    Cierra el turno: calcula el reporte de cierre y escribe activo, fin y
+    reporte_cierre en un único UPDATE condicional (solo si sigue activo),
+    junto con el evento en la misma transacción. El fin del reporte es el
+    mismo valor que queda guardado. Devuelve False si otro request ya lo
+    había cerrado.
+
+    Un turno inactivo sin fin (datos de antes de las restricciones) también
+    se cierra: se le fija fin, igual que hacía finalizar_admin.
+    """
+    now = timezone.now()
+    fin = _safe_fin(now, turno.inicio)
+    with transaction.atomic():
+        reporte = calcular_reporte_turno(turno, fin=fin)
+        cerrados = Turno.objects.filter(Q(activo=True) | Q(fin__isnull=True), pk=turno.pk).update(
+            activo=False, fin=fin, reporte_cierre=reporte, actualizado_en=now
+        )
+        if not cerrados:
+            return False
+
+        turno.activo = False
+        turno.fin = fin
+        turno.reporte_cierre = reporte
+        # UPDATE: sin señales
+        tablero.invalidar_al_confirmar()
+        registrar_evento(
+            Evento.Tipo.TURNO_CERRADO, turno.pk, sede=turno.sede, actor=actor,
+            guarda_id=turno.guarda_id, total=reporte["total"],
+        )
+    return True
+
+
+def _evento_acceso(acceso, equipos, actor):
+    registrar_evento(
+        Evento.Tipo.ACCESO_CREADO, acceso.id, sede=acceso.sede, actor=actor,
+        usuario_id=acceso.usuario_id, tipo_acceso=acceso.tipo, equipos=[e.id for e in equipos],
+    )
+
+
+def registrar_rechazo(guarda, turno, motivo, usuario_id=None):
+    """
+    Escaneo rechazado en validar_escaneo: lo consumen las reglas de accesos/alertas.py.
+
+    Solo para documentos (no registrado, no aprendiz, bloqueado), que ya
+    consultaron la BD; los QR rechazados no escriben. PresupuestoConsultasTests
+    .test_porteria fija el costo de ambos.
+    """
+    registrar_evento(
+        Evento.Tipo.ESCANEO_RECHAZADO, turno.id, sede=turno.sede, actor=guarda, motivo=motivo, usuario_id=usuario_id,
+    )
+
+
+def _evento_revision(equipo, actor):
+    return Evento(
+        tipo=Evento.Tipo.EQUIPO_REVISADO, objeto_id=equipo.id, actor=actor,
+        datos={"propietario_id": equipo.propietario_id, "estado": equipo.estado},
+    )
+
+
+# --- Helpers portería (compartidos con las vistas async de accesos/porteria.py) ---
+# Las reglas son funciones sin consultas sobre lo ya leído, y las lecturas son
+# querysets compartidos: validar_escaneo/registrar_escaneo los evalúan con el
+# ORM sync y porteria.py con el async. Solo la escritura (guardar_acceso,
+# registrar_rechazo) es sync en ambos.
+SIN_TURNO_VALIDAR = "Debes iniciar turno para validar y registrar accesos."
+SIN_TURNO_REGISTRAR = "Debes iniciar turno antes de registrar accesos."
+
+
+def _rechazo(request, codigo, motivo, codigo_http):
+    etiquetar_resultado(request, codigo)
+    return Response({"permitido": False, "motivo": motivo}, status=codigo_http)
+
+
+def revisar_credencial(request, datos):
+    """
+    (credencial verificada o None, Response de rechazo o None). Sin consultas:
+    el QR firmado se verifica en memoria (firma, expiración, revocación) y su
+    rechazo solo cuenta en sadi_escaneos_total, sin turno ni bitácora, así un
+    lote de QR falsos o bloqueados no llega a la BD.
+    """
+    if datos.get("credencial"):
+        try:
+            credencial = verificar(datos["credencial"])
+        except CredencialInvalida as e:
+            return None, _rechazo(request, e.codigo, e.motivo, status.HTTP_403_FORBIDDEN)
+        if credencial["rol"] != Usuario.Rol.APRENDIZ:
+            return None, _rechazo(request, "no_aprendiz", "El documento no pertenece a un aprendiz.", status.HTTP_400_BAD_REQUEST)
+        return credencial, None
+    if getattr(settings, "QR_EXIGIR_FIRMA", False):
+        return None, _rechazo(request, "credencial", "Se requiere la credencial QR firmada.", status.HTTP_400_BAD_REQUEST)
+    return None, None
+
+
+def revisar_turno(request, turno, motivo):
+    etiquetar_sede(request, turno and turno.sede)
+    if not turno:
+        return _rechazo(request, "sin_turno", motivo, status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def consulta_aprendiz(documento=None, credencial=None):
+    if credencial:
+        return Usuario.objects.filter(id=credencial["usuario_id"])
+    return Usuario.objects.filter(documento=documento)
+
+
+def revisar_aprendiz(request, aprendiz, bloqueo=True):
+    """(código, Response) si el aprendiz no puede pasar, o None."""
+    if not aprendiz:
+        return "no_registrado", _rechazo(request, "no_registrado", "Documento no registrado.", status.HTTP_404_NOT_FOUND)
+    if getattr(aprendiz, "rol", None) != Usuario.Rol.APRENDIZ:
+        return "no_aprendiz", _rechazo(
+            request, "no_aprendiz", "El documento no pertenece a un aprendiz.", status.HTTP_400_BAD_REQUEST
+        )
+    if bloqueo and getattr(aprendiz, "estado", None) == Usuario.Estado.BLOQUEADO:
+        return "bloqueado", _rechazo(request, "bloqueado", "El aprendiz está bloqueado.", status.HTTP_403_FORBIDDEN)
+    return None
+
+
+def consulta_ultimo(aprendiz):
+    return Acceso.objects.filter(usuario=aprendiz).order_by("-fecha")
+
+
+def respuesta_validacion(aprendiz, ultimo, turno, equipos):
+    estado = "dentro" if (ultimo and ultimo.tipo == Acceso.Tipo.INGRESO) else "fuera"
+    return Response(
+        {
+            "permitido": True,
+            "motivo": None,
+            "estado": estado,
+            "aprendiz": UsuarioSerializer(aprendiz).data,
+            "equipos": equipos,
+            "turno": TurnoSerializer(turno).data,
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def revisar_tipo(request, tipo, ultimo):
+    """Ingreso/salida contra el último acceso: Response de rechazo o None."""
+    if ultimo is None and tipo == Acceso.Tipo.SALIDA:
+        return _rechazo(request, "salida_invalida", "Salida sin ingreso previo.", status.HTTP_400_BAD_REQUEST)
+    if ultimo is not None and ultimo.tipo == tipo:
+        return _rechazo(request, f"doble_{tipo}", f"Doble {tipo}.", status.HTTP_400_BAD_REQUEST)
+    if tipo == Acceso.Tipo.SALIDA and ultimo.tipo != Acceso.Tipo.INGRESO:
+        return _rechazo(
+            request, "salida_invalida", "Salida inválida: el último registro no es un ingreso.", status.HTTP_400_BAD_REQUEST
+        )
+    return None
+
+
+def revisar_equipos_ingreso(aprendiz: Usuario, equipos: list[Equipo]):
+    # Validación de propiedad y estado
+    for eq in equipos:
+        if eq.propietario_id != aprendiz.id:
+            raise ValidationError({"equipos": "Uno de los equipos no pertenece al aprendiz."}, code="equipo_ajeno")
+        if eq.estado != Equipo.Estado.APROBADO:
+            raise ValidationError({"equipos": "Uno de los equipos no está aprobado."}, code="equipo_no_aprobado")
+
+
+def consulta_equipo_dentro(equipos):
+    """Serial del primero de `equipos` cuyo último acceso es un ingreso (una sola consulta para todos)."""
+    ultimo_tipo = Acceso.objects.filter(equipos=OuterRef("pk")).order_by("-fecha").values("tipo")[:1]
+    return (
+        Equipo.objects.filter(id__in=[eq.id for eq in equipos])
+        .annotate(ultimo_tipo=Subquery(ultimo_tipo))
+        .filter(ultimo_tipo=Acceso.Tipo.INGRESO)
+        .values_list("serial", flat=True)
+    )
+
+
+def revisar_equipo_dentro(serial_dentro):
+    # Regla extra: no permitir ingresar un equipo que ya está "dentro"
+    if serial_dentro:
+        raise ValidationError({"equipos": f"El equipo {serial_dentro} ya tiene un ingreso activo."}, code="equipo_ya_dentro")
+
+
+def revisar_equipos_salida(ingreso_ids: list[int], equipos_enviados: list[Equipo]):
+    ingreso_ids = sorted(ingreso_ids)
+    enviados_ids = sorted([e.id for e in equipos_enviados])
+
+    if ingreso_ids and not equipos_enviados:
+        raise ValidationError(
+            {"equipos": "Salida inválida: debes seleccionar los mismos equipos del último ingreso."}, code="equipos_no_coinciden"
+        )
+
+    if (not ingreso_ids) and equipos_enviados:
+        raise ValidationError({"equipos": "Salida inválida: el último ingreso no tenía equipos."}, code="equipos_no_coinciden")
+
+    if equipos_enviados and ingreso_ids != enviados_ids:
+        raise ValidationError(
+            {"equipos": "Los equipos en la salida deben coincidir exactamente con los de l último ingreso."}, code="equipos_no_coinciden"
+        )
+
+
+def revisar_equipos_existen(pedidos, encontrados):
+    if len(encontrados) != len(set(pedidos)):
+        raise ValidationError({"equipos": "Uno de los equipos no existe."}, code="equipo_inexistente")
+
+
+def _validar_equipos_ingreso(aprendiz: Usuario, equipos: list[Equipo]):
+    revisar_equipos_ingreso(aprendiz, equipos)
+    revisar_equipo_dentro(consulta_equipo_dentro(equipos).first())
+
+
+def _validar_salida_equipos_vs_ultimo_ingreso(ultimo_ingreso: Acceso, equipos_enviados: list[Equipo]):
+    revisar_equipos_salida(list(ultimo_ingreso.equipos.values_list("id", flat=True)), equipos_enviados)
+
+
+def guardar_acceso(guarda, turno, aprendiz, tipo, equipos):
+    """La escritura de registrar_escaneo (una transacción). `equipos` ya validados."""
+    with transaction.atomic():
+        acceso = Acceso.objects.create(
+            usuario=aprendiz,
+            tipo=tipo,
+            fecha=timezone.now(),
+            sede=turno.sede,
+            turno=turno,
+            registrado_por=guarda,
+        )
+        if equipos:
+            acceso.equipos.set(list(equipos))
+
+        _evento_acceso(acceso, equipos, guarda)
+
+    return Response({"permitido": True, "motivo": None, "acceso": AccesoSerializer(acceso).data}, status=status.HTTP_201_CREATED)
+
+
+def validar_escaneo(request, datos):
+    """
+    Reglas de validar_documento (validated_data de ValidarDocumentoSerializer)
+    con el ORM sync. porteria.validar_documento es la misma secuencia con el
+    ORM async. Devuelve la Response.
+    """
+    credencial, rechazo = revisar_credencial(request, datos)
+    if rechazo:
+        return rechazo
+
+    turno = obtener_turno_activo(request.user)
+    rechazo = revisar_turno(request, turno, SIN_TURNO_VALIDAR)
+    if rechazo:
+        return rechazo
+
+    aprendiz = consulta_aprendiz(datos.get("documento"), credencial).first()
+    rechazo = revisar_aprendiz(request, aprendiz)
+    if rechazo:
+        codigo, respuesta = rechazo
+        registrar_rechazo(request.user, turno, codigo, aprendiz and aprendiz.id)
+        return respuesta
+
+    ultimo = consulta_ultimo(aprendiz).first()
+    return respuesta_validacion(aprendiz, ultimo, turno, equipos_aprobados(aprendiz.id))
+
+
+def registrar_escaneo(request, datos):
+    """
+    Reglas de registrar_por_documento (validated_data de
+    RegistrarAccesoDocumentoSerializer) con el ORM sync; en porteria.py, con
+    el async. Puede lanzar ValidationError.
+    """
+    tipo = datos["tipo"]
+    pedidos = datos.get("equipos", [])
+
+    turno = obtener_turno_activo(request.user)
+    rechazo = revisar_turno(request, turno, SIN_TURNO_REGISTRAR)
+    if rechazo:
+        return rechazo
+
+    aprendiz = consulta_aprendiz(datos["documento"]).first()
+    rechazo = revisar_aprendiz(request, aprendiz, bloqueo=False)
+    if rechazo:
+        return rechazo[1]
+
+    ultimo = consulta_ultimo(aprendiz).first()
+    rechazo = revisar_tipo(request, tipo, ultimo)
+    if rechazo:
+        return rechazo
+
+    # Equipos: el serializer trae ids, las validaciones trabajan con instancias
+    equipos = []
+    if pedidos:
+        equipos = list(Equipo.objects.filter(id__in=pedidos))
+        revisar_equipos_existen(pedidos, equipos)
+    if tipo == Acceso.Tipo.INGRESO and equipos:
+        _validar_equipos_ingreso(aprendiz, equipos)
+    if tipo == Acceso.Tipo.SALIDA:
+        _validar_salida_equipos_vs_ultimo_ingreso(ultimo, equipos)
+
+    return guardar_acceso(request.user, turno, aprendiz, tipo, equipos)
+
+
+# --- Helpers reportes ---
+def _rango_fechas(params, defecto_dias, max_dias):
+    """
+    (desde, hasta) de ?desde=&hasta= (AAAA-MM-DD, inclusive). Sin hasta, hoy;
+    sin desde, `defecto_dias` antes. Lanza ValidationError si no es válido.
+    """
+    try:
+        hasta = datetime.strptime(params["hasta"], "%Y-%m-%d").date() if params.get("hasta") else timezone.localdate()
+        desde = datetime.strptime(params["desde"], "%Y-%m-%d").date() if params.get("desde") else hasta - timedelta(days=defecto_dias)
+    except ValueError:
+        raise ValidationError({"desde": "Fechas con formato AAAA-MM-DD."})
+    if desde > hasta or (hasta - desde).days >= max_dias:
+        raise ValidationError({"desde": f"El rango debe tener entre 1 y {max_dias} días."})
+    return desde, hasta
+
+
+# --- Helpers autocompletado de usuarios ---
+BUSCAR_LIMITE = 10
+BUSCAR_LIMITE_MAX = 20
+BUSCAR_IDS_MAX = 100
+# Lookups de /api/usuarios/buscar/?q=: cada uno tiene su índice de prefijo (0010)
+BUSCAR_PREFIJOS = ("documento__startswith", "username__istartswith", "first_name__istartswith", "last_name__istartswith")
+BUSCAR_CAMPOS = ("id", "username", "first_name", "last_name", "documento", "rol")
+
+
+def _etiqueta_usuario(u: dict) -> str:
+    nombre = f"{u['first_name']} {u['last_name']}".strip() or u["username"]
+    return f"{nombre} ({u['documento']})" if u["documento"] else nombre
+
+
 # --- Helpers OTP ---
 OTP_TTL_MINUTES = 10
 OTP_MAX_ATTEMPTS = 5
@@ -123,6 +459,50 @@ class MeView(APIView):
         )
 
 
+class MeQRView(APIView):
+    """
+    Credencial QR firmada del usuario (ver accesos/credenciales.py).
+    La app la renueva antes de `expira`; bloquear al usuario la invalida.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.estado == Usuario.Estado.BLOQUEADO:
+            return Response({"permitido": False, "motivo": "Tu usuario está bloqueado."}, status=status.HTTP_403_FORBIDDEN)
+
+        credencial, expira = emitir(request.user)
+        return Response(
+            {
+                "permitido": True,
+                "motivo": None,
+                "credencial": credencial,
+                "expira": datetime.fromtimestamp(expira, tz=dt_timezone.utc).isoformat(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class CredencialClavesView(APIView):
+    """
+    Claves de verificación de QR para el modo sin red de la portería.
+    Son claves HMAC: quien las tiene también puede firmar, por eso solo guardas.
+    """
+
+    permission_classes = [IsAuthenticated, IsGuarda]
+
+    def get(self, request):
+        return Response(
+            {
+                "permitido": True,
+                "motivo": None,
+                "activa": clave_activa()[0],
+                "claves": {k: v.decode() for k, v in claves().items()},
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 # =========================
 # AUTH: PASSWORD RESET (OTP)
 # =========================
@@ -258,10 +638,11 @@ class PasswordResetConfirmView(APIView):
 # =========================
 # USUARIOS (ADMIN)
 # =========================
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all().order_by("id")
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    acciones_replica = ("list", "buscar")
 
     def get_queryset(self):
         qs = super().get_queryset().order_by("id")
@@ -291,14 +672,112 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 
         return qs
 
+    def perform_update(self, serializer):
+        # Bloqueo/desbloqueo: evento y revocación de QR en el post_save de Usuario
+        serializer.instance._actor = self.request.user
+        with transaction.atomic():
+            serializer.save()
+
+    @action(detail=True, methods=["post"], url_path="revocar_qr")
+    def revocar_qr(self, request, pk=None):
+        """Invalida todos los QR emitidos al usuario (p. ej. celular perdido)."""
+        usuario = self.get_object()
+        with transaction.atomic():
+            revocar_credenciales(usuario.pk)
+        return Response({"permitido": True, "motivo": None}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="buscar")
+    def buscar(self, request):
+        """
+        Autocompletado liviano: prefijo sobre documento, username y nombres
+        (índices *_pattern_ops, migración 0010). Sin COUNT ni paginación.
+        `ids=1,2,3` resuelve etiquetas de ids conocidos.
+        """
+        params = request.query_params
+        q = (params.get("q") or "").strip()
+        limite = params.get("limit") or ""
+        limite = min(int(limite), BUSCAR_LIMITE_MAX) if limite.isdigit() and int(limite) > 0 else BUSCAR_LIMITE
+
+        qs = Usuario.objects.all()
+
+        rol = (params.get("rol") or "").strip()
+        if rol:
+            qs = qs.filter(rol=rol)
+
+        sede = (params.get("sede") or "").strip()
+        if sede:
+            qs = qs.filter(sede_principal=sede)
+
+        ids = [int(i) for i in (params.get("ids") or "").split(",") if i.strip().isdigit()]
+        if ids:
+            ids = ids[:BUSCAR_IDS_MAX]
+            filas = qs.filter(id__in=ids).order_by("username").values(*BUSCAR_CAMPOS)[: len(ids)]
+        elif q:
+            # Un SELECT con LIMIT por columna unidos con UNION: cada rama recorre su
+            # índice de prefijo y se detiene en `limite`. Con un OR + ORDER BY habría
+            # que ordenar todas las coincidencias (con "a", media tabla).
+            ramas = [qs.filter(**{lookup: q}).order_by().values(*BUSCAR_CAMPOS)[:limite] for lookup in BUSCAR_PREFIJOS]
+            if connection.features.supports_slicing_ordering_in_compound:
+                candidatas = ramas[0].union(*ramas[1:])
+            else:
+                # SQLite no admite LIMIT dentro de un UNION: una consulta por rama
+                candidatas = {f["id"]: f for rama in ramas for f in rama}.values()
+            filas = sorted(candidatas, key=lambda f: f["username"])[:limite]
+        else:
+            filas = qs.order_by("username").values(*BUSCAR_CAMPOS)[:limite]
+
+        return Response(
+            [
+                {
+                    "id": f["id"],
+                    "label": _etiqueta_usuario(f),
+                    "rol": f["rol"],
+                }
+                for f in filas
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["post"], url_path="importar")
+    def importar(self, request):
+        """
+        Importación de aprendices (multipart: archivo=.csv|.jsonl).
+        Upsert por documento; los errores se reportan por fila.
+
+        Corre dentro de la solicitud, así que acepta hasta IMPORTAR_MAX_FILAS
+        filas y hashea en el mismo proceso. Las cargas grandes van por
+        `manage.py importar_aprendices`, que reparte el hash entre procesos.
+        """
+        archivo = request.FILES.get("archivo")
+        if not archivo:
+            return Response({"permitido": False, "motivo": "Debes adjuntar el archivo."}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = (request.data.get("formato") or archivo.name.rsplit(".", 1)[-1]).strip().lower()
+        if formato not in ["csv", "jsonl"]:
+            return Response({"permitido": False, "motivo": "Formato no soportado (csv o jsonl)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        maximo = getattr(settings, "IMPORTAR_MAX_FILAS", 200)
+        filas = list(islice(leer_filas(archivo, formato), maximo + 1))
+        if len(filas) > maximo:
+            return Response(
+                {"permitido": False, "motivo": f"El archivo supera {maximo} filas: impórtalo con manage.py importar_aprendices."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        resultado = importar_aprendices(filas, workers=1)
+        return Response({"permitido": True, "motivo": None, **resultado}, status=status.HTTP_200_OK)
+
 
 # =========================
 # NOTIFICACIONES
 # =========================
-class NotificacionViewSet(viewsets.ModelViewSet):
+class NotificacionViewSet(SincronizacionDeltaMixin, viewsets.ModelViewSet):
     serializer_class = NotificacionSerializer
     permission_classes = [IsAuthenticated]
     queryset = Notificacion.objects.all()
+    campo_actualizado = "updated_at"
+    modelo_borrado = Borrado.Modelo.NOTIFICACION
+    borrados_admin_ve_todo = False
 
     def get_queryset(self):
         user = self.request.user
@@ -328,7 +807,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
 
         if obj.read_at is None:
             obj.read_at = timezone.now()
-            obj.save(update_fields=["read_at"])
+            obj.save(update_fields=["read_at", "updated_at"])
 
         return Response(
             {"permitido": True, "motivo": None, "notificacion": NotificacionSerializer(obj).data},
@@ -339,10 +818,12 @@ class NotificacionViewSet(viewsets.ModelViewSet):
 # =========================
 # EQUIPOS
 # =========================
-class EquipoViewSet(viewsets.ModelViewSet):
+class EquipoViewSet(SincronizacionDeltaMixin, LecturaReplicaMixin, viewsets.ModelViewSet):
     serializer_class = EquipoSerializer
     permission_classes = [IsAuthenticated]
     queryset = Equipo.objects.all()
+    modelo_borrado = Borrado.Modelo.EQUIPO
+    acciones_replica = ("list",)
 
     def get_queryset(self):
         user = self.request.user
@@ -378,7 +859,7 @@ class EquipoViewSet(viewsets.ModelViewSet):
                 return [IsAuthenticated(), IsAdmin()]
             return [IsAuthenticated(), IsAprendiz()]
 
-        if self.action in ["update", "partial_update", "destroy", "revisar"]:
+        if self.action in ["update", "partial_update", "destroy", "revisar", "revisar_lote"]:
             return [IsAuthenticated(), IsAdmin()]
 
         return [IsAuthenticated()]
@@ -395,13 +876,15 @@ class EquipoViewSet(viewsets.ModelViewSet):
         if not propietario:
             raise ValidationError({"propietario": "Como admin debes enviar el propietario (id del aprendiz)."})
 
-        equipo = serializer.save(propietario=propietario)
+        with transaction.atomic():
+            equipo = serializer.save(propietario=propietario)
 
-        equipo.estado = Equipo.Estado.APROBADO
-        equipo.motivo_rechazo = None
-        equipo.revisado_por = user
-        equipo.revisado_en = timezone.now()
-        equipo.save()
+            equipo.estado = Equipo.Estado.APROBADO
+            equipo.motivo_rechazo = None
+            equipo.revisado_por = user
+            equipo.revisado_en = timezone.now()
+            equipo.save()
+            _evento_revision(equipo, user).save()
 
     @action(detail=True, methods=["patch"], url_path="revisar")
     def revisar(self, request, pk=None):
@@ -416,18 +899,104 @@ class EquipoViewSet(viewsets.ModelViewSet):
         equipo.motivo_rechazo = motivo if estado == Equipo.Estado.RECHAZADO else None
         equipo.revisado_por = request.user
         equipo.revisado_en = timezone.now()
-        equipo.save()
+        with transaction.atomic():
+            equipo.save()
+            _evento_revision(equipo, request.user).save()
 
         return Response(EquipoSerializer(equipo).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"], url_path="revisar_lote")
+    def revisar_lote(self, request):
+        """
+        Aprueba/rechaza muchos equipos: bloquea los que siguen pendientes y los
+        actualiza por id en un único UPDATE. Lo ya revisado por otro admin no se pisa.
+        """
+        s = EquipoRevisionLoteSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        estado = s.validated_data["estado"]
+        motivo = s.validated_data.get("motivo_rechazo") if estado == Equipo.Estado.RECHAZADO else None
+        ids = s.validated_data.get("ids")
+
+        qs = Equipo.objects.filter(estado=Equipo.Estado.PENDIENTE)
+        if ids:
+            qs = qs.filter(id__in=ids)
+        else:
+            if "filtro_marca" in s.validated_data:
+                qs = qs.filter(marca__iexact=s.validated_data["filtro_marca"])
+            if "filtro_sede" in s.validated_data:
+                qs = qs.filter(propietario__sede_principal=s.validated_data["filtro_sede"])
+
+        now = timezone.now()
+        with transaction.atomic():
+            # FOR UPDATE espera a quien esté revisando las mismas filas y vuelve a
+            # evaluar estado=PENDIENTE: los ids bloqueados son justo los que cambia ESTE request
+            candidatos = list(qs.select_for_update(of=("self",)).values_list("id", "propietario_id"))
+            cambiados = {i for i, _ in candidatos}
+            if cambiados:
+                Equipo.objects.filter(id__in=cambiados).update(
+                    estado=estado, motivo_rechazo=motivo, revisado_por=request.user, revisado_en=now, actualizado_en=now
+                )
+            revisados = [Equipo(id=i, propietario_id=p, estado=estado) for i, p in candidatos]
+            registrar_eventos([_evento_revision(e, request.user) for e in revisados])
+            # UPDATE masivo: sin señales. Rechazar pendientes no cambia los aprobados.
+            if estado == Equipo.Estado.APROBADO:
+                invalidar_al_confirmar({e.propietario_id for e in revisados})
+            if revisados:
+                tablero.invalidar_al_confirmar()
+
+        if ids:
+            existentes = set(Equipo.objects.filter(id__in=ids).values_list("id", flat=True))
+            resultados = [
+                {
+                    "id": i,
+                    "resultado": "actualizado" if i in cambiados else ("ya_revisado" if i in existentes else "no_encontrado"),
+                }
+                for i in dict.fromkeys(ids)
+            ]
+        else:
+            resultados = [{"id": i, "resultado": "actualizado"} for i in sorted(cambiados)]
+
+        return Response(
+            {"permitido": True, "motivo": None, "estado": estado, "actualizados": len(cambiados), "resultados": resultados},
+            status=status.HTTP_200_OK,
+        )
+
 
 # =========================
 # TURNOS
 # =========================
-class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
+def _conteo_accesos(tipo):
+    conteo = (
+        Acceso.objects.filter(turno=OuterRef("pk"), tipo=tipo)
+        .order_by()
+        .values("turno")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(conteo, output_field=IntegerField()), 0)
+
+
+def _del_reporte(clave):
+    return Cast(KT(f"reporte_cierre__{clave}"), IntegerField())
+
+
+def _conteo_turno(tipo, clave):
+    # Cerrado: el número del reporte de cierre. Activo (o cerrado antes de que
+    # existiera el reporte): conteo en vivo, que el CASE solo evalúa para esas filas
+    return Case(
+        When(activo=False, reporte_cierre__isnull=False, then=_del_reporte(clave)),
+        default=_conteo_accesos(tipo),
+        output_field=IntegerField(),
+    )
+
+
+class TurnoViewSet(SincronizacionDeltaMixin, LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Turno.objects.all().order_by("-inicio")
     serializer_class = TurnoSerializer
     permission_classes = [IsAuthenticated]
+    modelo_borrado = Borrado.Modelo.TURNO
+    acciones_replica = ("list", "resumen")
 
     def get_permissions(self):
         if self.action in ["iniciar", "finalizar", "actual"]:
@@ -440,6 +1009,13 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
             return [IsAuthenticated(), IsAdmin()]
         return [IsAuthenticated(), IsGuarda()]
 
+    def get_serializer_class(self):
+        if self.action == "list":
+            return TurnoListadoSerializer
+        if self.action == "retrieve":
+            return TurnoDetalleSerializer
+        return TurnoSerializer
+
     def get_queryset(self):
         user = self.request.user
         rol = getattr(user, "rol", None)
@@ -449,6 +1025,18 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
         else:
             qs = Turno.objects.filter(guarda=user).order_by("-inicio")
 
+        if self.action in ["list", "retrieve"]:
+            # Turnos cerrados: conteos y duración del reporte de cierre (solo esas
+            # claves, sin traer el JSON). Activos: subconsultas correlacionadas
+            # (índice (turno, tipo)) solo para las filas de la página, en el mismo SELECT
+            qs = qs.select_related("guarda").annotate(
+                ingresos=_conteo_turno(Acceso.Tipo.INGRESO, "ingresos"),
+                salidas=_conteo_turno(Acceso.Tipo.SALIDA, "salidas"),
+                duracion_cierre=_del_reporte("duracion_segundos"),
+            )
+        if self.action == "list":
+            qs = qs.defer("reporte_cierre")
+
         sede = (self.request.query_params.get("sede") or "").strip()
         if sede:
             qs = qs.filter(sede=sede)
@@ -468,25 +1056,32 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
         s = TurnoIniciarSerializer(data=request.data)
         s.is_valid(raise_exception=True)
 
-        turno_activo = obtener_turno_activo(request.user)
-        if turno_activo:
+        try:
+            # El índice único parcial decide: sin check-then-insert ni locks
+            with transaction.atomic():
+                turno = Turno.objects.create(
+                    guarda=request.user,
+                    sede=s.validated_data["sede"],
+                    jornada=s.validated_data["jornada"],
+                    inicio=timezone.now(),
+                    activo=True,
+                    fin=None,
+                )
+                registrar_evento(
+                    Evento.Tipo.TURNO_ABIERTO, turno.id, sede=turno.sede, actor=request.user,
+                    guarda_id=turno.guarda_id, jornada=turno.jornada,
+                )
+        except IntegrityError:
+            turno_activo = obtener_turno_activo(request.user)
             return Response(
                 {
                     "permitido": False,
                     "motivo": "Ya tienes un turno activo.",
-                    "turno": TurnoSerializer(turno_activo).data,
+                    "turno": TurnoSerializer(turno_activo).data if turno_activo else None,
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        turno = Turno.objects.create(
-            guarda=request.user,
-            sede=s.validated_data["sede"],
-            jornada=s.validated_data["jornada"],
-            inicio=timezone.now(),
-            activo=True,
-            fin=None,
-        )
         return Response(
             {"permitido": True, "motivo": None, "turno": TurnoSerializer(turno).data},
             status=status.HTTP_201_CREATED,
@@ -495,17 +1090,12 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=["post"], url_path="finalizar")
     def finalizar(self, request):
         turno = obtener_turno_activo(request.user)
-        if not turno:
+        if not turno or not _cerrar_turno(turno, actor=request.user):
             return Response(
                 {"permitido": False, "motivo": "No tienes un turno activo.", "turno": None},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        now = timezone.now()
-        turno.activo = False
-        turno.fin = _safe_fin(now, turno.inicio)
-        turno.save(update_fields=["activo", "fin"])
-
         return Response(
             {"permitido": True, "motivo": None, "turno": TurnoSerializer(turno).data},
             status=status.HTTP_200_OK,
@@ -522,8 +1112,9 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
     def finalizar_admin(self, request, pk=None):
         turno = self.get_object()
 
-        # Si ya está finalizado, informamos
-        if not turno.activo and turno.fin is not None:
+        # Si ya está finalizado (o lo cerró otro request), informamos
+        if not _cerrar_turno(turno, actor=request.user):
+            turno.refresh_from_db(fields=["activo", "fin"])
             return Response(
                 {
                     "permitido": False,
@@ -533,13 +1124,6 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        now = timezone.now()
-
-        # ✅ SIEMPRE se sobreescribe fin al cerrar por admin
-        turno.activo = False
-        turno.fin = _safe_fin(now, turno.inicio)
-        turno.save(update_fields=["activo", "fin"])
-
         return Response(
             {"permitido": True, "motivo": None, "turno": TurnoSerializer(turno).data},
             status=status.HTTP_200_OK,
@@ -554,16 +1138,15 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
         if rol == "guarda" and turno.guarda_id != user.id:
             return Response({"permitido": False, "motivo": "No autorizado."}, status=status.HTTP_403_FORBIDDEN)
 
-        qs = Acceso.objects.filter(turno=turno)
-        ingresos = qs.filter(tipo=Acceso.Tipo.INGRESO).count()
-        salidas = qs.filter(tipo=Acceso.Tipo.SALIDA).count()
+        # Turno cerrado: se sirve el snapshot. Activo (o histórico sin snapshot): cálculo en vivo, sin guardar.
+        resumen = turno.reporte_cierre or calcular_reporte_turno(turno)
 
         return Response(
             {
                 "permitido": True,
                 "motivo": None,
                 "turno": TurnoSerializer(turno).data,
-                "resumen": {"ingresos": ingresos, "salidas": salidas, "total": ingresos + salidas},
+                "resumen": resumen,
             },
             status=status.HTTP_200_OK,
         )
@@ -572,10 +1155,12 @@ class TurnoViewSet(viewsets.ReadOnlyModelViewSet):
 # =========================
 # ACCESOS
 # =========================
-class AccesoViewSet(viewsets.ModelViewSet):
+class AccesoViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
     serializer_class = AccesoSerializer
     permission_classes = [IsAuthenticated]
     queryset = Acceso.objects.all()
+    # los escaneos (validar/registrar/stats) siempre en la primaria
+    acciones_replica = ("list", "mis_accesos", "visitas", "visitas_resumen")
 
     def get_queryset(self):
         user = self.request.user
@@ -648,34 +1233,12 @@ class AccesoViewSet(viewsets.ModelViewSet):
         if self.action in ["mis_accesos", "estado"]:
             return [IsAuthenticated(), IsAprendiz()]
 
-        return [IsAuthenticated()]
-
-    def _validar_equipos_ingreso(self, aprendiz: Usuario, equipos: list[Equipo]):
-        # Validación de propiedad y estado
-        for eq in equipos:
-            if eq.propietario_id != aprendiz.id:
-                raise ValidationError({"equipos": "Uno de los equipos no pertenece al aprendiz."})
-            if eq.estado != Equipo.Estado.APROBADO:
-                raise ValidationError({"equipos": "Uno de los equipos no está aprobado."})
-
-        # Regla extra: no permitir ingresar un equipo que ya está "dentro"
-        for eq in equipos:
-            ultimo_eq = Acceso.objects.filter(equipos=eq).order_by("-fecha").first()
-            if ultimo_eq and ultimo_eq.tipo == Acceso.Tipo.INGRESO:
-                raise ValidationError({"equipos": f"El equipo {eq.serial} ya tiene un ingreso activo."})
-
-    def _validar_salida_equipos_vs_ultimo_ingreso(self, ultimo_ingreso: Acceso, equipos_enviados: list[Equipo]):
-        ingreso_ids = sorted(list(ultimo_ingreso.equipos.values_list("id", flat=True)))
-        enviados_ids = sorted([e.id for e in equipos_enviados])
-
-        if ingreso_ids and not equipos_enviados:
-            raise ValidationError({"equipos": "Salida inválida: debes seleccionar los mismos equipos del último ingreso."})
-
-        if (not ingreso_ids) and equipos_enviados:
-            raise ValidationError({"equipos": "Salida inválida: el último ingreso no tenía equipos."})
+        if self.action in ["visitas", "visitas_resumen"]:
+            if getattr(self.request.user, "rol", None) == "admin":
+                return [IsAuthenticated(), IsAdmin()]
+            return [IsAuthenticated(), IsAprendiz()]
 
-        if equipos_enviados and ingreso_ids != enviados_ids:
-            raise ValidationError({"equipos": "Los equipos en la salida deben coincidir exactamente con los de l último ingreso."})
+        return [IsAuthenticated()]
 
     def create(self, request, *args, **kwargs):
         request_user = request.user
@@ -689,7 +1252,9 @@ class AccesoViewSet(viewsets.ModelViewSet):
 
         if rol == "guarda":
             turno = obtener_turno_activo(request_user)
+            etiquetar_sede(request, turno and turno.sede)
             if not turno:
+                etiquetar_resultado(request, "sin_turno")
                 return Response(
                     {"permitido": False, "motivo": "Debes iniciar turno antes de registrar accesos."},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -706,17 +1271,20 @@ class AccesoViewSet(viewsets.ModelViewSet):
         ultimo = Acceso.objects.filter(usuario=aprendiz).order_by("-fecha").first()
 
         if ultimo is None and tipo == Acceso.Tipo.SALIDA:
+            etiquetar_resultado(request, "salida_invalida")
             return Response({"permitido": False, "motivo": "Salida sin ingreso previo."}, status=status.HTTP_400_BAD_REQUEST)
 
         if ultimo is not None and ultimo.tipo == tipo:
+            etiquetar_resultado(request, f"doble_{tipo}")
             return Response({"permitido": False, "motivo": f"Doble {tipo}."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Reglas de equipos
         if tipo == Acceso.Tipo.INGRESO and equipos_enviados:
-            self._validar_equipos_ingreso(aprendiz, list(equipos_enviados))
+            _validar_equipos_ingreso(aprendiz, list(equipos_enviados))
 
         if tipo == Acceso.Tipo.SALIDA:
             if not ultimo or ultimo.tipo != Acceso.Tipo.INGRESO:
+                etiquetar_resultado(request, "salida_invalida")
                 return Response(
                     {"permitido": False, "motivo": "Salida inválida: el último registro no es un ingreso."},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -727,12 +1295,14 @@ class AccesoViewSet(viewsets.ModelViewSet):
             turno = ultimo.turno
 
             # Validación estricta de equipos
-            self._validar_salida_equipos_vs_ultimo_ingreso(ultimo, list(equipos_enviados))
+            _validar_salida_equipos_vs_ultimo_ingreso(ultimo, list(equipos_enviados))
 
-        acceso = serializer.save(registrado_por=request_user, turno=turno, sede=sede)
+        with transaction.atomic():
+            # ModelSerializer.create ya asigna los equipos (m2m de validated_data);
+            # la presencia la aplica el post_save de Acceso
+            acceso = serializer.save(registrado_por=request_user, turno=turno, sede=sede)
 
-        if equipos_enviados:
-            acceso.equipos.set(list(equipos_enviados))
+            _evento_acceso(acceso, equipos_enviados, request_user)
 
         return Response({"permitido": True, "motivo": None, "acceso": AccesoSerializer(acceso).data}, status=status.HTTP_201_CREATED)
 
@@ -740,92 +1310,13 @@ class AccesoViewSet(viewsets.ModelViewSet):
     def validar_documento(self, request):
         s = ValidarDocumentoSerializer(data=request.data)
         s.is_valid(raise_exception=True)
-        documento = s.validated_data["documento"]
-
-        turno = obtener_turno_activo(request.user)
-        if not turno:
-            return Response(
-                {"permitido": False, "motivo": "Debes iniciar turno para validar y registrar accesos."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        aprendiz = Usuario.objects.filter(documento=documento).first()
-        if not aprendiz:
-            return Response({"permitido": False, "motivo": "Documento no registrado."}, status=status.HTTP_404_NOT_FOUND)
-
-        if getattr(aprendiz, "rol", None) != Usuario.Rol.APRENDIZ:
-            return Response({"permitido": False, "motivo": "El documento no pertenece a un aprendiz."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if getattr(aprendiz, "estado", None) == Usuario.Estado.BLOQUEADO:
-            return Response({"permitido": False, "motivo": "El aprendiz está bloqueado."}, status=status.HTTP_403_FORBIDDEN)
-
-        ultimo = Acceso.objects.filter(usuario=aprendiz).order_by("-fecha").first()
-        estado = "dentro" if (ultimo and ultimo.tipo == Acceso.Tipo.INGRESO) else "fuera"
-
-        equipos_aprobados = Equipo.objects.filter(propietario=aprendiz, estado=Equipo.Estado.APROBADO).order_by("-creado_en")
-
-        return Response(
-            {
-                "permitido": True,
-                "motivo": None,
-                "estado": estado,
-                "aprendiz": UsuarioSerializer(aprendiz).data,
-                "equipos": EquipoSerializer(equipos_aprobados, many=True).data,
-                "turno": TurnoSerializer(turno).data,
-            },
-            status=status.HTTP_200_OK,
-        )
+        return validar_escaneo(request, s.validated_data)
 
     @action(detail=False, methods=["post"], url_path="registrar_por_documento")
     def registrar_por_documento(self, request):
         s = RegistrarAccesoDocumentoSerializer(data=request.data)
         s.is_valid(raise_exception=True)
-
-        documento = s.validated_data["documento"]
-        tipo = s.validated_data["tipo"]
-        equipos = s.validated_data.get("equipos", [])
-
-        turno = obtener_turno_activo(request.user)
-        if not turno:
-            return Response({"permitido": False, "motivo": "Debes iniciar turno antes de registrar accesos."}, status=status.HTTP_400_BAD_REQUEST)
-
-        aprendiz = Usuario.objects.filter(documento=documento).first()
-        if not aprendiz:
-            return Response({"permitido": False, "motivo": "Documento no registrado."}, status=status.HTTP_404_NOT_FOUND)
-
-        if getattr(aprendiz, "rol", None) != Usuario.Rol.APRENDIZ:
-            return Response({"permitido": False, "motivo": "El documento no pertenece a un aprendiz."}, status=status.HTTP_400_BAD_REQUEST)
-
-        ultimo = Acceso.objects.filter(usuario=aprendiz).order_by("-fecha").first()
-
-        if ultimo is None and tipo == Acceso.Tipo.SALIDA:
-            return Response({"permitido": False, "motivo": "Salida sin ingreso previo."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if ultimo is not None and ultimo.tipo == tipo:
-            return Response({"permitido": False, "motivo": f"Doble {tipo}."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Equipos
-        if tipo == Acceso.Tipo.INGRESO and equipos:
-            self._validar_equipos_ingreso(aprendiz, list(equipos))
-
-        if tipo == Acceso.Tipo.SALIDA:
-            if not ultimo or ultimo.tipo != Acceso.Tipo.INGRESO:
-                return Response({"permitido": False, "motivo": "Salida inválida: el último registro no es un ingreso."}, status=status.HTTP_400_BAD_REQUEST)
-            # Validación estricta de equipos
-            self._validar_salida_equipos_vs_ultimo_ingreso(ultimo, list(equipos))
-
-        acceso = Acceso.objects.create(
-            usuario=aprendiz,
-            tipo=tipo,
-            fecha=timezone.now(),
-            sede=turno.sede,
-            turno=turno,
-            registrado_por=request.user,
-        )
-        if equipos:
-            acceso.equipos.set(list(equipos))
-
-        return Response({"permitido": True, "motivo": None, "acceso": AccesoSerializer(acceso).data}, status=status.HTTP_201_CREATED)
+        return registrar_escaneo(request, s.validated_data)
 
     @action(detail=False, methods=["get"], url_path="stats")
     def stats(self, request):
@@ -850,7 +1341,7 @@ class AccesoViewSet(viewsets.ModelViewSet):
     # ===== Aprendiz endpoints (para después, pero no estorban) =====
     @action(detail=False, methods=["get"], url_path="mis_accesos")
     def mis_accesos(self, request):
-        qs = Acceso.objects.filter(usuario=request.user).order_by("-fecha")[:100]
+        qs = Acceso.objects.filter(usuario=request.user).prefetch_related("equipos").order_by("-fecha")[:100]
         return Response(AccesoSerializer(qs, many=True).data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"], url_path="estado")
@@ -858,3 +1349,373 @@ class AccesoViewSet(viewsets.ModelViewSet):
         ultimo = Acceso.objects.filter(usuario=request.user).order_by("-fecha").first()
         estado = "dentro" if (ultimo and ultimo.tipo == Acceso.Tipo.INGRESO) else "fuera"
         return Response({"estado": estado}, status=status.HTTP_200_OK)
+
+    def _usuario_visitas(self, request):
+        # El aprendiz ve las suyas; el admin las de ?usuario=
+        if getattr(request.user, "rol", None) == "aprendiz":
+            return request.user.id
+        usuario_id = (request.query_params.get("usuario") or "").strip()
+        if not usuario_id.isdigit():
+            raise ValidationError({"usuario": "Indica el id del aprendiz."})
+        return int(usuario_id)
+
+    @action(detail=False, methods=["get"], url_path="visitas")
+    def visitas(self, request):
+        """
+        GET /api/accesos/visitas/?cursor=&limit=20[&usuario=<id> (admin)]
+
+        Ingresos emparejados con su salida, más nuevos primero, con duración y
+        equipos. `siguiente` es el cursor de la página siguiente (null al final).
+        """
+        usuario_id = self._usuario_visitas(request)
+        params = request.query_params
+
+        cursor = None
+        if params.get("cursor"):
+            cursor = leer_cursor(params["cursor"])
+            if cursor is None:
+                return Response({"permitido": False, "motivo": "Cursor inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        limite = (params.get("limit") or "").strip()
+        limite = min(int(limite), VISITAS_LIMITE_MAX) if limite.isdigit() and int(limite) > 0 else VISITAS_LIMITE
+
+        visitas, siguiente = pagina_visitas(usuario_id, cursor=cursor, limite=limite)
+        return Response({"visitas": visitas, "siguiente": siguiente}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="visitas_resumen")
+    def visitas_resumen(self, request):
+        """
+        GET /api/accesos/visitas_resumen/?por=dia|semana&desde=AAAA-MM-DD&hasta=AAAA-MM-DD[&usuario=<id>]
+
+        Por defecto, las últimas 12 semanas por semana. Máximo RESUMEN_MAX_DIAS días.
+        """
+        usuario_id = self._usuario_visitas(request)
+        params = request.query_params
+
+        por = (params.get("por") or "semana").strip()
+        if por not in ("dia", "semana"):
+            return Response({"permitido": False, "motivo": "por debe ser dia o semana."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mismo parseo que asistencia; aquí el error va con la forma permitido/motivo
+        try:
+            desde, hasta = _rango_fechas(params, defecto_dias=7 * 12, max_dias=RESUMEN_MAX_DIAS)
+        except ValidationError as e:
+            return Response({"permitido": False, "motivo": str(e.detail["desde"])}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"por": por, "desde": desde, "hasta": hasta, "periodos": resumen_visitas(usuario_id, desde, hasta, por=por)},
+            status=status.HTTP_200_OK,
+        )
+
+
+# =========================
+# SEDES: quién está dentro (evacuaciones / conteos)
+# =========================
+class _Echo:
+    """Buffer mínimo para que csv.writer escriba directo al stream."""
+
+    def write(self, value):
+        return value
+
+
+class SedeViewSet(LecturaReplicaMixin, viewsets.GenericViewSet):
+    serializer_class = PresenciaSerializer
+    permission_classes = [IsAuthenticated]
+    queryset = Presencia.objects.all()
+    lookup_value_regex = "[A-Z_]+"
+    acciones_replica = ("dentro_export",)
+
+    def get_permissions(self):
+        rol = getattr(self.request.user, "rol", None)
+        if rol == "admin":
+            return [IsAuthenticated(), IsAdmin()]
+        return [IsAuthenticated(), IsGuarda()]
+
+    def _roster(self, sede):
+        # índice (sede, desde)
+        return (
+            Presencia.objects.filter(sede=sede)
+            .select_related("usuario", "ingreso")
+            .prefetch_related("ingreso__equipos")
+            .order_by("-desde")
+        )
+
+    def _sede_invalida(self, sede):
+        if sede in Turno.Sede.values:
+            return None
+        return Response({"permitido": False, "motivo": "Sede no válida."}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=["get"], url_path="dentro")
+    def dentro(self, request, pk=None):
+        error = self._sede_invalida(pk)
+        if error:
+            return error
+
+        page = self.paginate_queryset(self._roster(pk))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=["get"], url_path="dentro/export")
+    def dentro_export(self, request, pk=None):
+        error = self._sede_invalida(pk)
+        if error:
+            return error
+
+        writer = csv.writer(_Echo())
+        roster = self._roster(pk).using(alias_lectura())
+
+        def filas():
+            yield writer.writerow(["documento", "nombre", "programa_formacion", "sede", "desde", "equipos"])
+            # el generador corre después de la vista: se fija aquí la base que le tocó
+            for p in roster.iterator(chunk_size=2000):
+                u = p.usuario
+                yield writer.writerow(
+                    [
+                        u.documento or "",
+                        f"{u.first_name} {u.last_name}".strip() or u.username,
+                        u.programa_formacion or "",
+                        p.sede,
+                        p.desde.isoformat(),
+                        ";".join(e.serial for e in p.ingreso.equipos.all()),
+                    ]
+                )
+
+        response = StreamingHttpResponse(filas(), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="dentro_{pk}.csv"'
+        return response
+
+    @action(detail=True, methods=["get"], url_path="snapshot")
+    def snapshot(self, request, pk=None):
+        """
+        Padrón de la sede para validar en portería sin red (sin quién está
+        dentro: ver snapshot_presencia).
+        `?desde=<version>` devuelve solo el delta si aún existen las versiones
+        intermedias; si no, el completo. Con `If-None-Match` igual al ETag
+        responde 304. El completo se sirve ya comprimido (gzip) desde la BD.
+        """
+        error = self._sede_invalida(pk)
+        if error:
+            return error
+
+        snap = snapshot_vigente(pk)
+        desde = (request.query_params.get("desde") or "").strip()
+        desde = int(desde) if desde.isdigit() and int(desde) < snap.version else None
+        # El cuerpo depende de `desde` (delta o completo): va en el ETag
+        etag = f'"{pk}-{snap.version}"' if desde is None else f'"{pk}-{desde}-{snap.version}"'
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        delta = None
+        if desde is not None:
+            delta = componer_delta(pk, desde, snap.version)
+
+        if delta is not None:
+            cuerpo = comprimir(delta)
+        else:
+            # diferido en snapshot_vigente: solo se lee si hace falta el completo
+            cuerpo = bytes(snap.contenido)
+
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(cuerpo, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(cuerpo), content_type="application/json")
+        response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        return response
+
+    @action(detail=True, methods=["get"], url_path="snapshot/presencia")
+    def snapshot_presencia(self, request, pk=None):
+        """
+        Documentos del padrón que están dentro ahora. Sin versión: cambia con
+        cada escaneo y es chico, la app lo pide al recuperar la red.
+        """
+        error = self._sede_invalida(pk)
+        if error:
+            return error
+        return Response(
+            {"sede": pk, "dentro": presencia(pk), "generado_en": timezone.now().isoformat()}, status=status.HTTP_200_OK
+        )
+
+
+# =========================
+# TABLERO DE ADMINISTRACIÓN (accesos/tablero.py)
+# =========================
+class AdminResumenView(APIView):
+    """
+    GET /api/admin/resumen/: usuarios por rol/estado, equipos pendientes,
+    turnos activos, accesos de hoy y ocupación por sede, en una respuesta
+    cacheada (RESUMEN_ADMIN_TTL).
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response(tablero.resumen(), status=status.HTTP_200_OK)
+
+
+# =========================
+# MÉTRICAS (formato de texto de Prometheus)
+# =========================
+class MetricasView(APIView):
+    """
+    GET /metrics: agregado de todos los workers + turnos activos por sede.
+    Sin JWT (lo consume el scraper): con METRICS_TOKEN se exige
+    `Authorization: Bearer <METRICS_TOKEN>`; sin él, solo las IPs de
+    METRICS_IPS. Sin ninguno de los dos, 403 para todos.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        if token:
+            enviado = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            if not secrets.compare_digest(enviado, token):
+                return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        elif request.META.get("REMOTE_ADDR") not in getattr(settings, "METRICS_IPS", []):
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+
+        activos = dict(
+            Turno.objects.filter(activo=True).values("sede").annotate(n=Count("id")).values_list("sede", "n").order_by()
+        )
+        return HttpResponse(metricas.exponer(activos), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# =========================
+# EVENTOS (feed de cambios para consumidores incrementales)
+# =========================
+class EventoViewSet(viewsets.GenericViewSet):
+    """
+    GET /api/eventos/?since=<seq>&limit=500[&sede=...&tipo=a,b]
+
+    Devuelve eventos con seq > since en orden. El consumidor guarda `siguiente`
+    y lo envía como `since` en la próxima llamada; si `hay_mas` es true puede
+    pedir de inmediato. El guarda solo ve los eventos de la sede de su turno.
+    """
+
+    serializer_class = EventoSerializer
+    permission_classes = [IsAuthenticated]
+    queryset = Evento.objects.all()
+
+    def get_permissions(self):
+        rol = getattr(self.request.user, "rol", None)
+        if rol == "admin":
+            return [IsAuthenticated(), IsAdmin()]
+        return [IsAuthenticated(), IsGuarda()]
+
+    def list(self, request):
+        params = request.query_params
+        since = (params.get("since") or "0").strip()
+        if not since.isdigit():
+            return Response({"permitido": False, "motivo": "since debe ser un entero >= 0."}, status=status.HTTP_400_BAD_REQUEST)
+        since = int(since)
+
+        limite = (params.get("limit") or "").strip()
+        limite = min(int(limite), EVENTOS_LOTE_MAX) if limite.isdigit() and int(limite) > 0 else EVENTOS_LOTE
+
+        sede = (params.get("sede") or "").strip() or None
+        if getattr(request.user, "rol", None) == "guarda":
+            turno = obtener_turno_activo(request.user)
+            if not turno:
+                return Response({"permitido": False, "motivo": "No tienes turno activo."}, status=status.HTTP_400_BAD_REQUEST)
+            sede = turno.sede
+
+        tipos = [t for t in (params.get("tipo") or "").split(",") if t.strip()]
+
+        eventos, hay_mas = eventos_desde(since, limite=limite, sede=sede, tipos=tipos)
+        return Response(
+            {
+                "eventos": EventoSerializer(eventos, many=True).data,
+                "siguiente": eventos[-1].seq if eventos else since,
+                "hay_mas": hay_mas,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+# =========================
+# ASISTENCIA: horas dentro por aprendiz, programa y sede (accesos/asistencia.py)
+# =========================
+ASISTENCIA_MAX_DIAS = 366
+
+
+class AsistenciaViewSet(LecturaReplicaMixin, viewsets.GenericViewSet):
+    """
+    Lee solo AsistenciaDiaria (agregado diario); los accesos del día en curso
+    aparecen cuando corre refrescar_asistencia.
+
+    GET /api/asistencia/?desde=&hasta=&programa=&sede=   horas por aprendiz y semana (paginado)
+    GET /api/asistencia/programas/?desde=&hasta=&sede=   horas por programa, sede y semana
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    queryset = AsistenciaDiaria.objects.all()
+    acciones_replica = ("list", "programas")
+
+    def _filtrar(self, request):
+        params = request.query_params
+        desde, hasta = _rango_fechas(params, defecto_dias=7 * 4, max_dias=ASISTENCIA_MAX_DIAS)
+        qs = AsistenciaDiaria.objects.filter(dia__gte=desde, dia__lte=hasta)
+
+        programa = (params.get("programa") or "").strip()
+        if programa:
+            qs = qs.filter(usuario__programa_formacion=programa)
+        sede = (params.get("sede") or "").strip()
+        if sede:
+            qs = qs.filter(usuario__sede_principal=sede)
+        return qs.annotate(semana=TruncWeek("dia"))
+
+    def list(self, request):
+        filas = (
+            self._filtrar(request)
+            .values(
+                "semana", "usuario_id", "usuario__username", "usuario__first_name", "usuario__last_name",
+                "usuario__documento", "usuario__programa_formacion", "usuario__sede_principal",
+            )
+            .annotate(total=Sum("segundos"), dias=Count("id"), n_visitas=Sum("visitas"))
+            .order_by("semana", "usuario__programa_formacion", "usuario__sede_principal", "usuario_id")
+        )
+        pagina = self.paginate_queryset(filas)
+        datos = [
+            {
+                "semana": f["semana"],
+                "usuario_id": f["usuario_id"],
+                "nombre": f"{f['usuario__first_name']} {f['usuario__last_name']}".strip() or f["usuario__username"],
+                "documento": f["usuario__documento"],
+                "programa": f["usuario__programa_formacion"],
+                "sede": f["usuario__sede_principal"],
+                "horas": round(f["total"] / 3600, 2),
+                "dias": f["dias"],
+                "visitas": f["n_visitas"],
+            }
+            for f in pagina
+        ]
+        return self.get_paginated_response(datos)
+
+    @action(detail=False, methods=["get"], url_path="programas")
+    def programas(self, request):
+        filas = (
+            self._filtrar(request)
+            .values("semana", "usuario__programa_formacion", "usuario__sede_principal")
+            .annotate(total=Sum("segundos"), aprendices=Count("usuario_id", distinct=True))
+            .order_by("semana", "usuario__programa_formacion", "usuario__sede_principal")
+        )
+        return Response(
+            {
+                "resultados": [
+                    {
+                        "semana": f["semana"],
+                        "programa": f["usuario__programa_formacion"],
+                        "sede": f["usuario__sede_principal"],
+                        "aprendices": f["aprendices"],
+                        "horas": round(f["total"] / 3600, 2),
+                        "horas_por_aprendiz": round(f["total"] / 3600 / f["aprendices"], 2),
+                    }
+                    for f in filas
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
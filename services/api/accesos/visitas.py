@@ -0,0 +1,129 @@
+"""
+Visitas de un aprendiz: cada ingreso emparejado con el acceso que le sigue,
+calculado en SQL con LAG sobre sus accesos en orden descendente. Si lo que
+sigue no es una salida (dato inconsistente) la visita queda sin salida; si
+no sigue nada, está en curso.
+
+El índice (usuario, fecha) sirve la ventana y la paginación por keyset: una
+página lee a lo sumo 2×limite+2 filas, sin importar cuánta historia haya.
+"""
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db.models import F, Q, Window, prefetch_related_objects
+from django.db.models.functions import Lag
+from django.utils import timezone
+
+from .models import Acceso
+
+VISITAS_LIMITE = 20
+VISITAS_LIMITE_MAX = 100
+RESUMEN_MAX_DIAS = 366
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _accesos(usuario_id):
+    orden = [F("fecha").desc(), F("id").desc()]
+    return (
+        Acceso.objects.filter(usuario_id=usuario_id)
+        .annotate(
+            siguiente_id=Window(Lag("id"), order_by=orden),
+            siguiente_tipo=Window(Lag("tipo"), order_by=orden),
+            siguiente_fecha=Window(Lag("fecha"), order_by=orden),
+        )
+        .order_by("-fecha", "-id")
+    )
+
+
+# =========================
+# Cursor: "<fecha en µs desde epoch>-<id>" de la última fila leída (también
+# lo usa la sincronización delta, sincronizacion.py)
+# =========================
+def escribir_cursor(fecha, pk):
+    return f"{(fecha - EPOCH) // timedelta(microseconds=1)}-{pk}"
+
+
+def _cursor(acceso):
+    return escribir_cursor(acceso.fecha, acceso.id)
+
+
+def leer_cursor(valor):
+    """(fecha, id) o None si el cursor no es válido."""
+    micros, _, pk = (valor or "").partition("-")
+    if not (micros.isdigit() and pk.isdigit()):
+        return None
+    return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+
+
+def _visita(ingreso):
+    salida = ingreso.siguiente_fecha if ingreso.siguiente_tipo == Acceso.Tipo.SALIDA else None
+    return {
+        "ingreso_id": ingreso.id,
+        "sede": ingreso.sede,
+        "entrada": ingreso.fecha,
+        "salida_id": ingreso.siguiente_id if salida else None,
+        "salida": salida,
+        "duracion_segundos": int((salida - ingreso.fecha).total_seconds()) if salida else None,
+        "en_curso": ingreso.siguiente_id is None,
+        "equipos": [{"id": e.id, "serial": e.serial, "marca": e.marca, "modelo": e.modelo} for e in ingreso.equipos.all()],
+    }
+
+
+def pagina_visitas(usuario_id, cursor=None, limite=VISITAS_LIMITE):
+    """
+    Visitas más nuevas primero, a partir de `cursor` (tupla de leer_cursor).
+    Devuelve (visitas, siguiente_cursor o None).
+    """
+    qs = _accesos(usuario_id)
+    if cursor:
+        # La fila del cursor se incluye para que LAG empareje al ingreso que le sigue
+        fecha, pk = cursor
+        qs = qs.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lte=pk))
+
+    tope = 2 * limite + 2
+    filas = list(qs[:tope])
+    completa = len(filas) == tope
+    if cursor and filas and filas[0].id == cursor[1]:
+        filas = filas[1:]
+
+    ingresos, ultimo = [], None
+    for fila in filas:
+        if len(ingresos) == limite:
+            completa = True
+            break
+        ultimo = fila
+        if fila.tipo == Acceso.Tipo.INGRESO:
+            ingresos.append(fila)
+
+    # Equipos solo de los ingresos de la página (una consulta)
+    prefetch_related_objects(ingresos, "equipos")
+    return [_visita(i) for i in ingresos], (_cursor(ultimo) if completa and ultimo else None)
+
+
+def resumen_visitas(usuario_id, desde, hasta, por="dia"):
+    """
+    Visitas y segundos dentro por día o semana (lunes) de la fecha de
+    ingreso, hora local, entre `desde` y `hasta` (fechas, inclusive).
+    """
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    # Un día de holgura para la salida del último ingreso del rango
+    filas = (
+        _accesos(usuario_id)
+        .filter(fecha__gte=inicio, fecha__lt=fin + timedelta(days=1))
+        .values_list("tipo", "fecha", "siguiente_tipo", "siguiente_fecha")
+    )
+
+    periodos = {}
+    for tipo, fecha, siguiente_tipo, siguiente_fecha in filas:
+        if tipo != Acceso.Tipo.INGRESO or fecha >= fin:
+            continue
+        dia = timezone.localdate(fecha)
+        clave = dia if por == "dia" else dia - timedelta(days=dia.weekday())
+        p = periodos.setdefault(clave, {"inicio": clave, "visitas": 0, "segundos": 0, "sin_salida": 0})
+        p["visitas"] += 1
+        if siguiente_tipo == Acceso.Tipo.SALIDA:
+            p["segundos"] += int((siguiente_fecha - fecha).total_seconds())
+        else:
+            p["sin_salida"] += 1
+    return [periodos[k] for k in sorted(periodos)]
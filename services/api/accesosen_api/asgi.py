@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'accesosen_api.settings')
+# Portería con vistas async (accesos/porteria.py). Servir con un servidor ASGI:
+#   gunicorn accesosen_api.asgi:application -k uvicorn.workers.UvicornWorker
+os.environ.setdefault('DJANGO_PORTERIA_ASYNC', 'true')
 
 application = get_asgi_application()
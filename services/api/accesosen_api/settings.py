@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -56,6 +57,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accesos.instrumentacion.ServerTimingMiddleware',
+    'accesos.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,14 +108,51 @@ WSGI_APPLICATION = 'accesosen_api.wsgi.application'
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "accesosen",
-        "USER": "postgres",
-        "PASSWORD": "postgres",
-        "HOST": "127.0.0.1",
-        "PORT": "5433",
+        "NAME": os.getenv("DJANGO_DB_NAME", "accesosen"),
+        "USER": os.getenv("DJANGO_DB_USER", "postgres"),
+        "PASSWORD": os.getenv("DJANGO_DB_PASSWORD", "postgres"),
+        "HOST": os.getenv("DJANGO_DB_HOST", "127.0.0.1"),
+        "PORT": os.getenv("DJANGO_DB_PORT", "5433"),
+        # Conexiones persistentes; se verifican antes de reusarlas
+        "CONN_MAX_AGE": int(os.getenv("DJANGO_DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Pool de conexiones del backend de Django (requiere psycopg 3 con psycopg_pool).
+# Recomendado bajo ASGI, donde cada solicitud corre en un hilo propio y las
+# conexiones persistentes por hilo no se reutilizan. Excluye CONN_MAX_AGE.
+DB_POOL = os.getenv("DJANGO_DB_POOL", "false").lower() == "true"
+if DB_POOL:
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured("DJANGO_DB_POOL=true requiere psycopg[pool] (psycopg 3).")
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DJANGO_DB_POOL_MIN", "2")),
+            "max_size": int(os.getenv("DJANGO_DB_POOL_MAX", "10")),
+            "timeout": int(os.getenv("DJANGO_DB_POOL_TIMEOUT", "10")),
+        }
+    }
+
+# Réplica de solo lectura para listados, reportes y exportaciones
+# (ver accesos/replicas.py). Sin DJANGO_DB_REPLICA_HOST todo va a la primaria.
+DB_LECTURA = None
+if os.getenv("DJANGO_DB_REPLICA_HOST"):
+    DB_LECTURA = "replica"
+    DATABASES[DB_LECTURA] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DJANGO_DB_REPLICA_HOST"),
+        "PORT": os.getenv("DJANGO_DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["accesos.replicas.RouterReplica"]
+# Tras escribir, el usuario lee de la primaria durante este tiempo (retraso de la réplica)
+REPLICA_PEGADO_SEGUNDOS = int(os.getenv("DJANGO_REPLICA_PEGADO_SEGUNDOS", "5"))
+
 
 
 AUTH_USER_MODEL = "accesos.Usuario"
@@ -161,7 +201,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accesos.instrumentacion.JWTAuthenticationMedida",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -173,6 +213,121 @@ REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "accesos.exceptions.ui_exception_handler",
 }
 
+# =========================
+# INSTRUMENTACIÓN (Server-Timing, log de solicitudes lentas y /metrics)
+# =========================
+SERVER_TIMING_ENABLED = os.getenv("DJANGO_SERVER_TIMING", "true").lower() == "true"
+SLOW_REQUEST_MS = int(os.getenv("DJANGO_SLOW_REQUEST_MS", "500"))
+
+# /metrics: cada worker de gunicorn vuelca sus contadores a METRICS_DIR y el
+# endpoint los suma. Los archivos sin volcar en METRICS_STALE_SECONDS (workers
+# que terminaron) se borran al leerlos.
+METRICS_ENABLED = os.getenv("DJANGO_METRICS", "true").lower() == "true"
+METRICS_DIR = os.getenv("DJANGO_METRICS_DIR", "")  # vacío = <tmp>/sadi_metricas
+METRICS_FLUSH_SECONDS = int(os.getenv("DJANGO_METRICS_FLUSH_SECONDS", "5"))
+METRICS_STALE_SECONDS = int(os.getenv("DJANGO_METRICS_STALE_SECONDS", "60"))
+# Acceso a /metrics, cerrado por defecto. Con METRICS_TOKEN el scraper manda
+# `Authorization: Bearer <token>` (en Prometheus: `authorization: {credentials: ...}`
+# del scrape_config). Sin token solo responde a las IPs de METRICS_IPS
+# (REMOTE_ADDR: detrás de un proxy es la del proxy, mejor usar el token).
+METRICS_TOKEN = os.getenv("DJANGO_METRICS_TOKEN", "")
+METRICS_IPS = [ip.strip() for ip in os.getenv("DJANGO_METRICS_IPS", "").split(",") if ip.strip()]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "accesos.rendimiento": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
+# =========================
+# EVENTOS (/api/eventos/?since=) Y SINCRONIZACIÓN DELTA (?updated_since=)
+# =========================
+# Los eventos se numeran (seq) al publicarlos, ya confirmados, y se entregan
+# sin espera (alertas y asistencia los consumen así). Lo que avanza por fecha
+# (?updated_since=) no entrega lo más nuevo que esto: da tiempo a que confirmen
+# las transacciones anteriores y el cursor no se salte ninguna fila.
+EVENTOS_MARGEN_SEGUNDOS = int(os.getenv("DJANGO_EVENTOS_MARGEN_SEGUNDOS", "2"))
+
+# Lápidas de ?updated_since= (equipos, notificaciones, turnos). Un cliente con
+# una marca más vieja recibe la colección completa. Purga: manage.py purgar_borrados
+BORRADOS_RETENCION_DIAS = int(os.getenv("DJANGO_BORRADOS_RETENCION_DIAS", "30"))
+
+# =========================
+# SNAPSHOT DE SEDE (/api/sedes/<sede>/snapshot/, validación sin red)
+# =========================
+# La descarga sirve la última versión guardada; la regenera
+# `manage.py generar_snapshots --intervalo 60` (o desde cron). Solo se guarda
+# una versión nueva si cambió. Quién está dentro va aparte, sin versionar
+# (/api/sedes/<sede>/snapshot/presencia/).
+SNAPSHOT_VERSIONES = int(os.getenv("DJANGO_SNAPSHOT_VERSIONES", "50"))
+
+# =========================
+# PORTERÍA ASYNC (ASGI)
+# =========================
+# true = validar_documento, registrar_por_documento y stats se sirven con las
+# vistas async de accesos/porteria.py. asgi.py lo activa; con WSGI dejarlo en false.
+PORTERIA_ASYNC = os.getenv("DJANGO_PORTERIA_ASYNC", "false").lower() == "true"
+
+# =========================
+# CREDENCIAL QR FIRMADA (/api/me/qr/)
+# =========================
+# Rotación: agregar la clave nueva en DJANGO_QR_CLAVES ("k2:secreto,k1:viejo"),
+# activarla con DJANGO_QR_CLAVE_ACTIVA y quitar la vieja cuando venzan sus QR.
+# Sin claves configuradas se deriva una de SECRET_KEY.
+QR_CLAVES = dict(par.split(":", 1) for par in os.getenv("DJANGO_QR_CLAVES", "").split(",") if ":" in par)
+QR_CLAVE_ACTIVA = os.getenv("DJANGO_QR_CLAVE_ACTIVA", "")
+QR_VIGENCIA_SEGUNDOS = int(os.getenv("DJANGO_QR_VIGENCIA_SEGUNDOS", "86400"))
+QR_REVOCACION_TTL = int(os.getenv("DJANGO_QR_REVOCACION_TTL", "30"))
+# true = validar_documento ya no acepta el documento plano
+QR_EXIGIR_FIRMA = os.getenv("DJANGO_QR_EXIGIR_FIRMA", "false").lower() == "true"
+
+# =========================
+# ALERTAS (manage.py motor_alertas, accesos/alertas.py)
+# =========================
+# Ráfaga: alerta cuando una sede acumula UMBRAL rechazos en una ventana de SEGUNDOS
+ALERTAS_RAFAGA_SEGUNDOS = int(os.getenv("DJANGO_ALERTAS_RAFAGA_SEGUNDOS", "300"))
+ALERTAS_RAFAGA_UMBRAL = int(os.getenv("DJANGO_ALERTAS_RAFAGA_UMBRAL", "10"))
+ALERTAS_EQUIPO_HORAS = int(os.getenv("DJANGO_ALERTAS_EQUIPO_HORAS", "12"))
+# Fin de cada jornada (hora local) y tolerancia antes de alertar un turno abierto
+ALERTAS_FIN_JORNADA = {"MANANA": "12:00", "TARDE": "18:00", "NOCHE": "22:00"}
+ALERTAS_TURNO_MARGEN_MINUTOS = int(os.getenv("DJANGO_ALERTAS_TURNO_MARGEN_MINUTOS", "30"))
+
+# =========================
+# IMPORTACIÓN DE APRENDICES (/api/usuarios/importar/)
+# =========================
+# Máximo de filas por archivo en la API (se importa dentro de la solicitud);
+# para más, manage.py importar_aprendices
+IMPORTAR_MAX_FILAS = int(os.getenv("DJANGO_IMPORTAR_MAX_FILAS", "200"))
+
+# =========================
+# CACHE
+# =========================
+# Con varios workers/procesos el cache debe ser compartido (Redis): las
+# invalidaciones de un proceso tienen que verlas los demás. LocMem es por proceso:
+# sin Redis los datos cacheados viven pocos segundos (ver CACHE_EQUIPOS_TTL), así
+# lo que otro worker cambió se ve a lo sumo ese tiempo tarde.
+CACHE_COMPARTIDO = bool(os.getenv("DJANGO_REDIS_URL"))
+if CACHE_COMPARTIDO:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("DJANGO_REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Equipos aprobados por aprendiz (accesos/cache_equipos.py). Un día con Redis
+# (las invalidaciones llegan a todos); 5 s con LocMem, que no las comparte.
+CACHE_EQUIPOS_TTL = int(os.getenv("DJANGO_CACHE_EQUIPOS_TTL", "86400" if CACHE_COMPARTIDO else "5"))
+# Fracción de aciertos que se comparan con la BD (métrica resultado="stale")
+CACHE_EQUIPOS_VERIFICAR = float(os.getenv("DJANGO_CACHE_EQUIPOS_VERIFICAR", "0.01"))
+# Resumen del tablero de administración (accesos/tablero.py)
+RESUMEN_ADMIN_TTL = int(os.getenv("DJANGO_RESUMEN_ADMIN_TTL", "15"))
+
 # =========================
 # EMAIL (RECUPERAR CONTRASEÑA)
 # =========================
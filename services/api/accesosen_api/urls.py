@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from accesos.views import MetricasView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
 
@@ -9,4 +11,6 @@ urlpatterns = [
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
 
     path("api/", include("accesos.urls")),
+
+    path("metrics", MetricasView.as_view(), name="metrics"),
 ]